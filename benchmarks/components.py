@@ -0,0 +1,118 @@
+# benchmarks/components.py
+
+# Micro-benchmarks for each step of the /predict path, run directly against the
+# loaded engines (no HTTP): ID lookup, row construction (the zero-copy row view and, for
+# reference, the one-row DataFrame the old code built), model inference, NBA,
+# prompt formatting, and log serialization / enqueueing.
+#
+# Usage (from the project root):
+#     CHURN_MODEL_URI=<model uri or local artifact dir> python benchmarks/components.py
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_op(fn, inputs, number=2000, repeat=5):
+    """
+    Times `fn(x)` over `inputs` (cycled). Returns per-call timings in microseconds:
+    the median and the best of `repeat` rounds of `number` calls.
+    """
+    n_inputs = len(inputs)
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(number):
+            fn(inputs[i % n_inputs])
+        per_call.append((time.perf_counter() - start) / number)
+    per_call_us = np.asarray(per_call) * 1e6
+    return {
+        "median_us": round(float(np.median(per_call_us)), 3),
+        "best_us": round(float(per_call_us.min()), 3),
+        "calls_per_second": round(1e6 / float(np.median(per_call_us)), 1),
+    }
+
+
+def run_components(api, n_samples=1000, seed=0, number=2000, repeat=5):
+    """
+    Benchmarks the engine steps with the model and data already loaded in `api` (main).
+
+    Returns:
+        dict: component name -> timings (see `time_op`).
+    """
+    from engine.fast_inference import predict_columns
+    from engine.nba_engine import recommend_action, recommend_actions
+    from engine.personalization_engine import build_prompt
+    from engine.prediction_log import PredictionLogWriter, dumps_line
+
+    data, model = api.customer_data, api.churn_model
+    rng = np.random.default_rng(seed)
+    positions = rng.integers(0, len(data), size=n_samples)
+    ids = data.id_list(positions)
+    rows = [data.row(int(p)) for p in positions]
+    actions = [recommend_action(row) for row in rows]
+    prompt_inputs = [(row, action) for row, action in zip(rows, actions) if action != 'No Action']
+    entries = [{
+        "timestamp": int(time.time()),
+        "model_version": model.metadata.run_id,
+        "customer_id": customer_id,
+        "features": row.to_dict(),
+        "prediction": {"churn_probability": 0.5},
+        "experiment": {"group": "B", "action_taken": action},
+        "ground_truth_churn": None,
+    } for customer_id, row, action in zip(ids, rows, actions)]
+    log_writer = PredictionLogWriter(path=os.path.join(tempfile.mkdtemp(), 'bench.jsonl'),
+                                     max_queue=number * repeat + 1)  # Never started: measures the enqueue only
+    batch = np.sort(positions[:1000])
+
+    components = {
+        "id_lookup": (data.position, ids),
+        "row_view": (lambda p: data.row(int(p)).to_dict(), positions),
+        "row_dataframe": (lambda p: data.to_frame([int(p)]), positions),
+        "predict_single": (lambda p: predict_columns(model, data.take([int(p)])), positions),
+        "predict_batch_1000": (lambda _: predict_columns(model, data.take(batch)), [None]),
+        "recommend_action": (recommend_action, rows),
+        "recommend_actions_1000": (lambda _: recommend_actions(data.take(batch)), [None]),
+        "build_prompt": (lambda args: build_prompt(*args), prompt_inputs),
+        "log_serialize": (dumps_line, entries),
+        "log_enqueue": (log_writer.log, entries),
+    }
+    results = {}
+    for name, (fn, inputs) in components.items():
+        calls = number if not name.endswith('_1000') else max(number // 100, 5)
+        results[name] = time_op(fn, inputs, number=calls, repeat=repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for each step of the /predict path.")
+    parser.add_argument('--number', type=int, default=2000, help="Calls per round")
+    parser.add_argument('--repeat', type=int, default=5, help="Rounds per component")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import main as api
+
+    api.model_watcher.load(prefer_cache=api.FAST_START)
+    api.load_customer_data(refresh_scores=False)
+    results = run_components(api, number=args.number, repeat=args.repeat)
+
+    print(f"{'component':24} {'median µs':>10} {'best µs':>10} {'calls/s':>12}")
+    for name, r in results.items():
+        print(f"{name:24} {r['median_us']:>10.2f} {r['best_us']:>10.2f} {r['calls_per_second']:>12.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/email_streaming.py
+
+# Time to first byte of the streaming prediction endpoint against the blocking one.
+# Starts the LLM stand-in (streaming a token every --token-delay seconds) and the API
+# in-process, then for treatment-group customers measures:
+#   * POST /predict/{id}: nothing arrives until the whole email is generated,
+#   * GET /predict/{id}/stream: time to the `prediction` event, to the first email
+#     token and to the `done` event.
+# Finally a few streams are dropped after their first token, to check that the
+# upstream generations are cancelled rather than run to the end.
+#
+# Usage (from the project root):
+#     CHURN_MODEL_URI=<model uri or local artifact dir> python benchmarks/email_streaming.py --requests 20
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.llm_stub_server import create_app as create_stub_app, email_tokens
+from benchmarks.servers import BackgroundServer
+
+
+def blocking_request(client, customer_id):
+    """(time to first byte, total) of POST /predict/{id}."""
+    started = time.perf_counter()
+    with client.stream("POST", f"/predict/{customer_id}") as response:
+        response.raise_for_status()
+        first_byte = None
+        for _ in response.iter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+    return first_byte, time.perf_counter() - started
+
+
+def streaming_request(client, customer_id, stop_after_first_token=False):
+    """Time to the first byte, the first token and the done event of GET /predict/{id}/stream."""
+    started = time.perf_counter()
+    timings = {"first_byte": None, "first_token": None, "done": None}
+    event = None
+    with client.stream("GET", f"/predict/{customer_id}/stream") as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if timings["first_byte"] is None:
+                timings["first_byte"] = time.perf_counter() - started
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:") and event == "token" and timings["first_token"] is None:
+                timings["first_token"] = time.perf_counter() - started
+                if stop_after_first_token:
+                    break  # Leaving the block closes the connection
+            elif line.startswith("data:") and event == "done":
+                timings["done"] = time.perf_counter() - started
+                timings["email_chars"] = len(json.loads(line[5:])["personalized_email"] or "")
+    return timings
+
+
+def percentiles(values):
+    values = np.asarray([v for v in values if v is not None]) * 1000.0
+    return f"p50 {np.percentile(values, 50):8.1f} ms   p95 {np.percentile(values, 95):8.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming vs blocking /predict time to first byte")
+    parser.add_argument('--requests', type=int, default=20, help="Requests per mode")
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--disconnects', type=int, default=5)
+    parser.add_argument('--stub-port', type=int, default=8765)
+    parser.add_argument('--api-port', type=int, default=8766)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    os.environ["HF_API_URL"] = f"http://127.0.0.1:{args.stub_port}/generate"
+    import main as api
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = create_stub_app(first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+    # The blocking call takes as long as streaming the whole email would
+    stub.state.delay = args.first_token_delay + args.token_delay * (len(email_tokens(250)) - 1)
+    with BackgroundServer(stub, args.stub_port), BackgroundServer(api.app, args.api_port) as server, \
+            httpx.Client(base_url=server.url, timeout=120) as client:
+        scores = client.post("/predict/batch", json={"customer_ids": api.customer_data.id_list()}, timeout=300).json()
+        treatment = [r["customer_id"] for r in scores["results"] if api.ab_experiment.is_treatment(r["experiment_group"])]
+        # Distinct customers for every request, so no email comes from the generation cache
+        needed = 2 * args.requests + args.disconnects
+        if len(treatment) < needed:
+            raise SystemExit(f"Only {len(treatment)} treatment-group customers; lower --requests.")
+        blocking_ids = treatment[:args.requests]
+        streaming_ids = treatment[args.requests:2 * args.requests]
+        dropped_ids = treatment[2 * args.requests:needed]
+
+        blocking = [blocking_request(client, customer_id) for customer_id in blocking_ids]
+        streaming = [streaming_request(client, customer_id) for customer_id in streaming_ids]
+
+        cancelled_before = httpx.get(f"{stub_url}/stats").json()["streams_cancelled"]
+        for customer_id in dropped_ids:
+            streaming_request(client, customer_id, stop_after_first_token=True)
+        time.sleep(args.token_delay * 5 + 0.5)  # Let the cancellations reach the stand-in
+        stub_stats = httpx.get(f"{stub_url}/stats").json()
+
+    print(f"POST /predict            first byte: {percentiles([first for first, _ in blocking])}")
+    print(f"GET  /predict/.../stream first byte: {percentiles([t['first_byte'] for t in streaming])}")
+    print(f"                        first token: {percentiles([t['first_token'] for t in streaming])}")
+    print(f"                         done event: {percentiles([t['done'] for t in streaming])}")
+    cancelled = stub_stats["streams_cancelled"] - cancelled_before
+    print(f"dropped streams: {args.disconnects}, upstream generations cancelled: {cancelled}, "
+          f"still in flight: {stub_stats['in_flight']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/experiment_outcomes.py
+
+# Checks that churn labels reach the experiment summaries.
+# Writes prediction log records for a treatment and a control group, records the same
+# predictions in a scratch ground-truth store, and verifies that the summary has no
+# churn rate until labels are added, and then the labeled churn rate and its uplift.
+# Every customer is scored three times, and their outcome must still count once; a
+# customer labeled again must have their outcome replaced, also across a restart.
+#
+# Usage (from the project root):
+#     python benchmarks/experiment_outcomes.py
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from engine.experiment_analytics import ExperimentAnalytics
+from engine.experiments import ExperimentSet
+from engine.ground_truth import GroundTruthStore
+
+
+def main():
+    experiments = ExperimentSet({"experiments": [
+        {"name": "retention_email", "groups": {"A": 1, "B": 1}, "control": "A", "min_churn_probability": 0.5}]})
+    experiment = experiments.primary
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, 'predictions.jsonl')
+        store = GroundTruthStore(os.path.join(directory, 'ground_truth.sqlite3'))
+        state_path = os.path.join(directory, 'analytics.json')
+        analytics = ExperimentAnalytics(log_path, experiments, poll_seconds=0, state_path=state_path, outcomes=store)
+
+        now = time.time()
+
+        def score(customer_id, timestamp):
+            group = experiment.assign(customer_id)
+            return {
+                "timestamp": timestamp, "model_version": "run", "customer_id": customer_id,
+                "prediction": {"churn_probability": 0.7},
+                "experiment": {"group": group, "action_taken": "x"},
+                "experiments": {experiment.name: group},
+            }
+
+        def log(records):
+            with open(log_path, 'a') as f:
+                f.writelines(json.dumps(record) + "\n" for record in records)
+            store.record_predictions(records)
+
+        records = [score(f"customer-{i}", now - 60 * repeat) for repeat in (3, 2, 1) for i in range(400)]
+        log(records)
+
+        analytics.tail()
+        before = analytics.summary(experiment.name)
+        assert all(group["churn_rate"] is None for group in before["groups"].values()), before
+        assert "churn_rate" not in before["comparisons"].get("B", {}), before
+
+        # Control customers churn at 50%, treated ones at 25%
+        labels = []
+        for i in range(400):
+            customer_id = f"customer-{i}"
+            churned = i % 2 == 0 if experiment.assign(customer_id) == "A" else i % 4 == 0
+            labels.append((customer_id, churned, now))
+        matched = store.add_labels(labels)
+        analytics.tail()
+        after = analytics.summary(experiment.name)
+
+        # Ten churned control customers are scored again and come back, after a restart
+        returning = [customer_id for customer_id, churned, _ in labels
+                     if churned and experiment.assign(customer_id) == "A"][:10]
+        log([score(customer_id, now + 1) for customer_id in returning])
+        store.add_labels([(customer_id, False, now + 2) for customer_id in returning])
+        restarted = ExperimentAnalytics(log_path, experiments, poll_seconds=0, state_path=state_path, outcomes=store)
+        restarted.tail()
+        relabeled = restarted.summary(experiment.name)["groups"]["A"]
+        store.close()
+
+    groups, comparison = after["groups"], after["comparisons"]["B"]["churn_rate"]
+    assert matched == len(records), matched
+    assert groups["A"]["outcomes"] + groups["B"]["outcomes"] == 400, groups
+    assert relabeled["outcomes"] == groups["A"]["outcomes"], relabeled
+    churned_before = round(groups["A"]["churn_rate"] * groups["A"]["outcomes"])
+    assert round(relabeled["churn_rate"] * relabeled["outcomes"]) == churned_before - 10, relabeled
+    assert abs(groups["A"]["churn_rate"] - 0.5) < 0.05 and abs(groups["B"]["churn_rate"] - 0.25) < 0.05, groups
+    assert comparison["relative_uplift"] > 0.3 and comparison["ci_high"] < 0, comparison
+    print(f"churn rate A {groups['A']['churn_rate']:.3f} ({groups['A']['outcomes']} outcomes), "
+          f"B {groups['B']['churn_rate']:.3f} ({groups['B']['outcomes']} outcomes); "
+          f"uplift {comparison['relative_uplift']:.1%}, p={comparison['p_value']:.2g}")
+    print("OK: labeled predictions change the experiment churn rates.")
+
+
+if __name__ == '__main__':
+    main()
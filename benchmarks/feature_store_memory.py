@@ -0,0 +1,104 @@
+# benchmarks/feature_store_memory.py
+
+# Compares the old DataFrame-based customer lookup with the columnar CustomerStore:
+# resident memory of the loaded table and allocations per simulated request.
+#
+# Usage (from the project root):
+#     python benchmarks/feature_store_memory.py [--csv data/crm_data.csv] [--requests 2000]
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine.feature_store import CustomerStore
+from engine.nba_engine import recommend_action
+
+
+def rss_mb():
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def measure_load(loader):
+    """Returns (object, RSS growth in MB, traced bytes held) for loading the table."""
+    gc.collect()
+    rss_before = rss_mb()
+    tracemalloc.start()
+    obj = loader()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    return obj, rss_mb() - rss_before, held
+
+
+def dataframe_request(customer_data, customer_id):
+    # The pre-store request path: .loc, a one-row DataFrame and repeated to_dict() copies
+    customer_profile = customer_data.loc[customer_id]
+    customer_df = pd.DataFrame([customer_profile])
+    recommend_action(customer_profile.to_dict())
+    features = customer_profile.to_dict()
+    return customer_df, features
+
+
+def store_request(store, customer_id):
+    customer_profile = store.row(store.position(customer_id))
+    recommend_action(customer_profile)
+    features = customer_profile.to_dict()
+    return customer_profile, features
+
+
+def measure_latency(request_fn, table, ids):
+    """Returns the mean microseconds per request."""
+    request_fn(table, ids[0])  # warm up caches
+    start = time.perf_counter()
+    for customer_id in ids:
+        request_fn(table, customer_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def measure_peak_per_request(request_fn, table, ids):
+    """Peak traced allocation of a single request, averaged over `ids`."""
+    peaks = []
+    for customer_id in ids:
+        tracemalloc.start()
+        request_fn(table, customer_id)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+    return sum(peaks) / len(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of the DataFrame-based customer lookup vs. the columnar CustomerStore.")
+    parser.add_argument('--csv', default='data/crm_data.csv')
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    frame, frame_rss, frame_bytes = measure_load(lambda: pd.read_csv(args.csv).set_index('CustomerID'))
+    store, store_rss, store_bytes = measure_load(lambda: CustomerStore.from_csv(args.csv))
+
+    ids = random.Random(0).choices(store.id_list(), k=args.requests)
+    frame_us = measure_latency(dataframe_request, frame, ids)
+    store_us = measure_latency(store_request, store, ids)
+    frame_peak = measure_peak_per_request(dataframe_request, frame, ids[:200])
+    store_peak = measure_peak_per_request(store_request, store, ids[:200])
+
+    print(f"Rows: {len(store)}")
+    print(f"{'':28}{'DataFrame':>14}{'CustomerStore':>16}")
+    # The store figure covers the column arrays; the ID strings and hash index come on top
+    print(f"{'table memory (deep, MB)':28}{frame.memory_usage(deep=True).sum() / 1e6:>14.2f}{store.memory_bytes() / 1e6:>16.2f}")
+    print(f"{'load: traced alloc (MB)':28}{frame_bytes / 1e6:>14.2f}{store_bytes / 1e6:>16.2f}")
+    print(f"{'load: RSS growth (MB)':28}{frame_rss:>14.2f}{store_rss:>16.2f}")
+    print(f"{'request: peak alloc (KB)':28}{frame_peak / 1e3:>14.2f}{store_peak / 1e3:>16.2f}")
+    print(f"{'request: latency (us)':28}{frame_us:>14.1f}{store_us:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/llm_concurrency.py
+
+# Shows that slow LLM calls no longer stall the rest of the API.
+# Starts the LLM stand-in (with a configurable delay) and the API in-process, then
+# measures /predict throughput for customers outside the experiment, first alone and
+# then while at-risk requests keep LLM generations in flight.
+#
+# Usage (from the project root):
+#     CHURN_MODEL_URI=<model uri or local artifact dir> python benchmarks/llm_concurrency.py --delay 2
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.llm_stub_server import create_app as create_stub_app
+from benchmarks.servers import BackgroundServer
+
+
+async def hammer(client, ids, stop_at, counter):
+    i = 0
+    while time.perf_counter() < stop_at:
+        response = await client.post(f"/predict/{ids[i % len(ids)]}")
+        response.raise_for_status()
+        counter[0] += 1
+        i += 1
+
+
+async def measure_throughput(api_url, ids, duration, concurrency, llm_ids=(), llm_concurrency=0):
+    """Returns requests/sec for `ids`, optionally while `llm_ids` requests run alongside."""
+    limits = httpx.Limits(max_connections=concurrency + llm_concurrency)
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=120) as client:
+        stop_at = time.perf_counter() + duration
+        counter, llm_counter = [0], [0]
+        tasks = [hammer(client, ids[k::concurrency], stop_at, counter) for k in range(concurrency)]
+        tasks += [hammer(client, llm_ids, stop_at, llm_counter) for _ in range(llm_concurrency)]
+        await asyncio.gather(*tasks)
+    return counter[0] / duration, llm_counter[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/predict throughput with and without slow LLM calls in flight.")
+    parser.add_argument('--delay', type=float, default=2.0, help="LLM stand-in latency in seconds")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--llm-concurrency', type=int, default=16)
+    parser.add_argument('--stub-port', type=int, default=8765)
+    parser.add_argument('--api-port', type=int, default=8766)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    os.environ["HF_API_URL"] = f"http://127.0.0.1:{args.stub_port}/generate"
+    import main as api
+
+    with BackgroundServer(create_stub_app(args.delay), args.stub_port), \
+            BackgroundServer(api.app, args.api_port) as server:
+        store = api.customer_data
+        scores = httpx.post(f"{server.url}/predict/batch", json={"customer_ids": store.id_list()}, timeout=300).json()
+        at_risk = [r["customer_id"] for r in scores["results"] if r["experiment_group"] != 'N/A']
+        not_at_risk = [r["customer_id"] for r in scores["results"] if r["experiment_group"] == 'N/A']
+        print(f"{len(at_risk)} at-risk customers, {len(not_at_risk)} outside the experiment")
+
+        baseline, _ = asyncio.run(measure_throughput(server.url, not_at_risk, args.duration, args.concurrency))
+        loaded, llm_requests = asyncio.run(measure_throughput(
+            server.url, not_at_risk, args.duration, args.concurrency, at_risk, args.llm_concurrency))
+        stub_stats = httpx.get(f"http://127.0.0.1:{args.stub_port}/stats").json()
+
+    print(f"non-treatment throughput, no LLM load:   {baseline:8.1f} req/s")
+    print(f"non-treatment throughput, with LLM load: {loaded:8.1f} req/s "
+          f"({llm_requests} at-risk requests, max {stub_stats['max_in_flight']} LLM calls in flight)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/llm_stub_server.py
+
+# A local stand-in for the Hugging Face text-generation API with a configurable delay.
+# Point the API at it with HF_API_URL=http://127.0.0.1:<port>/ to exercise the LLM
+# path without a token, network access or inference cost.
+#
+# Requests with "stream": true are answered like the streaming API: Server-Sent Events,
+# one per token, the first after --first-token-delay and then one every --token-delay
+# seconds. Streams whose client goes away before the end are counted as cancelled.
+#
+# Usage:
+#     python benchmarks/llm_stub_server.py --port 8765 --delay 2.0 --token-delay 0.02
+
+import argparse
+import asyncio
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Streamed, one word (with its leading space) per token, up to max_new_tokens
+EMAIL_TEXT = (
+    "Hi there, thank you for being part of ConnectSphere! We noticed you've been in touch with our support "
+    "team recently, and we want to make sure you're getting everything you need from your plan. If it would "
+    "help, I'd be glad to set up a quick 15-minute call to walk through your goals and share a few tips our "
+    "most successful customers rely on. There's no pressure at all; just reply to this email with a time "
+    "that works for you. Thanks again for choosing us, and we look forward to hearing from you. Best regards, "
+    "the ConnectSphere Customer Success team"
+)
+
+
+def email_tokens(max_new_tokens):
+    words = EMAIL_TEXT.split(" ")
+    return [word if i == 0 else f" {word}" for i, word in enumerate(words)][:max_new_tokens]
+
+
+def create_app(delay=1.0, first_token_delay=0.2, token_delay=0.02):
+    """
+    Builds the stub app.
+
+    Args:
+        delay (float): Seconds to wait before answering each non-streaming generation request.
+        first_token_delay (float): Seconds before the first token of a streaming request.
+        token_delay (float): Seconds between the tokens of a streaming request.
+    """
+    app = FastAPI(title="LLM stand-in")
+    app.state.delay = delay
+    app.state.first_token_delay = first_token_delay
+    app.state.token_delay = token_delay
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    app.state.calls = 0
+    app.state.streams_cancelled = 0
+    app.state.tokens_sent = 0
+
+    async def stream(state, max_new_tokens):
+        tokens = email_tokens(max_new_tokens)
+        finished = False
+        try:
+            await asyncio.sleep(state.first_token_delay)
+            for i, text in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(state.token_delay)
+                last = i == len(tokens) - 1
+                event = {
+                    "token": {"id": i, "text": text, "logprob": 0.0, "special": False},
+                    "generated_text": "".join(tokens) if last else None,
+                    "details": None,
+                }
+                state.tokens_sent += 1
+                yield f"data:{json.dumps(event)}\n\n"
+            finished = True
+        finally:
+            state.in_flight -= 1
+            if not finished:
+                state.streams_cancelled += 1
+
+    @app.post("/{path:path}")
+    async def generate(request: Request):
+        body = await request.json()
+        state = request.app.state
+        state.calls += 1
+        state.in_flight += 1
+        state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        max_new_tokens = body.get("parameters", {}).get("max_new_tokens", 250)
+        if body.get("stream"):
+            # in_flight is released by the stream itself, when it ends or is cancelled
+            return StreamingResponse(stream(state, max_new_tokens), media_type="text/event-stream")
+        try:
+            await asyncio.sleep(state.delay)
+        finally:
+            state.in_flight -= 1
+        return [{"generated_text": f"Hi there, thanks for being with us! ({max_new_tokens} tokens max)"}]
+
+    @app.get("/stats")
+    async def stats(request: Request):
+        state = request.app.state
+        return {"calls": state.calls, "in_flight": state.in_flight, "max_in_flight": state.max_in_flight,
+                "streams_cancelled": state.streams_cancelled, "tokens_sent": state.tokens_sent}
+
+    return app
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local LLM stand-in server")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=1.0)
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.delay, args.first_token_delay, args.token_delay), host="127.0.0.1", port=args.port)
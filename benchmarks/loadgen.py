@@ -0,0 +1,163 @@
+# benchmarks/loadgen.py
+
+# A small load generator for the prediction API.
+# It drives either the FastAPI app in-process (httpx.ASGITransport, no sockets) or a
+# server over HTTP, with customer IDs sampled from data/crm_data.csv.
+#   * closed loop: `concurrency` clients send requests back to back,
+#   * open loop (--rps): requests are scheduled at a fixed rate and latency is measured
+#     from the scheduled start, so a stalled server shows up as latency instead of
+#     silently lowering the offered load.
+#
+# Usage (from the project root):
+#     python benchmarks/loadgen.py --url http://127.0.0.1:8080 --concurrency 16 --duration 20
+#     CHURN_MODEL_URI=... python benchmarks/loadgen.py --in-process --rps 200 --duration 10
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample_customer_ids(n, seed=0, path=None):
+    """Draws `n` CustomerIDs (with replacement) from the CRM file, reproducibly."""
+    with open(path or os.path.join(ROOT, 'data', 'crm_data.csv'), newline='') as f:
+        ids = [row['CustomerID'] for row in csv.DictReader(f)]
+    return random.Random(seed).choices(ids, k=n)
+
+
+def summarize(latencies, statuses, elapsed):
+    """Latency percentiles (ms), throughput and status counts of one load run."""
+    latencies_ms = np.asarray(latencies) * 1000.0
+    ok = sum(count for status, count in statuses.items() if 200 <= status < 300)
+    summary = {
+        "requests": len(latencies),
+        "ok": ok,
+        "errors": len(latencies) - ok,
+        "status_counts": {str(status): count for status, count in sorted(statuses.items())},
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    if len(latencies_ms):
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        summary["latency_ms"] = {
+            "mean": round(float(latencies_ms.mean()), 3),
+            "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3),
+            "max": round(float(latencies_ms.max()), 3),
+        }
+    return summary
+
+
+async def run_load(client, paths, duration, concurrency=8, rps=None):
+    """
+    Sends POST requests to `paths` (cycled) for `duration` seconds.
+
+    Args:
+        client (httpx.AsyncClient): Client bound to the target (HTTP or ASGI transport).
+        paths (list): Request paths, e.g. ["/predict/<id>", ...].
+        duration (float): Seconds to generate load for.
+        concurrency (int): Closed loop: number of clients. Open loop: most requests in flight.
+        rps (float): Open-loop request rate; None for closed loop.
+    Returns:
+        dict: See `summarize`.
+    """
+    latencies, statuses = [], Counter()
+
+    async def send(path, started):
+        try:
+            response = await client.post(path)
+            statuses[response.status_code] += 1
+        except httpx.HTTPError:
+            statuses[-1] += 1
+        latencies.append(time.perf_counter() - started)
+
+    start = time.perf_counter()
+    stop_at = start + duration
+    if rps is None:
+        async def closed_loop(offset):
+            i = offset
+            while time.perf_counter() < stop_at:
+                await send(paths[i % len(paths)], time.perf_counter())
+                i += concurrency
+        await asyncio.gather(*(closed_loop(k) for k in range(concurrency)))
+    else:
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = []
+
+        async def scheduled(path, scheduled_at):
+            async with semaphore:
+                await send(path, scheduled_at)
+
+        for i in range(int(duration * rps)):
+            scheduled_at = start + i / rps
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(scheduled(paths[i % len(paths)], scheduled_at)))
+        await asyncio.gather(*tasks)
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+async def run_in_process(app, paths, duration, concurrency=8, rps=None, warmup_requests=50):
+    """Runs the app's startup hooks, drives it through httpx.ASGITransport, then shuts it down."""
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://in-process", timeout=120) as client:
+            for path in paths[:warmup_requests]:
+                await client.post(path)
+            return await run_load(client, paths, duration, concurrency, rps)
+    finally:
+        await app.router.shutdown()
+
+
+async def run_http(url, paths, duration, concurrency=8, rps=None, warmup_requests=50):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        for path in paths[:warmup_requests]:
+            await client.post(path)
+        return await run_load(client, paths, duration, concurrency, rps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A small load generator for the prediction API.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="Base URL of a running server")
+    target.add_argument('--in-process', action='store_true', help="Import main and drive app through ASGI")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rps', type=float, help="Open-loop request rate (default: closed loop)")
+    parser.add_argument('--requests-pool', type=int, default=5000, help="Number of sampled customer IDs")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    paths = [f"/predict/{customer_id}" for customer_id in sample_customer_ids(args.requests_pool, args.seed)]
+    if args.in_process:
+        os.chdir(ROOT)
+        sys.path.insert(0, ROOT)
+        import main as api
+
+        summary = asyncio.run(run_in_process(api.app, paths, args.duration, args.concurrency, args.rps))
+    else:
+        summary = asyncio.run(run_http(args.url, paths, args.duration, args.concurrency, args.rps))
+
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# benchmarks/multi_worker.py
+
+# Per-worker memory and aggregate throughput of the gunicorn multi-worker mode.
+# For each worker count the server is started with gunicorn.conf.py, then several
+# load-generator processes send POST /predict/{id} for customers outside the
+# experiment (so no LLM call is involved). Memory is read per worker with psutil:
+# RSS counts shared pages in every process, USS only the pages private to a worker,
+# and PSS splits shared pages between the processes that map them.
+#
+# Usage (from the project root):
+#     CHURN_MODEL_URI=<model uri or local artifact dir> python benchmarks/multi_worker.py --workers 1 2 4
+#     ... --no-shared   # each worker parses the CSV on its own, for comparison
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def not_at_risk_ids(limit=2000):
+    """CustomerIDs the model scores below the experiment threshold (no email generation)."""
+    import main
+
+    main.model_watcher.load()
+    main.load_customer_data(refresh_scores=False)
+    data = main.customer_data
+    scores = main.score_customers(main.churn_model, data, slice(None))
+    positions = [int(p) for p in (scores < main.CHURN_THRESHOLD).nonzero()[0][:limit]]
+    return data.id_list(positions)
+
+
+async def _hammer(url, ids, duration, concurrency):
+    done = 0
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=httpx.Limits(max_connections=concurrency)) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def loop(offset):
+            nonlocal done
+            i = offset
+            while time.perf_counter() < stop_at:
+                response = await client.post(f"/predict/{ids[i % len(ids)]}")
+                response.raise_for_status()
+                done += 1
+                i += concurrency
+        await asyncio.gather(*(loop(k) for k in range(concurrency)))
+    return done
+
+
+def load_generator(args):
+    url, ids, duration, concurrency = args
+    return asyncio.run(_hammer(url, ids, duration, concurrency))
+
+
+def wait_until_ready(url, server, timeout=180.0):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup.")
+        try:
+            if httpx.get(f"{url}/", timeout=2).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("gunicorn did not become ready.")
+
+
+def worker_memory(master_pid):
+    workers = psutil.Process(master_pid).children()
+    stats = []
+    for worker in workers:
+        info = worker.memory_full_info()
+        stats.append({"rss_mb": info.rss / 1e6, "uss_mb": info.uss / 1e6, "pss_mb": getattr(info, 'pss', 0) / 1e6})
+    return stats
+
+
+def run(n_workers, shared, ids, args, env):
+    url = f"http://127.0.0.1:{args.port}"
+    env = {**env, "WEB_CONCURRENCY": str(n_workers), "PORT": str(args.port),
+           "SHARED_CUSTOMER_STORE": "true" if shared else "false"}
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(url, server)
+        # Let every worker finish its startup before measuring
+        time.sleep(2)
+        with multiprocessing.Pool(args.clients) as pool:
+            counts = pool.map(load_generator, [(url, ids[k::args.clients], args.duration, args.concurrency)
+                                               for k in range(args.clients)])
+        memory = worker_memory(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        "workers": n_workers,
+        "shared_store": shared,
+        "rps": round(sum(counts) / args.duration, 1),
+        "per_worker_rss_mb": round(sum(m["rss_mb"] for m in memory) / len(memory), 1),
+        "per_worker_uss_mb": round(sum(m["uss_mb"] for m in memory) / len(memory), 1),
+        "total_pss_mb": round(sum(m["pss_mb"] for m in memory), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory and aggregate throughput of the gunicorn multi-worker mode.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--clients', type=int, default=4, help="Load generator processes")
+    parser.add_argument('--concurrency', type=int, default=16, help="Connections per load generator")
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--no-shared', action='store_true', help="Load the CSV in every worker instead")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    scratch = tempfile.mkdtemp(prefix='multi-worker-')
+    env = {**os.environ, "MODEL_POLL_SECONDS": "0", "SHARED_DATA_DIR": os.path.join(scratch, 'shared'),
+           "PREDICTION_LOG_PATH": os.path.join(scratch, 'predictions.jsonl')}
+    os.environ.update(env)
+    ids = not_at_risk_ids()
+    print(f"{os.cpu_count()} CPUs available; {len(ids)} not-at-risk customers in the request mix.")
+
+    results = []
+    print(f"{'workers':>7} {'shared':>7} {'req/s':>9} {'RSS/worker':>11} {'USS/worker':>11} {'total PSS':>10}  (MB)")
+    for n_workers in args.workers:
+        r = run(n_workers, not args.no_shared, ids, args, env)
+        results.append(r)
+        print(f"{r['workers']:>7} {str(r['shared_store']):>7} {r['rps']:>9.1f} {r['per_worker_rss_mb']:>11.1f} "
+              f"{r['per_worker_uss_mb']:>11.1f} {r['total_pss_mb']:>10.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+# benchmarks/servers.py
+
+# Helpers to run ASGI apps (the API or the LLM stand-in) in a background thread,
+# so a benchmark script can drive them over real HTTP from the same process.
+
+import threading
+import time
+
+import uvicorn
+
+
+class BackgroundServer:
+    """Runs `app` with uvicorn on 127.0.0.1:`port` in a daemon thread."""
+
+    def __init__(self, app, port):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError(f"Server on port {self.port} failed to start.")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
@@ -0,0 +1,118 @@
+# benchmarks/startup.py
+
+# Measures cold start with and without FAST_START.
+# Every measurement runs in a fresh interpreter:
+#   * import time of `main`,
+#   * model load time (registry + mlflow, or the local model cache),
+#   * time from spawning `uvicorn main:app` to the first successful /predict.
+# The first FAST_START process finds an empty cache and fills it, so it is run once
+# before measuring.
+#
+# Usage (from the project root):
+#     CHURN_MODEL_URI=<model uri or local artifact dir> python benchmarks/startup.py --runs 3
+
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_AND_LOAD = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.model_watcher.load(prefer_cache=main.FAST_START)
+loaded = time.perf_counter()
+print(json.dumps({"import_seconds": imported - start, "model_load_seconds": loaded - imported,
+                  "loaded_from_cache": main.model_watcher.loaded_from_cache}))
+"""
+
+
+def measure_import_and_load(env):
+    result = subprocess.run([sys.executable, "-c", IMPORT_AND_LOAD], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_first_predict(env, customer_id, port, timeout=120.0):
+    """Seconds from spawning the server until POST /predict/{customer_id} returns 200."""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while time.perf_counter() - start < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError("Server exited during startup.")
+                try:
+                    if client.post(f"/predict/{customer_id}").status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.02)
+        raise TimeoutError("No successful /predict before the timeout.")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def first_customer_id():
+    with open(os.path.join(ROOT, 'data', 'crm_data.csv'), newline='') as f:
+        return next(csv.DictReader(f))['CustomerID']
+
+
+def summarize(values):
+    return {"median": round(statistics.median(values), 4), "min": round(min(values), 4), "max": round(max(values), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start with and without FAST_START.")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8770)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    customer_id = first_customer_id()
+    cache_dir = tempfile.mkdtemp(prefix='churn-model-cache-')
+    # No LLM calls are needed to measure startup; don't let the poller interfere either
+    base_env = {**os.environ, "MODEL_POLL_SECONDS": "0", "MODEL_CACHE_DIR": cache_dir,
+                "PREDICTION_LOG_PATH": os.path.join(cache_dir, 'predictions.jsonl')}
+    modes = {
+        "default": {**base_env, "FAST_START": "false"},
+        "fast_start": {**base_env, "FAST_START": "true"},
+    }
+    measure_import_and_load(modes["fast_start"])  # Fills the model cache
+
+    results = {}
+    for mode, env in modes.items():
+        runs = [measure_import_and_load(env) for _ in range(args.runs)]
+        first_predict = [measure_first_predict(env, customer_id, args.port) for _ in range(args.runs)]
+        results[mode] = {
+            "import_seconds": summarize([r["import_seconds"] for r in runs]),
+            "model_load_seconds": summarize([r["model_load_seconds"] for r in runs]),
+            "loaded_from_cache": all(r["loaded_from_cache"] for r in runs),
+            "first_predict_seconds": summarize(first_predict),
+        }
+
+    print(f"{'':12} {'import':>10} {'model load':>12} {'first /predict':>16}   (medians of {args.runs} runs, seconds)")
+    for mode, r in results.items():
+        print(f"{mode:12} {r['import_seconds']['median']:>10.3f} {r['model_load_seconds']['median']:>12.3f} "
+              f"{r['first_predict_seconds']['median']:>16.3f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
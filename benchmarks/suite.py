@@ -0,0 +1,153 @@
+# benchmarks/suite.py
+
+# Runs the whole benchmark suite and writes one JSON result file:
+#   * component micro-benchmarks (benchmarks/components.py),
+#   * load tests of /predict in-process (ASGI) and over HTTP (benchmarks/loadgen.py),
+#     with the LLM step answered by the local stub server at a configurable latency.
+# The result records the git commit, model run_id and settings, so two files can be
+# compared across code changes or model versions with --compare.
+#
+# Usage (from the project root):
+#     CHURN_MODEL_URI=<model uri or local artifact dir> python benchmarks/suite.py --output results.json
+#     python benchmarks/suite.py --compare baseline.json results.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.components import run_components
+from benchmarks.llm_stub_server import create_app as create_stub_app
+from benchmarks.loadgen import run_http, run_in_process, sample_customer_ids
+from benchmarks.servers import BackgroundServer
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    os.chdir(ROOT)
+    os.environ["HF_API_URL"] = f"http://127.0.0.1:{args.stub_port}/generate"
+    os.environ.setdefault("MODEL_POLL_SECONDS", "0")
+    import main as api
+
+    paths = [f"/predict/{customer_id}" for customer_id in sample_customer_ids(args.requests_pool, args.seed)]
+    results = {
+        "meta": {
+            "timestamp": time.time(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "inference_backend": api.CHURN_INFERENCE_BACKEND,
+            "precompute_scores": api.PRECOMPUTE_SCORES,
+            "llm_delay_seconds": args.llm_delay,
+            "duration_seconds": args.duration,
+            "concurrency": args.concurrency,
+            "rps": args.rps,
+            "seed": args.seed,
+        },
+    }
+
+    with BackgroundServer(create_stub_app(args.llm_delay), args.stub_port):
+        print("Load test, in-process (closed loop)...")
+        results["load_in_process"] = asyncio.run(run_in_process(api.app, paths, args.duration, args.concurrency))
+        if args.rps:
+            print(f"Load test, in-process (open loop, {args.rps} req/s)...")
+            results["load_in_process_open_loop"] = asyncio.run(
+                run_in_process(api.app, paths, args.duration, args.concurrency, rps=args.rps))
+
+        with BackgroundServer(api.app, args.api_port) as server:
+            print("Load test over HTTP (closed loop)...")
+            results["load_http"] = asyncio.run(run_http(server.url, paths, args.duration, args.concurrency))
+            print("Component micro-benchmarks...")
+            results["components"] = run_components(api, seed=args.seed)
+            results["meta"]["model_run_id"] = api.churn_model.metadata.run_id
+    return results
+
+
+def flatten(results, prefix=""):
+    """{'load_http': {'latency_ms': {'p99': 3.1}}} -> {'load_http.latency_ms.p99': 3.1} (numbers only)."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+# Metric suffixes where a larger number is better; everything else timed is lower-is-better
+HIGHER_IS_BETTER = ('throughput_rps', 'calls_per_second', '.ok')
+COMPARED = ('latency_ms.', 'throughput_rps', 'median_us', 'errors')
+
+
+def compare(base_path, new_path, threshold=0.10):
+    """Prints every timed metric of two result files with its relative change; returns the regressions."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"base: commit {base['meta'].get('git_commit')}, run_id {base['meta'].get('model_run_id')}")
+    print(f"new:  commit {new['meta'].get('git_commit')}, run_id {new['meta'].get('model_run_id')}")
+
+    base_flat, new_flat = flatten(base), flatten(new)
+    regressions = []
+    print(f"{'metric':55} {'base':>12} {'new':>12} {'change':>9}")
+    for name in sorted(base_flat.keys() & new_flat.keys()):
+        if name.startswith('meta.') or not any(part in name for part in COMPARED):
+            continue
+        old, current = base_flat[name], new_flat[name]
+        change = (current - old) / old if old else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:55} {old:>12.3f} {current:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the whole benchmark suite, or compare two result files.")
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rps', type=float, help="Also run an open-loop test at this request rate")
+    parser.add_argument('--llm-delay', type=float, default=0.5, help="Stub LLM latency in seconds")
+    parser.add_argument('--requests-pool', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stub-port', type=int, default=8765)
+    parser.add_argument('--api-port', type=int, default=8766)
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="Compare two result files and exit")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change flagged as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, threshold=args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    results = run_suite(args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    for name in ('load_in_process', 'load_in_process_open_loop', 'load_http'):
+        if name in results:
+            r = results[name]
+            latency = r.get('latency_ms', {})
+            print(f"{name:28} {r['throughput_rps']:>9.1f} req/s  p50 {latency.get('p50', 0):8.2f} ms  "
+                  f"p95 {latency.get('p95', 0):8.2f} ms  p99 {latency.get('p99', 0):8.2f} ms  errors {r['errors']}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
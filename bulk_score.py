@@ -0,0 +1,231 @@
+# bulk_score.py
+
+# Offline bulk scoring: churn probability, NBA segment and recommended action for every
+# customer in a CRM file, for nightly campaigns that would otherwise call /predict once
+# per customer.
+#
+# The CRM file (CSV or Parquet) is streamed in fixed-size chunks; each chunk is scored
+# with one vectorized model call and one vectorized NBA call, in a pool of worker
+# processes, and written as its own part file (part-00000.parquet, ...) in the output
+# directory, which pandas and pyarrow read back as a single dataset. A part file is
+# only renamed into place once complete, so after an interruption a rerun with the same
+# arguments skips the finished chunks and picks up where it stopped.
+#
+# Everything runs locally: the model comes from the MLflow store (./mlruns unless
+# MLFLOW_TRACKING_URI says otherwise) or straight from an artifact directory.
+#
+# Usage (from the project root):
+#     python bulk_score.py --output scores/
+#     python bulk_score.py --input /tmp/crm_10m.parquet --output /tmp/scores_10m --workers 4 \
+#         --model-uri mlruns/<experiment>/models/<model>/artifacts
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from engine.experiments import EXPERIMENTS_PATH, ExperimentSet
+from engine.fast_inference import download_model, load_model_dir, predict_columns
+from engine.feature_store import CATEGORICAL_COLUMNS, ID_COLUMN, NUMERIC_DTYPES
+from engine.nba_engine import recommend_actions
+
+MANIFEST = '_manifest.json'
+SUCCESS_MARKER = '_SUCCESS'
+
+# Set in each worker process by `_init_worker`
+_model = None
+
+
+def read_chunks(path, chunk_size):
+    """
+    Yields DataFrames of exactly `chunk_size` rows (the last one may be shorter), so
+    chunk i always covers the same rows and a resumed run lines up with the first one.
+    """
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pending = []
+        pending_rows = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= chunk_size:
+                table = pa.Table.from_batches(pending)
+                yield table.slice(0, chunk_size).to_pandas()
+                rest = table.slice(chunk_size)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+        if pending_rows:
+            yield pa.Table.from_batches(pending).to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype={ID_COLUMN: str, **NUMERIC_DTYPES})
+
+
+def part_path(output_dir, index, fmt):
+    return os.path.join(output_dir, f"part-{index:05d}.{fmt}")
+
+
+def _init_worker(model):
+    global _model
+    _model = model
+
+
+def score_chunk(df, model, threshold):
+    """
+    Scores one chunk.
+
+    Returns:
+        pd.DataFrame: CustomerID, churn_probability, at_risk, segment and recommended_action.
+    """
+    columns = {name: df[name].to_numpy() for name in list(NUMERIC_DTYPES) + CATEGORICAL_COLUMNS if name in df}
+    churn_probs = predict_columns(model, columns)
+    segments, actions = recommend_actions(columns)
+    return pd.DataFrame({
+        ID_COLUMN: df[ID_COLUMN].to_numpy(),
+        'churn_probability': churn_probs.astype(np.float32),
+        'at_risk': churn_probs >= threshold,
+        'segment': segments,
+        'recommended_action': actions,
+    })
+
+
+def _score_task(index, df, output_dir, fmt, threshold, run_id):
+    """Scores chunk `index` and writes its part file. Runs in a worker process."""
+    started = time.perf_counter()
+    out = score_chunk(df, _model, threshold)
+    out['model_run_id'] = run_id
+    out['scored_at'] = pd.Timestamp.now(tz='UTC')
+    path = part_path(output_dir, index, fmt)
+    tmp_path = f"{path}.tmp"
+    if fmt == 'parquet':
+        out.to_parquet(tmp_path, index=False, compression='zstd')
+    else:
+        out.to_csv(tmp_path, index=False)
+    # Renamed only once complete: an existing part file is always a finished chunk
+    os.replace(tmp_path, path)
+    return index, len(out), time.perf_counter() - started
+
+
+def _input_fingerprint(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def prepare_output(output_dir, manifest, restart=False):
+    """
+    Creates the output directory, or checks that an existing one belongs to the same
+    input, model and chunking so its part files can be reused.
+
+    Returns:
+        set: Indexes of the chunks that are already complete.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    if restart and os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        keys = ('input', 'run_id', 'chunk_size', 'format', 'threshold')
+        changed = [key for key in keys if previous.get(key) != manifest[key]]
+        if changed:
+            raise SystemExit(f"{output_dir} holds a run with a different {', '.join(changed)}; "
+                             f"use another --output or --restart.")
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    suffix = f".{manifest['format']}"
+    return {int(name[5:-len(suffix)]) for name in os.listdir(output_dir)
+            if name.startswith('part-') and name.endswith(suffix)}
+
+
+def run(args):
+    print(f"Loading model {args.model_uri}...")
+    model = load_model_dir(download_model(args.model_uri), backend=args.backend)
+    run_id = model.metadata.run_id
+    fmt = 'csv' if args.format == 'csv' else 'parquet'
+    manifest = {
+        "input": _input_fingerprint(args.input),
+        "model_uri": args.model_uri,
+        "run_id": run_id,
+        "chunk_size": args.chunk_size,
+        "format": fmt,
+        "threshold": args.threshold,
+    }
+    done = prepare_output(args.output, manifest, restart=args.restart)
+    if os.path.exists(os.path.join(args.output, SUCCESS_MARKER)):
+        print(f"{args.output} is already complete (run_id={run_id}).")
+        return
+    if done:
+        print(f"Resuming: {len(done)} chunks already scored.")
+
+    started = time.perf_counter()
+    rows = chunks = 0
+    pool = ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(model,)) if args.workers > 1 else None
+    if pool is None:
+        _init_worker(model)
+    pending = set()
+
+    def collect(results):
+        nonlocal rows, chunks
+        for index, n, seconds in results:
+            rows += n
+            chunks += 1
+            elapsed = time.perf_counter() - started
+            print(f"chunk {index:5d}: {n} rows in {seconds:.2f}s ({rows} rows so far, {rows / elapsed:,.0f} rows/s)")
+
+    try:
+        for index, df in enumerate(read_chunks(args.input, args.chunk_size)):
+            if index in done:
+                continue
+            task = (index, df, args.output, fmt, args.threshold, run_id)
+            if pool is None:
+                collect([_score_task(*task)])
+                continue
+            pending.add(pool.submit(_score_task, *task))
+            # At most two chunks per worker in flight, so memory stays bounded however big the input
+            if len(pending) >= 2 * args.workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(future.result() for future in finished)
+        finished, pending = wait(pending)
+        collect(future.result() for future in finished)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    open(os.path.join(args.output, SUCCESS_MARKER), 'w').close()
+    elapsed = time.perf_counter() - started
+    print(f"Scored {rows} rows in {chunks} chunks in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s) "
+          f"with run_id={run_id}; output in {args.output}")
+
+
+def main():
+    default_threshold = ExperimentSet.from_file(EXPERIMENTS_PATH).primary.min_churn_probability
+    parser = argparse.ArgumentParser(description="Score every customer of a CRM file offline.")
+    parser.add_argument('--input', default='data/crm_data.csv', help="CRM data (.csv or .parquet)")
+    parser.add_argument('--output', default='scores', help="Output directory of part files")
+    parser.add_argument('--format', choices=('parquet', 'csv'), default='parquet')
+    parser.add_argument('--model-uri', default=os.getenv("CHURN_MODEL_URI", "models:/churn-predictor/Production"),
+                        help="Registry URI, runs:/ URI or local artifact directory")
+    parser.add_argument('--backend', default=os.getenv("CHURN_INFERENCE_BACKEND", "native"), choices=('native', 'pyfunc'))
+    parser.add_argument('--chunk-size', type=int, default=200_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threshold', type=float, default=default_threshold,
+                        help="Churn probability at which a customer counts as at risk")
+    parser.add_argument('--restart', action='store_true', help="Discard a previous, unfinished run in --output")
+    args = parser.parse_args()
+    try:
+        run(args)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume from the last completed chunk.")
+        sys.exit(130)
+
+
+if __name__ == '__main__':
+    main()
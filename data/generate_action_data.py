@@ -29,75 +29,174 @@
 # Support calls are most effective for customers who are actively struggling (high support tickets).
 # Educational content is best for new customers who may not yet see the product's full value (low tenure, low usage).
 
-import pandas as pd
+# The script streams the CRM file in chunks, so it scales with the CRM data (see
+# generate_data.py); the actions and outcomes of chunk i are drawn from the i-th child
+# seed, and the success rules are evaluated on whole columns at once. With several
+# workers only a few chunks are read ahead of the writer, so memory stays bounded.
+#
+# Usage (from the project root):
+#     python data/generate_action_data.py
+#     python data/generate_action_data.py --input /tmp/crm_10m.parquet --output /tmp/actions_10m.parquet \
+#         --seed 7 --workers 4 --check
+
+import argparse
+from multiprocessing import Pool
+
 import numpy as np
+import pandas as pd
 
-print("Loading existing CRM data...")
-df = pd.read_csv('data/crm_data.csv')
+from generate_data import CHUNK_SIZE, ChunkWriter, imap_bounded, read_chunks
 
 # --- Configuration ---
 ACTIONS = ["20% Discount Offer", "Proactive Support Call", "Send Educational Content", "No Action"]
+INPUT_PATH = "data/crm_data.csv"
 FILE_PATH = "data/action_outcomes.csv"
-
-# --- Simulate Historical Actions ---
-print("Simulating historical actions taken for each customer...")
-# Assign a random action to each customer
-df['ActionTaken'] = np.random.choice(ACTIONS, size=len(df))
-
-# --- Simulate the Outcome (ChurnPrevented) based on rules ---
-print("Simulating action outcomes based on business logic...")
-# Start with a baseline success probability for each action
-baseline_success = {
-    "20% Discount Offer": 0.30,      # 30% baseline success
-    "Proactive Support Call": 0.25,  # 25% baseline success
-    "Send Educational Content": 0.20, # 20% baseline success
-    "No Action": 0.02                # 2% "self-cure" rate
-}
-
-# Calculate success probability for each row
-def calculate_success_prob(row):
-    action = row['ActionTaken']
-    prob = baseline_success[action]
+OUTPUT_COLUMNS = ['CustomerID', 'Tenure', 'MonthlyRevenue', 'UsageFrequency', 'SupportTickets', 'ActionTaken', 'ChurnPrevented']
+
+# Start with a baseline success probability for each action, in ACTIONS order
+BASELINE_SUCCESS = np.array([
+    0.30,  # 20% Discount Offer: 30% baseline success
+    0.25,  # Proactive Support Call: 25% baseline success
+    0.20,  # Send Educational Content: 20% baseline success
+    0.02,  # No Action: 2% "self-cure" rate
+])
+DISCOUNT, SUPPORT_CALL, EDUCATION, NO_ACTION = range(len(ACTIONS))
+# Mixed into --seed: otherwise the chunk seeds would be generate_data.py's for the same --seed,
+# and the action draw would replay its SubscriptionTier draw (every Basic customer a discount)
+SEED_SALT = 0x4E4241
+
+
+def success_probabilities(df, action):
+    """
+    The chance that `action` (indices into ACTIONS) prevents each customer's churn.
+
+    Args:
+        df (pd.DataFrame): CRM rows.
+        action (np.ndarray): The action taken per row.
+    """
+    revenue, tickets = df['MonthlyRevenue'].to_numpy(), df['SupportTickets'].to_numpy()
+    tenure, usage = df['Tenure'].to_numpy(), df['UsageFrequency'].to_numpy()
+    prob = BASELINE_SUCCESS[action].copy()
 
     # Rule 1: Discounts are more effective for high-revenue customers
-    if action == "20% Discount Offer" and row['MonthlyRevenue'] > 75:
-        prob += 0.30 # Big boost
+    prob += np.where((action == DISCOUNT) & (revenue > 75), 0.30, 0)  # Big boost
 
     # Rule 2: Support calls are very effective for those with many tickets
-    if action == "Proactive Support Call" and row['SupportTickets'] > 4:
-        prob += 0.40 # Big boost
+    prob += np.where((action == SUPPORT_CALL) & (tickets > 4), 0.40, 0)  # Big boost
 
     # Rule 3: Education is effective for new, inactive users
-    if action == "Send Educational Content" and row['Tenure'] < 12 and row['UsageFrequency'] < 20:
-        prob += 0.35 # Big boost
+    prob += np.where((action == EDUCATION) & (tenure < 12) & (usage < 20), 0.35, 0)  # Big boost
 
     # Rule 4: Discounts are less effective on brand new customers
-    if action == "20% Discount Offer" and row['Tenure'] < 6:
-        prob -= 0.15
+    prob -= np.where((action == DISCOUNT) & (tenure < 6), 0.15, 0)
 
     # Rule 5: If churn was predicted, there's a chance to prevent it. Otherwise, no.
-    if row['Churn'] == 0:
-        return 0 # Cannot prevent churn that wasn't going to happen
-
-    return min(max(prob, 0), 1) # Ensure probability is between 0 and 1
-
-# Apply the logic
-success_probabilities = df.apply(calculate_success_prob, axis=1)
-
-# Determine the final outcome based on the probability
-df['ChurnPrevented'] = (np.random.rand(len(df)) < success_probabilities).astype(int)
-
-# --- Finalize and Save ---
-print(f"Saving simulated action data to {FILE_PATH}...")
-# We only need a subset of columns for this analysis
-action_df = df[['CustomerID', 'Tenure', 'MonthlyRevenue', 'UsageFrequency', 'SupportTickets', 'ActionTaken', 'ChurnPrevented']]
-action_df.to_csv(FILE_PATH, index=False)
-
-
-print("\n--- Action Data Generation Complete ---")
-print(f"Data saved to: {FILE_PATH}")
-print("\nSuccess rate of each action (on customers who were predicted to churn):")
-# Filter for customers who were originally going to churn to get meaningful stats
-print(df[df['Churn'] == 1].groupby('ActionTaken')['ChurnPrevented'].mean())
-print("\nSample of the new data:")
-print(action_df.head())
\ No newline at end of file
+    # (Cannot prevent churn that wasn't going to happen.) Ensure probability is between 0 and 1.
+    return np.where(df['Churn'].to_numpy() == 0, 0.0, np.clip(prob, 0, 1))
+
+
+def simulate_chunk(task):
+    """Assigns a random historical action to every row of a chunk and simulates its outcome."""
+    seed, df = task
+    rng = np.random.default_rng(seed)
+    action = rng.integers(0, len(ACTIONS), len(df))
+    prevented = rng.random(len(df)) < success_probabilities(df, action)
+    out = df[OUTPUT_COLUMNS[:5]].reset_index(drop=True)
+    out['ActionTaken'] = np.array(ACTIONS, dtype=object)[action]
+    out['ChurnPrevented'] = prevented.astype(np.int8)
+    return out, df['Churn'].to_numpy()
+
+
+def generate(input_path, output_path, chunk_size=CHUNK_SIZE, seed=None, workers=1):
+    """
+    Simulates actions and outcomes for every customer in `input_path`.
+
+    Returns:
+        dict: The seed used, the row count, and per action the number of churners that
+        received it and how many of those were prevented.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    seeds = np.random.SeedSequence([seed, SEED_SALT]).spawn
+    # Child seeds are spawned as chunks arrive, so the file never has to be counted first
+    tasks = ((seeds(1)[0], df) for df in read_chunks(input_path, chunk_size))
+    pool = Pool(workers) if workers > 1 else None
+
+    rows = 0
+    churners = np.zeros(len(ACTIONS), dtype=np.int64)
+    prevented = np.zeros(len(ACTIONS), dtype=np.int64)
+    try:
+        with ChunkWriter(output_path) as writer:
+            for out, churn in imap_bounded(pool, simulate_chunk, tasks, workers):
+                writer.write(out)
+                rows += len(out)
+                action = pd.Categorical(out['ActionTaken'], categories=ACTIONS).codes
+                churned = churn == 1
+                churners += np.bincount(action[churned], minlength=len(ACTIONS))
+                prevented += np.bincount(action[churned], weights=out['ChurnPrevented'].to_numpy()[churned],
+                                         minlength=len(ACTIONS)).astype(np.int64)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return {"seed": seed, "rows": rows, "churners": churners, "prevented": prevented}
+
+
+def check(input_path, output_path, summary, chunk_size=CHUNK_SIZE):
+    """
+    Checks the written outcomes against this script's own success rules: the file lines
+    up with the CRM rows, no churn is prevented for non-churners, and the success rate of
+    each action among churners is within sampling error of the rate the rules imply.
+    Agreement with the original row-by-row rules is what tests/test_generate_action_data.py
+    covers.
+
+    Raises:
+        AssertionError: On the first violated rule.
+    """
+    expected = np.zeros(len(ACTIONS))
+    rows = 0
+    for crm, out in zip(read_chunks(input_path, chunk_size), read_chunks(output_path, chunk_size)):
+        assert list(out.columns) == OUTPUT_COLUMNS, list(out.columns)
+        assert (out['CustomerID'].to_numpy() == crm['CustomerID'].to_numpy()).all()
+        assert set(out['ActionTaken']) <= set(ACTIONS)
+        assert (out['ChurnPrevented'].to_numpy()[crm['Churn'].to_numpy() == 0] == 0).all()
+        action = pd.Categorical(out['ActionTaken'], categories=ACTIONS).codes
+        prob = success_probabilities(crm, action)
+        expected += np.bincount(action, weights=prob, minlength=len(ACTIONS))
+        rows += len(out)
+    assert rows == summary['rows']
+    for i, name in enumerate(ACTIONS):
+        n, hits = summary['churners'][i], summary['prevented'][i]
+        if n == 0:
+            continue
+        rate, expected_rate = hits / n, expected[i] / n
+        tolerance = 4 * np.sqrt(max(expected_rate * (1 - expected_rate), 1e-4) / n)
+        assert abs(rate - expected_rate) <= tolerance, (name, rate, expected_rate)
+    print(f"Check passed: {rows} rows; every action's success rate is within sampling error of its rules.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate historical retention actions and their outcomes.")
+    parser.add_argument('--input', default=INPUT_PATH, help="CRM data from generate_data.py (.csv or .parquet)")
+    parser.add_argument('--output', default=FILE_PATH, help="A .csv or .parquet file")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows simulated and written at a time")
+    parser.add_argument('--seed', type=int, help="Seed for a reproducible file (default: fresh entropy, printed)")
+    parser.add_argument('--workers', type=int, default=1, help="Processes simulating chunks in parallel")
+    parser.add_argument('--check', action='store_true', help="Verify the written file against the success rules")
+    args = parser.parse_args()
+
+    print(f"Simulating historical actions and their outcomes for {args.input}...")
+    summary = generate(args.input, args.output, args.chunk_size, args.seed, args.workers)
+
+    print("\n--- Action Data Generation Complete ---")
+    print(f"Data saved to: {args.output} (seed {summary['seed']})")
+    print("\nSuccess rate of each action (on customers who were predicted to churn):")
+    # Only customers who were originally going to churn give meaningful stats
+    for name, n, hits in zip(ACTIONS, summary['churners'], summary['prevented']):
+        print(f"{name:26} {hits / n if n else float('nan'):.4f}  ({n} churners)")
+    if args.check:
+        check(args.input, args.output, summary, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
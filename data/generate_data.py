@@ -1,103 +1,340 @@
 # data/generate_data.py
 
-import pandas as pd
-import numpy as np
-from faker import Faker
-import random
-from datetime import datetime
+# Synthetic CRM data, generated in fixed-size chunks so the table never has to fit in
+# memory. Every column is drawn with vectorized NumPy calls from a seeded Generator;
+# chunk i gets its own child seed, so the output depends only on (--seed, --chunk-size,
+# --rows) and not on how many worker processes produced it.
+#
+# The churn label is the top 15% of the rule-based churn score. That cut-off is a
+# quantile of the whole table, so it is found before anything is written: a first pass
+# histograms the scores of every chunk, a second one collects the few scores in the
+# histogram bins around the quantile rank and picks the exact value, and the final pass
+# writes the chunks. Chunks are regenerated from their seeds on each pass instead of
+# being kept around. With several workers, at most two chunks per worker are in flight
+# ahead of the writer, so finished chunks can't pile up in memory while it catches up.
+#
+# Usage (from the project root):
+#     python data/generate_data.py                                   # 10,000 rows -> data/crm_data.csv
+#     python data/generate_data.py --rows 10000000 --chunk-size 1000000 --workers 4 \
+#         --seed 7 --output /tmp/crm_10m.parquet
+#     python data/generate_data.py --rows 200000 --check
+
+import argparse
+from collections import deque
+from multiprocessing import Pool
 
-# Initialize Faker for generating realistic fake data
-fake = Faker()
+import numpy as np
+import pandas as pd
 
 # --- Configuration ---
 NUM_CUSTOMERS = 10000
 FILE_PATH = "data/crm_data.csv"
+CHUNK_SIZE = 500_000
+# Chunks submitted per worker ahead of the one being consumed
+IN_FLIGHT_PER_WORKER = 2
 
 # --- Define possible values ---
 SUBSCRIPTION_TIERS = ["Basic", "Standard", "Premium"]
 LOCATIONS = ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix", "Philadelphia", "San Antonio", "San Diego", "Dallas", "San Jose"]
+GENDERS = ["Male", "Female"]
+# MonthlyRevenue range per tier, in SUBSCRIPTION_TIERS order
+REVENUE_LOW = np.array([10.0, 40.0, 80.0])
+REVENUE_HIGH = np.array([30.0, 70.0, 150.0])
+
+# We are aiming for an overall churn rate of about 15-20%
+CHURN_QUANTILE = 0.85
+# Upper bound of the churn score: every rule fires (0.3 + 0.2 + 0.4 + 0.25) plus the maximum noise
+MAX_CHURN_SCORE = 1.25
+HISTOGRAM_BINS = 1 << 16
 
-# --- Generate Base Customer Data ---
-print("Generating base customer data...")
-data = {
-    'CustomerID': [fake.uuid4() for _ in range(NUM_CUSTOMERS)],
-    'Age': [random.randint(22, 65) for _ in range(NUM_CUSTOMERS)],
-    'Gender': [random.choice(['Male', 'Female']) for _ in range(NUM_CUSTOMERS)],
-    'Location': [random.choice(LOCATIONS) for _ in range(NUM_CUSTOMERS)],
-    'SubscriptionTier': [random.choice(SUBSCRIPTION_TIERS) for _ in range(NUM_CUSTOMERS)],
-    'Tenure': [random.randint(1, 60) for _ in range(NUM_CUSTOMERS)], # Tenure in months
-}
+COLUMNS = ['CustomerID', 'Age', 'Gender', 'Location', 'SubscriptionTier', 'Tenure', 'MonthlyRevenue',
+           'UsageFrequency', 'SupportTickets', 'LastInteraction', 'Churn']
 
-df = pd.DataFrame(data)
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+# Where the 32 hex digits go in the 36-character UUID string
+_UUID_DIGIT_SLOTS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
 
-# --- Engineer Correlated Features (to make the data realistic) ---
-print("Engineering correlated features...")
 
-# MonthlyRevenue is correlated with SubscriptionTier
-def get_revenue(tier):
-    if tier == 'Basic':
-        return round(random.uniform(10, 30), 2)
-    elif tier == 'Standard':
-        return round(random.uniform(40, 70), 2)
-    else: # Premium
-        return round(random.uniform(80, 150), 2)
+def chunk_sizes(rows, chunk_size):
+    """Row counts of the chunks that make up a table of `rows` rows."""
+    return [min(chunk_size, rows - start) for start in range(0, rows, chunk_size)]
 
-df['MonthlyRevenue'] = df['SubscriptionTier'].apply(get_revenue)
 
-# UsageFrequency is correlated with Tenure (loyal customers use it more)
-df['UsageFrequency'] = (df['Tenure'] * 1.5 + np.random.normal(0, 10, NUM_CUSTOMERS)).astype(int).clip(lower=1)
+def chunk_seeds(seed, n_chunks):
+    """One independent child SeedSequence per chunk."""
+    return np.random.SeedSequence(seed).spawn(n_chunks)
 
-# SupportTickets are generally low, but higher for new customers
-df['SupportTickets'] = (np.random.poisson(lam=3, size=NUM_CUSTOMERS) - (df['Tenure'] / 12)).astype(int).clip(lower=0)
 
-# LastInteraction is random for now
-df['LastInteraction'] = [random.randint(1, 90) for _ in range(NUM_CUSTOMERS)]
+def imap_bounded(pool, func, tasks, workers):
+    """
+    `pool.imap(func, tasks)` with backpressure: results come back in task order, but a
+    task is only submitted (and taken from `tasks`) once fewer than IN_FLIGHT_PER_WORKER
+    per worker are pending. Runs in this process when `pool` is None.
+    """
+    if pool is None:
+        yield from map(func, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= IN_FLIGHT_PER_WORKER * workers:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
 
 
-# --- Engineer the Target Variable: Churn ---
-# This is the most important part. We create rules that define a "churn-prone" customer.
-print("Engineering the target variable (Churn)...")
+def uuid4_strings(rng, n):
+    """`n` random version-4 UUIDs as strings, built from one block of random bytes."""
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # Version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    chars = np.full((n, 36), ord('-'), dtype=np.uint8)
+    digits = np.empty((n, 32), dtype=np.uint8)
+    digits[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    digits[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+    chars[:, _UUID_DIGIT_SLOTS] = digits
+    return chars.view('S36').ravel().astype(str).astype(object)
 
-churn_probability = pd.Series(np.zeros(NUM_CUSTOMERS))
 
-# Rule 1: High tenure, low usage is a big red flag
-churn_probability += np.where((df['Tenure'] > 24) & (df['UsageFrequency'] < 20), 0.3, 0)
+def generate_features(rng, n):
+    """
+    Draws one chunk of customers, everything but CustomerID and the Churn label.
 
-# Rule 2: High support tickets is a sign of issues
-churn_probability += np.where(df['SupportTickets'] > 5, 0.2, 0)
+    Returns:
+        dict: Column name -> NumPy array, already in the stored dtypes.
+    """
+    tier = rng.integers(0, len(SUBSCRIPTION_TIERS), n)
+    tenure = rng.integers(1, 61, n)  # Tenure in months
+    features = {
+        'Age': rng.integers(22, 66, n).astype(np.int16),
+        'Gender': np.array(GENDERS, dtype=object)[rng.integers(0, len(GENDERS), n)],
+        'Location': np.array(LOCATIONS, dtype=object)[rng.integers(0, len(LOCATIONS), n)],
+        'SubscriptionTier': np.array(SUBSCRIPTION_TIERS, dtype=object)[tier],
+        'Tenure': tenure.astype(np.int16),
+        # MonthlyRevenue is correlated with SubscriptionTier
+        'MonthlyRevenue': np.round(rng.uniform(REVENUE_LOW[tier], REVENUE_HIGH[tier]), 2).astype(np.float32),
+        # UsageFrequency is correlated with Tenure (loyal customers use it more)
+        'UsageFrequency': np.clip((tenure * 1.5 + rng.normal(0, 10, n)).astype(int), 1, None).astype(np.int16),
+        # SupportTickets are generally low, but higher for new customers
+        'SupportTickets': np.clip((rng.poisson(lam=3, size=n) - tenure / 12).astype(int), 0, None).astype(np.int16),
+        # LastInteraction is random for now
+        'LastInteraction': rng.integers(1, 91, n).astype(np.int16),
+    }
+    return features
 
-# Rule 3: Low tenure and high support tickets is very bad
-churn_probability += np.where((df['Tenure'] < 6) & (df['SupportTickets'] > 3), 0.4, 0)
 
-# Rule 4: Long time since last interaction
-churn_probability += np.where(df['LastInteraction'] > 60, 0.25, 0)
+def churn_scores(features, rng):
+    """The rule-based churn score of a chunk; customers above the table's quantile churn."""
+    tenure, usage = features['Tenure'], features['UsageFrequency']
+    tickets, last_interaction = features['SupportTickets'], features['LastInteraction']
+    score = np.zeros(len(tenure))
+    # Rule 1: High tenure, low usage is a big red flag
+    score += np.where((tenure > 24) & (usage < 20), 0.3, 0)
+    # Rule 2: High support tickets is a sign of issues
+    score += np.where(tickets > 5, 0.2, 0)
+    # Rule 3: Low tenure and high support tickets is very bad
+    score += np.where((tenure < 6) & (tickets > 3), 0.4, 0)
+    # Rule 4: Long time since last interaction
+    score += np.where(last_interaction > 60, 0.25, 0)
+    # Add some random noise
+    score += rng.uniform(0, 0.1, len(tenure))
+    return score
 
-# Add some random noise
-churn_probability += np.random.uniform(0, 0.1, NUM_CUSTOMERS)
 
-# Apply a threshold to create the binary churn label
-# We are aiming for an overall churn rate of about 15-20%
-churn_threshold = churn_probability.quantile(0.85)
-df['Churn'] = (churn_probability > churn_threshold).astype(int)
-
-
-# --- Final Touches ---
-print(f"Finalizing data and saving to {FILE_PATH}...")
-# Ensure dtypes are correct
-df['Age'] = df['Age'].astype('int16')
-df['Tenure'] = df['Tenure'].astype('int16')
-df['UsageFrequency'] = df['UsageFrequency'].astype('int16')
-df['SupportTickets'] = df['SupportTickets'].astype('int16')
-df['LastInteraction'] = df['LastInteraction'].astype('int16')
-df['MonthlyRevenue'] = df['MonthlyRevenue'].astype('float32')
-df['Churn'] = df['Churn'].astype('int8')
-
-# Save to CSV
-df.to_csv(FILE_PATH, index=False)
-
-print("\n--- Data Generation Complete ---")
-print(f"Data saved to: {FILE_PATH}")
-print("\nChurn Rate in generated data:")
-print(df['Churn'].value_counts(normalize=True))
-print("\nSample of the data:")
-print(df.head())
\ No newline at end of file
+def generate_chunk(seed, n, churn_threshold=None):
+    """
+    Generates one chunk from its seed. The draws always happen in the same order, so
+    every pass sees the same customers.
+
+    Returns:
+        tuple: (features dict, churn scores); with `churn_threshold`, the features also
+        include CustomerID and Churn.
+    """
+    rng = np.random.default_rng(seed)
+    features = generate_features(rng, n)
+    scores = churn_scores(features, rng)
+    if churn_threshold is not None:
+        features['CustomerID'] = uuid4_strings(rng, n)
+        features['Churn'] = (scores > churn_threshold).astype(np.int8)
+    return features, scores
+
+
+def _score_bins(scores):
+    return np.minimum((scores * (HISTOGRAM_BINS / MAX_CHURN_SCORE)).astype(np.intp), HISTOGRAM_BINS - 1)
+
+
+def _histogram_task(task):
+    seed, n = task
+    _, scores = generate_chunk(seed, n)
+    return np.bincount(_score_bins(scores), minlength=HISTOGRAM_BINS)
+
+
+def _collect_task(task):
+    seed, n, low_bin, high_bin = task
+    _, scores = generate_chunk(seed, n)
+    bins = _score_bins(scores)
+    return scores[(bins >= low_bin) & (bins <= high_bin)]
+
+
+def _frame_task(task):
+    seed, n, churn_threshold = task
+    features, _ = generate_chunk(seed, n, churn_threshold)
+    return pd.DataFrame(features, columns=COLUMNS)
+
+
+def churn_threshold(seeds, sizes, pool=None, workers=1, q=CHURN_QUANTILE):
+    """
+    The q-quantile of the churn score over all chunks, with the same linear
+    interpolation as `Series.quantile`, without holding every score in memory.
+    """
+    total = sum(sizes)
+    histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    for counts in imap_bounded(pool, _histogram_task, zip(seeds, sizes), workers):
+        histogram += counts
+    cumulative = np.cumsum(histogram)
+
+    # The quantile falls between the sorted scores at ranks k and k + 1
+    position = (total - 1) * q
+    k = int(np.floor(position))
+    low_bin, high_bin = np.searchsorted(cumulative, [k, min(k + 1, total - 1)], side='right')
+    values = np.sort(np.concatenate(list(imap_bounded(
+        pool, _collect_task, [(seed, n, low_bin, high_bin) for seed, n in zip(seeds, sizes)], workers))))
+    offset = int(cumulative[low_bin - 1]) if low_bin > 0 else 0
+    pair = values[k - offset:k - offset + 2]
+    # np.quantile on the two neighbours interpolates exactly the way the full-table quantile does
+    return float(np.quantile(pair, position - k)) if len(pair) == 2 else float(pair[0])
+
+
+class ChunkWriter:
+    """Appends DataFrame chunks to one CSV or Parquet file (chosen by the file extension)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._rows = 0
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema, compression='zstd')
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='w' if self._rows == 0 else 'a', header=self._rows == 0, index=False)
+        self._rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        return self._rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def generate(path, rows=NUM_CUSTOMERS, chunk_size=CHUNK_SIZE, seed=None, workers=1):
+    """
+    Generates `rows` customers into `path`.
+
+    Returns:
+        dict: The seed used (pass it back to reproduce the file), the churn threshold,
+        and the number of rows and churned customers written.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    sizes = chunk_sizes(rows, chunk_size)
+    seeds = chunk_seeds(seed, len(sizes))
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        print(f"Finding the churn threshold over {rows} customers ({len(sizes)} chunks, seed {seed})...")
+        threshold = churn_threshold(seeds, sizes, pool, workers)
+
+        print(f"Generating customer data and saving to {path}...")
+        churned = 0
+        with ChunkWriter(path) as writer:
+            tasks = ((s, n, threshold) for s, n in zip(seeds, sizes))
+            for df in imap_bounded(pool, _frame_task, tasks, workers):
+                writer.write(df)
+                churned += int(df['Churn'].sum())
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return {"seed": seed, "churn_threshold": threshold, "rows": rows, "churned": churned}
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yields DataFrame chunks of a CSV or Parquet file written by `generate`."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def check(path, summary, chunk_size=CHUNK_SIZE):
+    """
+    Checks a generated file for integrity: value ranges, tier-dependent revenue, unique
+    IDs, a churn rate of about 15%, and the streamed churn threshold against the quantile
+    of all scores held in memory. It checks this generator against itself only; agreement
+    with the original row-by-row rules is what tests/test_generate_data.py covers.
+
+    Raises:
+        AssertionError: On the first violated rule.
+    """
+    sizes = chunk_sizes(summary['rows'], chunk_size)
+    all_scores = np.concatenate([generate_chunk(s, n)[1] for s, n in zip(chunk_seeds(summary['seed'], len(sizes)), sizes)])
+    in_memory = pd.Series(all_scores).quantile(CHURN_QUANTILE)
+    assert in_memory == summary['churn_threshold'], (in_memory, summary['churn_threshold'])
+
+    rows, churned, id_hashes = 0, 0, []
+    for df in read_chunks(path, chunk_size):
+        assert list(df.columns) == COLUMNS, list(df.columns)
+        assert df['Age'].between(22, 65).all() and df['Tenure'].between(1, 60).all()
+        assert df['LastInteraction'].between(1, 90).all()
+        assert (df['UsageFrequency'] >= 1).all() and (df['SupportTickets'] >= 0).all()
+        for tier, low, high in zip(SUBSCRIPTION_TIERS, REVENUE_LOW, REVENUE_HIGH):
+            revenue = df.loc[df['SubscriptionTier'] == tier, 'MonthlyRevenue']
+            assert revenue.between(low - 0.01, high + 0.01).all(), tier
+        assert set(df['Gender']) <= set(GENDERS) and set(df['Location']) <= set(LOCATIONS)
+        assert df['CustomerID'].str.fullmatch(r'[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}').all()
+        id_hashes.append(pd.util.hash_array(df['CustomerID'].to_numpy()))
+        rows += len(df)
+        churned += int(df['Churn'].sum())
+    assert rows == summary['rows'] and len(np.unique(np.concatenate(id_hashes))) == rows
+    assert churned == summary['churned'] == int((all_scores > in_memory).sum())
+    # Ties in the score can only push the rate below 15%, never above it
+    assert 0.10 <= churned / rows <= 1 - CHURN_QUANTILE + 1e-9, churned / rows
+    print(f"Check passed: {rows} rows, churn rate {churned / rows:.2%}, threshold {in_memory:.6f}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic CRM data.")
+    parser.add_argument('--rows', type=int, default=NUM_CUSTOMERS)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows generated and written at a time")
+    parser.add_argument('--seed', type=int, help="Seed for a reproducible file (default: fresh entropy, printed)")
+    parser.add_argument('--workers', type=int, default=1, help="Processes generating chunks in parallel")
+    parser.add_argument('--output', default=FILE_PATH, help="A .csv or .parquet file")
+    parser.add_argument('--check', action='store_true', help="Verify the written file against the generation rules")
+    args = parser.parse_args()
+
+    summary = generate(args.output, args.rows, args.chunk_size, args.seed, args.workers)
+
+    print("\n--- Data Generation Complete ---")
+    print(f"Data saved to: {args.output} (seed {summary['seed']})")
+    print(f"\nChurn Rate in generated data: {summary['churned'] / summary['rows']:.2%}")
+    if args.check:
+        check(args.output, summary, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+# engine/change_log.py
+
+# Durable customer upserts.
+# Every accepted change is appended as one JSON line to a change log before it is applied
+# to the in-memory store, and the log is replayed on top of the CSV whenever the data is
+# (re)loaded. Validation happens first, so the log only ever contains changes that apply.
+#
+# Every upsert leaves the customer's previous row behind and adds a log line, so both
+# grow with the number of changes. `compact` bounds them by the number of customers:
+# it rebuilds the store from current rows only and rewrites the log as one full record
+# per changed customer.
+
+import json
+import os
+import threading
+import time
+
+from engine.feature_store import ID_COLUMN, ReadOnlyStoreError
+
+# Keeps the log order identical to the order changes are applied in
+_apply_lock = threading.Lock()
+
+
+class ChangeLog:
+    """
+    Append-only NDJSON log of customer upserts.
+
+    Args:
+        path (str): The log file; created on the first change.
+        fsync (bool): fsync after every append (slower, survives power loss, not only crashes).
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv("CRM_CHANGE_LOG", "data/crm_changes.jsonl"),
+            fsync=os.getenv("CRM_CHANGE_LOG_FSYNC", "false").lower() in ("1", "true", "yes"),
+        )
+
+    def append(self, changes):
+        """Appends (customer_id, fields, replace) changes with a single write."""
+        now = time.time()
+        lines = "".join(
+            json.dumps({"ts": now, ID_COLUMN: customer_id, "replace": replace, "fields": fields}, default=_plain) + "\n"
+            for customer_id, fields, replace in changes
+        )
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+    def rewrite(self, changes):
+        """Atomically replaces the log's contents with (customer_id, fields, replace) changes."""
+        now = time.time()
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for customer_id, fields, replace in changes:
+                    f.write(json.dumps({"ts": now, ID_COLUMN: customer_id, "replace": replace, "fields": fields},
+                                       default=_plain) + "\n")
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def read(self):
+        """Yields logged (customer_id, fields, replace) changes in order."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Only the last line can be torn (a crash mid-append); it was never acknowledged
+                    print(f"Skipping unreadable change log line {line_number} in {self.path}.")
+                    continue
+                yield record[ID_COLUMN], record["fields"], record["replace"]
+
+    def replay(self, store):
+        """Applies every logged change to `store`. Returns the number of changes applied."""
+        applied = 0
+        for customer_id, fields, replace in self.read():
+            try:
+                store.upsert(customer_id, store.coerce(fields, replace), replace)
+                applied += 1
+            except (KeyError, ValueError) as e:
+                print(f"Skipping change log entry for {customer_id}: {e!r}")
+        return applied
+
+
+def _plain(value):
+    # NumPy scalars produced by CustomerStore.coerce
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def apply_changes(store, changes, change_log=None):
+    """
+    Validates, logs and applies customer changes.
+
+    Args:
+        store (CustomerStore): The live store.
+        changes (list): (customer_id, raw fields, replace) tuples.
+        change_log (ChangeLog): Where accepted changes are recorded before being applied.
+    Returns:
+        tuple: ([(customer_id, position, created)], [(index into `changes`, error message)])
+    Raises:
+        ReadOnlyStoreError: If the store is shared and read-only.
+    """
+    if store.shared:
+        raise ReadOnlyStoreError("The shared customer store is read-only.")
+    accepted, errors = [], []
+    created = set()  # Customers created earlier in this batch can be updated partially
+    for i, (customer_id, fields, replace) in enumerate(changes):
+        try:
+            if not replace and customer_id not in store and customer_id not in created:
+                raise KeyError(f"Customer {customer_id} not found; send the full record to create it.")
+            accepted.append((customer_id, store.coerce(fields, replace), replace))
+            if replace:
+                created.add(customer_id)
+        except (KeyError, ValueError) as e:
+            errors.append((i, e.args[0] if e.args else str(e)))
+    if not accepted:
+        return [], errors
+
+    with _apply_lock:
+        # A compaction may have replaced the store since the caller looked it up
+        while store.successor is not None:
+            store = store.successor
+        if change_log is not None:
+            change_log.append(accepted)
+        results = store.upsert_many(accepted)
+    return [(customer_id, position, created)
+            for (customer_id, _, _), (position, created) in zip(accepted, results)], errors
+
+
+def compact(store, change_log, version, publish=None):
+    """
+    Drops superseded rows and folds the change log into one full record per changed
+    customer. Upserts wait meanwhile; `publish(compacted)` runs before they resume, and
+    any that were aimed at the old store are applied to the new one.
+
+    Args:
+        store (CustomerStore): The store to compact.
+        change_log (ChangeLog): Its change log (None = leave it alone).
+        version (int): Data version of the compacted store.
+        publish: Optional callback that makes the compacted store live.
+    Returns:
+        CustomerStore: The compacted store.
+    """
+    with _apply_lock:
+        compacted = store.compact(version)
+        if change_log is not None:
+            change_log.rewrite((compacted.ids[position], compacted.row(position).to_dict(), True)
+                               for position in range(compacted.base_rows, compacted.row_count))
+        if publish is not None:
+            publish(compacted)
+        store.successor = compacted
+    print(f"Compacted the customer store: {store.row_count} -> {compacted.row_count} rows, "
+          f"{compacted.row_count - compacted.base_rows} changed customers in the change log.")
+    return compacted
@@ -0,0 +1,91 @@
+# engine/circuit_breaker.py
+
+# A circuit breaker for the LLM.
+# After `failure_threshold` consecutive failures (timeouts or errors) the circuit opens
+# and callers skip the LLM altogether, answering with a fallback right away instead of
+# each waiting out its own deadline. Once `cooldown_seconds` have passed, one request at
+# a time is let through as a probe (half-open): a success closes the circuit, a failure
+# opens it for another cooldown.
+
+import os
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Args:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        cooldown_seconds (float): How long the circuit stays open before a probe is allowed.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            cooldown_seconds=float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30")),
+        )
+
+    def allow(self):
+        """Whether a call may go to the LLM now. In half-open state only one probe is let through."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """Gives up an allowed call without an outcome (e.g. it was cancelled), so another probe can go."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(self.cooldown_seconds - (time.monotonic() - self.opened_at), 0.0), 3)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown_seconds": self.cooldown_seconds,
+                "probe_in_seconds": retry_in,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,301 @@
+# engine/drift_monitor.py
+
+# In-process feature and score drift monitoring.
+# A reference distribution is taken once per feature from the training data: decile
+# bins for numeric columns, category frequencies for categorical ones, and ten fixed
+# bins for the churn score. Every prediction then adds one count per feature to a
+# sliding-window histogram: a fixed ring of time slots, each holding one small count
+# vector, so memory is O(slots x bins) per feature however much traffic is served.
+# Drift is reported per feature as the PSI of the window against the reference, plus a
+# KS-style statistic (largest CDF gap over the bins) for ordered features.
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+
+import numpy as np
+
+NUMERIC_BINS = 10
+SCORE_FEATURE = 'churn_probability'
+SCORE_EDGES = [i / 10 for i in range(1, 10)]
+# Bucket for categories the reference never saw
+OTHER = '__other__'
+# Smoothing for empty bins, so PSI stays finite
+EPSILON = 1e-4
+# Conventional PSI reading: below 0.1 stable, above 0.25 a significant shift
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+
+class FeatureReference:
+    """
+    The reference distribution of one feature.
+
+    Args:
+        name (str): Feature name.
+        expected (list): Reference share of each bin.
+        edges (list): For ordered features, the inner bin edges (value v falls in bin
+                      bisect_right(edges, v)).
+        categories (list): For categorical features, the known categories; the last bin
+                           collects every other value.
+    """
+
+    def __init__(self, name, expected, edges=None, categories=None):
+        self.name = name
+        self.expected = np.asarray(expected, dtype=np.float64)
+        self.edges = list(edges) if edges is not None else None
+        self.categories = list(categories) if categories is not None else None
+        self.ordered = self.edges is not None
+        self._index = {category: i for i, category in enumerate(self.categories or [])}
+        self._edges_array = np.asarray(self.edges if self.ordered else [], dtype=np.float64)
+
+    @property
+    def n_bins(self):
+        return len(self.expected)
+
+    @classmethod
+    def numeric(cls, name, values, bins=NUMERIC_BINS):
+        values = np.asarray(values, dtype=np.float64)
+        # Quantile edges; repeated ones (integer columns with few values) are merged
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1])).tolist()
+        return cls.fixed(name, values, edges)
+
+    @classmethod
+    def fixed(cls, name, values, edges):
+        counts = np.bincount(np.searchsorted(edges, np.asarray(values, dtype=np.float64), side='right'),
+                             minlength=len(edges) + 1)
+        return cls(name, counts / max(counts.sum(), 1), edges=edges)
+
+    @classmethod
+    def categorical(cls, name, values):
+        categories, counts = np.unique(np.asarray(values, dtype=object).astype(str), return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        shares = np.append(counts[order] / max(counts.sum(), 1), 0.0)
+        return cls(name, shares, categories=categories[order].tolist() + [OTHER])
+
+    def bin(self, value):
+        if self.ordered:
+            # float(): bisecting a list of floats with a NumPy scalar is ~20x slower
+            return bisect_right(self.edges, float(value))
+        return self._index.get(value, self.n_bins - 1)
+
+    def bin_many(self, values):
+        if self.ordered:
+            return np.searchsorted(self._edges_array, np.asarray(values, dtype=np.float64), side='right')
+        other = self.n_bins - 1
+        return np.fromiter((self._index.get(v, other) for v in values), dtype=np.intp, count=len(values))
+
+    def to_dict(self):
+        return {"name": self.name, "expected": self.expected.tolist(), "edges": self.edges,
+                "categories": self.categories}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["name"], state["expected"], edges=state.get("edges"), categories=state.get("categories"))
+
+
+def build_reference(columns, numeric_columns, categorical_columns, bins=NUMERIC_BINS):
+    """
+    Reference distributions for the model features.
+
+    Args:
+        columns: A DataFrame or a mapping of column name -> array (e.g. CustomerStore.take()).
+    Returns:
+        dict: Feature name -> FeatureReference.
+    """
+    references = {name: FeatureReference.numeric(name, columns[name], bins) for name in numeric_columns}
+    references.update({name: FeatureReference.categorical(name, columns[name]) for name in categorical_columns})
+    return references
+
+
+def score_reference(churn_probabilities):
+    """Reference distribution of the model's scores, over ten fixed bins."""
+    return FeatureReference.fixed(SCORE_FEATURE, churn_probabilities, SCORE_EDGES)
+
+
+class SlidingHistogram:
+    """
+    Counts over the last `slots * slot_seconds` seconds, in a fixed ring of time slots.
+    Each slot is cleared when it comes round again. The monitor keeps every feature's
+    bins side by side in one histogram, so an observation is a single update.
+    """
+
+    __slots__ = ('counts', 'slot_ids', 'slot_seconds')
+
+    def __init__(self, n_bins, slots, slot_seconds):
+        self.counts = np.zeros((slots, n_bins), dtype=np.int64)
+        self.slot_ids = [-1] * slots
+        self.slot_seconds = slot_seconds
+
+    def _slot(self, now):
+        slot_id = int(now // self.slot_seconds)
+        row = slot_id % len(self.slot_ids)
+        if self.slot_ids[row] != slot_id:
+            self.counts[row] = 0
+            self.slot_ids[row] = slot_id
+        return row
+
+    def add(self, indexes, now):
+        """Counts one observation in each of `indexes`."""
+        # A loop of scalar increments beats one fancy-indexed update for ~10 bins
+        counts = self.counts[self._slot(now)]
+        for index in indexes:
+            counts[index] += 1
+
+    def add_many(self, indexes, now):
+        """Counts every entry of `indexes`, repeats included."""
+        self.counts[self._slot(now)] += np.bincount(indexes, minlength=self.counts.shape[1])
+
+    def window(self, now):
+        current = int(now // self.slot_seconds)
+        live = np.asarray(self.slot_ids) > current - len(self.slot_ids)
+        return self.counts[live].sum(axis=0)
+
+
+def psi(expected, counts):
+    """Population stability index of observed bin counts against reference shares."""
+    actual = counts / counts.sum()
+    expected = np.maximum(expected, EPSILON)
+    actual = np.maximum(actual, EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def binned_ks(expected, counts):
+    """Largest gap between the reference and observed CDFs, evaluated at the bin edges."""
+    return float(np.max(np.abs(np.cumsum(counts / counts.sum()) - np.cumsum(expected))))
+
+
+class DriftMonitor:
+    """
+    Sliding-window drift of the served features and scores against a reference.
+
+    Args:
+        window_seconds (float): Length of the sliding window.
+        slots (int): Time slots the window is divided into (its resolution).
+        min_samples (int): Windows with fewer observations are reported without scores.
+    """
+
+    def __init__(self, window_seconds=3600.0, slots=12, min_samples=100):
+        self.window_seconds = window_seconds
+        self.slots = slots
+        self.min_samples = min_samples
+        self.references = {}
+        self._offsets = {}  # Feature name -> its first column in the histogram
+        self._histogram = None
+        self._lock = threading.Lock()
+        self.observed = 0
+        self.reference_info = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            window_seconds=float(os.getenv("DRIFT_WINDOW_SECONDS", "3600")),
+            slots=int(os.getenv("DRIFT_WINDOW_SLOTS", "12")),
+            min_samples=int(os.getenv("DRIFT_MIN_SAMPLES", "100")),
+        )
+
+    @property
+    def ready(self):
+        return bool(self.references)
+
+    def set_references(self, references, **info):
+        """
+        Installs reference distributions (feature name -> FeatureReference). Features
+        whose bins are unchanged keep their window counts; the others start empty.
+        """
+        with self._lock:
+            merged = {**self.references, **references}
+            offsets, total = {}, 0
+            for name, reference in merged.items():
+                offsets[name] = total
+                total += reference.n_bins
+            histogram = SlidingHistogram(total, self.slots, self.window_seconds / self.slots)
+            if self._histogram is not None:
+                histogram.slot_ids = list(self._histogram.slot_ids)
+                for name, reference in merged.items():
+                    current = self.references.get(name)
+                    if current is not None and (current.edges, current.categories) == (reference.edges, reference.categories):
+                        old, new = self._offsets[name], offsets[name]
+                        histogram.counts[:, new:new + reference.n_bins] = self._histogram.counts[:, old:old + reference.n_bins]
+            self.references, self._offsets, self._histogram = merged, offsets, histogram
+            self.reference_info.update(info)
+
+    # --- Request path ---
+    def observe(self, features, churn_probability, now=None):
+        """Adds one prediction: `features` is a mapping (e.g. a CustomerRow) of the raw feature values."""
+        if not self.references:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            offsets = self._offsets
+            indexes = []
+            for name, reference in self.references.items():
+                value = churn_probability if name == SCORE_FEATURE else features.get(name)
+                if value is not None:
+                    indexes.append(offsets[name] + reference.bin(value))
+            self._histogram.add(indexes, now)
+            self.observed += 1
+
+    def observe_many(self, columns, churn_probabilities, now=None):
+        """Adds a batch of predictions: `columns` maps feature name -> array."""
+        if not self.references or len(churn_probabilities) == 0:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            offsets = self._offsets
+            bins = []
+            for name, reference in self.references.items():
+                values = churn_probabilities if name == SCORE_FEATURE else columns.get(name)
+                if values is not None:
+                    bins.append(offsets[name] + reference.bin_many(values))
+            self._histogram.add_many(np.concatenate(bins), now)
+            self.observed += len(churn_probabilities)
+
+    # --- Reporting ---
+    def report(self, now=None):
+        """Per-feature window size, PSI, KS and drift level, worst feature first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._histogram is None:
+                return {"window_seconds": self.window_seconds, "slots": self.slots, "observed_total": 0,
+                        "reference": self.reference_info, "features": []}
+            window = self._histogram.window(now)
+            references, offsets = self.references, self._offsets
+        features = []
+        for name, reference in references.items():
+            counts = window[offsets[name]:offsets[name] + reference.n_bins]
+            n = int(counts.sum())
+            entry = {"feature": name, "samples": n, "psi": None, "ks": None, "drift": "insufficient_data"}
+            if n >= self.min_samples:
+                entry["psi"] = round(psi(reference.expected, counts), 6)
+                if reference.ordered:
+                    entry["ks"] = round(binned_ks(reference.expected, counts), 6)
+                entry["drift"] = ("significant" if entry["psi"] >= PSI_SIGNIFICANT
+                                  else "moderate" if entry["psi"] >= PSI_MODERATE else "none")
+            features.append(entry)
+        features.sort(key=lambda entry: -1.0 if entry["psi"] is None else entry["psi"], reverse=True)
+        return {
+            "window_seconds": self.window_seconds,
+            "slots": self.slots,
+            "observed_total": self.observed,
+            "reference": self.reference_info,
+            "features": features,
+        }
+
+    # --- Persistence of the reference ---
+    def save_references(self, path):
+        with self._lock:
+            state = {"info": self.reference_info,
+                     "features": [reference.to_dict() for reference in self.references.values()]}
+        with open(path, 'w') as f:
+            json.dump(state, f, indent=2)
+
+    @staticmethod
+    def load_references(path):
+        """Returns (feature name -> FeatureReference, info) from a file written by `save_references`."""
+        with open(path) as f:
+            state = json.load(f)
+        references = {entry["name"]: FeatureReference.from_dict(entry) for entry in state["features"]}
+        return references, state.get("info", {})
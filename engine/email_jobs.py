@@ -0,0 +1,149 @@
+# engine/email_jobs.py
+
+# Background email generation.
+# In async mode /predict returns the score, group and action right away together with
+# an email job ID; a small pool of workers generates the email off the request path
+# and callers poll GET /emails/{job_id}. The queue is bounded (a full queue rejects
+# new jobs instead of growing) and finished jobs expire after a TTL.
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+
+# Job statuses
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+QUEUE_FULL = 'queue_full'  # Returned instead of a job when the queue has no room
+
+
+class EmailJob:
+    """State of one background email generation."""
+
+    __slots__ = ('job_id', 'customer_data', 'action', 'status', 'email', 'error', 'created_at', 'finished_at')
+
+    def __init__(self, customer_data, action):
+        self.job_id = uuid.uuid4().hex
+        self.customer_data = customer_data
+        self.action = action
+        self.status = PENDING
+        self.email = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "action": self.action,
+            "personalized_email": self.email,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class EmailJobQueue:
+    """
+    A bounded queue of email jobs processed by a fixed pool of asyncio workers.
+
+    Args:
+        generate: Async function `generate(customer_data, action) -> str` that raises on failure.
+        workers (int): Number of concurrent generation workers.
+        max_queue (int): Most jobs waiting at once; `submit` rejects beyond that.
+        ttl_seconds (float): How long a job (and its result) can be polled after creation.
+    """
+
+    def __init__(self, generate, workers=4, max_queue=1000, ttl_seconds=3600):
+        self._generate = generate
+        self.workers = workers
+        self.max_queue = max_queue
+        self.ttl_seconds = ttl_seconds
+        self._queue = None
+        self._jobs = OrderedDict()  # job_id -> EmailJob, oldest first
+        self._tasks = []
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.expired = 0
+
+    async def start(self):
+        # Created here so the queue belongs to the server's running event loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, customer_data, action):
+        """
+        Queues an email for generation.
+
+        Args:
+            customer_data (dict): A snapshot of the customer's info.
+            action (str): The next-best-action the email is for.
+        Returns:
+            EmailJob: The queued job, or None if the queue is full.
+        """
+        self._purge_expired()
+        job = EmailJob(customer_data, action)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return None
+        self._jobs[job.job_id] = job
+        self.submitted += 1
+        return job
+
+    def get(self, job_id):
+        """Returns the job, or None if it is unknown or has expired."""
+        self._purge_expired()
+        return self._jobs.get(job_id)
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.created_at > cutoff:
+                break
+            self._jobs.popitem(last=False)
+            self.expired += 1
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.job_id not in self._jobs:
+                    continue  # Expired while waiting; nobody can poll it any more
+                try:
+                    job.email = await self._generate(job.customer_data, job.action)
+                    job.status = DONE
+                    self.completed += 1
+                except Exception as e:
+                    job.error = str(e)
+                    job.status = FAILED
+                    self.failed += 1
+                job.finished_at = time.time()
+                job.customer_data = None  # Not needed once the email exists
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "tracked_jobs": len(self._jobs),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "expired": self.expired,
+        }
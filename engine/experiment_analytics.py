@@ -0,0 +1,422 @@
+# engine/experiment_analytics.py
+
+# Incremental experiment analytics over the prediction logs.
+# A background thread tails every prediction log file (the live file of each worker and
+# the rotated ones) from the byte offset it stopped at, and folds each new record into
+# running per-experiment, per-group counters. A summary is computed from those counters
+# alone, so it costs the same however large the logs have grown.
+#
+# Outcomes are not in the logs: churn labels arrive later and are joined to predictions
+# in the ground-truth store. With one attached (`outcomes`), each pass also reads the
+# predictions labeled since the previous pass and counts their outcomes in the groups
+# they were assigned to, so churn rates and their uplift are just as incremental.
+# Outcomes are counted once per customer, not per prediction: a customer scored twenty
+# times is still one observation, or the intervals would be far too narrow. A customer
+# labeled again has their earlier outcome replaced.
+#
+# Offsets are keyed by the file's inode, which rotation (a rename) preserves: lines
+# written to a file just before it was rotated are still read from the rotated file,
+# and the new live file starts at offset 0. Only complete lines are consumed, so a
+# batch the writer has half flushed is picked up on the next pass. With a state path
+# the offsets and counters are saved after every pass and reloaded on start, so a
+# restart resumes instead of re-reading everything.
+
+import glob
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from collections import Counter
+from math import sqrt
+from statistics import NormalDist
+
+from engine.experiments import NOT_ENROLLED
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # Fall back to the standard library parser
+    _loads = json.loads
+
+# Read at most this much of a file per step, so a large backlog never sits in memory at once
+READ_BLOCK_BYTES = 4 << 20
+
+
+class GroupStats:
+    """Running counters of one experiment group."""
+
+    __slots__ = ('predictions', 'probability_sum', 'probability_sq_sum', 'outcomes', 'churned', 'actions')
+
+    def __init__(self):
+        self.predictions = 0
+        self.probability_sum = 0.0
+        self.probability_sq_sum = 0.0
+        self.outcomes = 0  # Customers whose ground truth is known
+        self.churned = 0
+        self.actions = Counter()
+
+    def add(self, churn_probability, action):
+        self.predictions += 1
+        self.probability_sum += churn_probability
+        self.probability_sq_sum += churn_probability * churn_probability
+        self.actions[action] += 1
+
+    def add_outcome(self, churned):
+        self.outcomes += 1
+        self.churned += int(churned)
+
+    def remove_outcome(self, churned):
+        self.outcomes -= 1
+        self.churned -= int(churned)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        for name in cls.__slots__:
+            setattr(stats, name, state[name])
+        stats.actions = Counter(state['actions'])
+        return stats
+
+    def mean_probability(self):
+        return self.probability_sum / self.predictions if self.predictions else None
+
+    def probability_variance(self):
+        if self.predictions < 2:
+            return None
+        mean = self.probability_sum / self.predictions
+        return max(self.probability_sq_sum / self.predictions - mean * mean, 0.0) * self.predictions / (self.predictions - 1)
+
+    def churn_rate(self):
+        return self.churned / self.outcomes if self.outcomes else None
+
+
+def difference_interval(estimate, standard_error, confidence):
+    """(low, high, two-sided p-value) of a normally distributed difference."""
+    if not standard_error:
+        return None, None, None
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p_value = 2 * (1 - NormalDist().cdf(abs(estimate) / standard_error))
+    return estimate - z * standard_error, estimate + z * standard_error, p_value
+
+
+def compare_groups(control, treatment, confidence):
+    """Treatment minus control, for the observed churn rate and the mean predicted churn probability."""
+    comparison = {}
+    if control.outcomes and treatment.outcomes:
+        p0, p1 = control.churn_rate(), treatment.churn_rate()
+        se = sqrt(p0 * (1 - p0) / control.outcomes + p1 * (1 - p1) / treatment.outcomes)
+        low, high, p_value = difference_interval(p1 - p0, se, confidence)
+        comparison["churn_rate"] = {
+            "difference": p1 - p0,
+            # Uplift of a retention action is the churn it prevents, relative to the control rate
+            "relative_uplift": (p0 - p1) / p0 if p0 else None,
+            "ci_low": low, "ci_high": high, "p_value": p_value,
+        }
+    v0, v1 = control.probability_variance(), treatment.probability_variance()
+    if v0 is not None and v1 is not None:
+        # Groups are assigned independently of the score, so this should stay near zero
+        difference = treatment.mean_probability() - control.mean_probability()
+        low, high, p_value = difference_interval(
+            difference, sqrt(v0 / control.predictions + v1 / treatment.predictions), confidence)
+        comparison["mean_churn_probability"] = {
+            "difference": difference, "ci_low": low, "ci_high": high, "p_value": p_value,
+        }
+    return comparison
+
+
+class ExperimentAnalytics:
+    """
+    Tails the prediction logs and keeps per-experiment group statistics.
+
+    Args:
+        log_path (str): The prediction log path; every file starting with its name (per-worker
+                        and rotated files) is tailed.
+        experiments (ExperimentSet): Configured experiments; records from older logs without an
+                                     "experiments" field count towards the primary one.
+        poll_seconds (float): How often new lines are read (0 = only via `tail()`).
+        state_path (str): Where offsets and counters are saved between restarts (None = not saved).
+        confidence (float): Confidence level of the reported intervals.
+        outcomes (GroundTruthStore): Where labeled predictions are read from (None = no outcomes);
+                                     can also be attached later.
+    """
+
+    def __init__(self, log_path, experiments, poll_seconds=5.0, state_path=None, confidence=0.95, outcomes=None):
+        root, ext = os.path.splitext(log_path)
+        self.pattern = f"{glob.escape(root)}*{glob.escape(ext)}*"
+        self.experiments = experiments
+        self.poll_seconds = poll_seconds
+        self.state_path = state_path
+        self.confidence = confidence
+        self._offsets = {}  # "device:inode" -> byte offset of the first unread line
+        self._stats = {}  # experiment -> group -> GroupStats
+        self.outcomes = outcomes
+        self._outcome_cursor = (0.0, 0)  # (labeled_at, id) of the last labeled prediction counted
+        self._outcome_of = {}  # customer_id -> the churn label counted for them
+        self.outcomes_read = 0
+        self.records_read = 0
+        self.bad_lines = 0
+        self.last_tail_at = None
+        self._lock = threading.Lock()  # Guards the counters against concurrent summaries
+        self._tail_lock = threading.Lock()  # One tail pass at a time
+        self._stop = threading.Event()
+        self._thread = None
+        if state_path:
+            self._load_state()
+
+    @classmethod
+    def from_env(cls, log_path, experiments):
+        return cls(
+            log_path,
+            experiments,
+            poll_seconds=float(os.getenv("EXPERIMENT_ANALYTICS_SECONDS", "5")),
+            state_path=os.getenv("EXPERIMENT_ANALYTICS_STATE") or None,
+        )
+
+    def start(self):
+        if self.poll_seconds > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll, name="experiment-analytics", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                self.tail()
+            except Exception as e:  # A bad pass is retried on the next one
+                print(f"Experiment analytics pass failed: {e!r}")
+            self._stop.wait(self.poll_seconds)
+
+    def tail(self):
+        """Reads every complete line appended since the last pass. Returns the number of records read."""
+        with self._tail_lock:
+            files = []
+            for path in glob.glob(self.pattern):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:  # Rotated away or deleted since the glob
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                files.append((st.st_mtime, path, f"{st.st_dev}:{st.st_ino}", st.st_size))
+            read = 0
+            # Oldest first, so records are folded in roughly the order they were written
+            for _, path, key, size in sorted(files):
+                offset = self._offsets.get(key, 0)
+                if size < offset:  # Truncated or replaced
+                    offset = 0
+                if size > offset:
+                    offset, n = self._read_from(path, offset)
+                    read += n
+                self._offsets[key] = offset
+            # Forget files that are gone
+            live = {key for _, _, key, _ in files}
+            for key in list(self._offsets):
+                if key not in live:
+                    del self._offsets[key]
+            outcomes = self._read_outcomes()
+            self.last_tail_at = time.time()
+            if (read or outcomes) and self.state_path:
+                self._save_state()
+            return read
+
+    def _read_outcomes(self):
+        if self.outcomes is None:
+            return 0
+        read = 0
+        while True:
+            rows, cursor = self.outcomes.labeled_since(self._outcome_cursor)
+            if not rows:
+                return read
+            with self._lock:
+                for customer_id, churn_probability, group, assignments, churned in rows:
+                    churned = int(churned)
+                    previous = self._outcome_of.get(customer_id)
+                    if previous == churned:  # Already counted
+                        continue
+                    self._outcome_of[customer_id] = churned
+                    # Groups are sticky, so the customer's earlier outcome is in these same groups
+                    for name, assigned in self._assignments(assignments, group).items():
+                        stats = self._group(name, assigned)
+                        if previous is not None:
+                            stats.remove_outcome(previous)
+                        stats.add_outcome(churned)
+                self._outcome_cursor = cursor
+                self.outcomes_read += len(rows)
+            read += len(rows)
+
+    def _assignments(self, assignments, group):
+        if assignments is None:
+            # Logged before sticky assignment: only the primary A/B group was recorded
+            group = group or NOT_ENROLLED
+            assignments = {} if group == NOT_ENROLLED else {self.experiments.primary.name: group}
+        return assignments
+
+    def _group(self, name, group):
+        groups = self._stats.setdefault(name, {})
+        stats = groups.get(group)
+        if stats is None:
+            stats = groups[group] = GroupStats()
+        return stats
+
+    def _read_from(self, path, offset):
+        read = 0
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return offset, 0
+        with f:
+            f.seek(offset)
+            pending = b""
+            while True:
+                block = f.read(READ_BLOCK_BYTES)
+                if not block:
+                    break
+                block = pending + block
+                end = block.rfind(b"\n")
+                if end < 0:
+                    pending = block
+                    continue
+                pending = block[end + 1:]
+                lines = block[:end].split(b"\n")
+                read += self._ingest(lines)
+                offset += end + 1
+        return offset, read
+
+    def _ingest(self, lines):
+        records = []
+        bad = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = _loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                records.append(record)
+            else:
+                bad += 1
+        with self._lock:
+            self.bad_lines += bad
+            for record in records:
+                self._add(record)
+            self.records_read += len(records)
+        return len(records)
+
+    def _add(self, record):
+        experiment = record.get("experiment") or {}
+        assignments = self._assignments(record.get("experiments"), experiment.get("group"))
+        if not assignments:
+            return
+        churn_probability = float(record.get("prediction", {}).get("churn_probability", 0.0))
+        action = experiment.get("action_taken")
+        for name, group in assignments.items():
+            self._group(name, group).add(churn_probability, action)
+
+    def summary(self, name):
+        """
+        Per-group counters and each treatment group's difference from control, with
+        confidence intervals. Returns None for an experiment that is neither configured
+        nor present in the logs.
+        """
+        experiment = self.experiments.get(name)
+        with self._lock:
+            if experiment is None and name not in self._stats:
+                return None
+            groups = dict(self._stats.get(name, {}))
+            control_name = experiment.control if experiment is not None else None
+            control = groups.get(control_name)
+            result = {
+                "experiment": experiment.describe() if experiment is not None else {"name": name},
+                "confidence": self.confidence,
+                "groups": {},
+                "comparisons": {},
+                "records_read": self.records_read,
+                "outcomes_read": self.outcomes_read,
+                "last_tail_at": self.last_tail_at,
+            }
+            for group, stats in groups.items():
+                result["groups"][group] = {
+                    "predictions": stats.predictions,
+                    "mean_churn_probability": stats.mean_probability(),
+                    "outcomes": stats.outcomes,
+                    "churn_rate": stats.churn_rate(),
+                    "actions": dict(stats.actions),
+                }
+                if control is not None and group != control_name:
+                    result["comparisons"][group] = compare_groups(control, stats, self.confidence)
+        return result
+
+    def status(self):
+        with self._lock:
+            return {
+                "files": len(self._offsets),
+                "records_read": self.records_read,
+                "bad_lines": self.bad_lines,
+                "outcomes": self.outcomes is not None,
+                "outcomes_read": self.outcomes_read,
+                "outcome_customers": len(self._outcome_of),
+                "last_tail_at": self.last_tail_at,
+            }
+
+    def _save_state(self):
+        with self._lock:
+            state = {
+                "offsets": self._offsets,
+                "records_read": self.records_read,
+                "bad_lines": self.bad_lines,
+                "outcome_cursor": self._outcome_cursor,
+                "outcome_of": self._outcome_of,
+                "outcomes_read": self.outcomes_read,
+                "stats": {name: {group: stats.to_dict() for group, stats in groups.items()}
+                          for name, groups in self._stats.items()},
+            }
+            # Serialized under the lock: the dicts are live
+            data = json.dumps(state)
+        # Every worker saves the same state; a private temporary file per writer keeps the
+        # replace atomic, so the file is always one whole state (the last one written)
+        directory, name = os.path.split(os.path.abspath(self.state_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"Ignoring unreadable experiment analytics state {self.state_path}: {e!r}")
+            return
+        self._offsets = dict(state["offsets"])
+        self.records_read = state["records_read"]
+        self.bad_lines = state["bad_lines"]
+        self._outcome_cursor = tuple(state.get("outcome_cursor", (0.0, 0)))
+        self._outcome_of = dict(state.get("outcome_of", {}))
+        self.outcomes_read = state.get("outcomes_read", 0)
+        self._stats = {name: {group: GroupStats.from_dict(stats) for group, stats in groups.items()}
+                       for name, groups in state["stats"].items()}
+        if "outcome_of" not in state:
+            # Saved when outcomes were counted per prediction: count them again, per customer
+            self._outcome_cursor = (0.0, 0)
+            self.outcomes_read = 0
+            for groups in self._stats.values():
+                for stats in groups.values():
+                    stats.outcomes = stats.churned = 0
@@ -0,0 +1,136 @@
+# engine/experiments.py
+
+# Sticky experiment assignment.
+# A customer's group is a pure function of (experiment salt, customer ID): the pair is
+# hashed to a 64-bit number and mapped onto the configured split, so every request,
+# worker and restart puts the same customer in the same group. Experiments are salted
+# independently, so several can run at once without their groups being correlated;
+# changing an experiment's salt reshuffles it.
+#
+# Experiments live in a config file (JSON, or YAML if PyYAML is installed), like the
+# NBA rules. The "primary" experiment is the one /predict acts on: its control group
+# gets no action, every other group gets the recommended action.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+EXPERIMENTS_PATH = os.getenv(
+    "EXPERIMENTS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'experiments.json'))
+
+# Group reported for customers outside an experiment
+NOT_ENROLLED = 'N/A'
+
+_HASH_SPACE = 1 << 64
+
+
+def hash_bucket(salt, customer_id):
+    """A stable 64-bit hash of (salt, customer ID), uniform over [0, 2**64)."""
+    digest = hashlib.blake2b(f"{salt}:{customer_id}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class Experiment:
+    """
+    One experiment with a weighted split.
+
+    Args:
+        name (str): Experiment name, as logged and used in /experiments/{name}/summary.
+        groups (dict): Group name -> weight; weights are normalized, so {"A": 1, "B": 3} is a 25/75 split.
+        salt (str): Hash salt; defaults to the name.
+        control (str): The control group; defaults to the first group.
+        min_churn_probability (float): Customers scoring below this are not enrolled.
+    """
+
+    def __init__(self, name, groups, salt=None, control=None, min_churn_probability=0.0):
+        if not groups or any(weight < 0 for weight in groups.values()) or sum(groups.values()) <= 0:
+            raise ValueError(f"Experiment '{name}' needs at least one group and positive weights.")
+        self.name = name
+        self.salt = salt or name
+        self.groups = list(groups)
+        self.control = control if control is not None else self.groups[0]
+        if self.control not in groups:
+            raise ValueError(f"Control group '{self.control}' of experiment '{name}' is not one of its groups.")
+        self.min_churn_probability = float(min_churn_probability)
+        total = sum(groups.values())
+        self.weights = {group: weight / total for group, weight in groups.items()}
+        # Upper hash bound of each group; the last one is the end of the hash space
+        self._bounds = [int(bound * _HASH_SPACE) for bound in np.cumsum(list(self.weights.values()))]
+        self._bounds[-1] = _HASH_SPACE
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['name'], config['groups'], salt=config.get('salt'), control=config.get('control'),
+                   min_churn_probability=config.get('min_churn_probability', 0.0))
+
+    def assign(self, customer_id):
+        """The customer's group, ignoring eligibility."""
+        bucket = hash_bucket(self.salt, customer_id)
+        for group, bound in zip(self.groups, self._bounds):
+            if bucket < bound:
+                return group
+        return self.groups[-1]
+
+    def eligible(self, churn_probability):
+        return churn_probability >= self.min_churn_probability
+
+    def is_treatment(self, group):
+        return group != self.control and group != NOT_ENROLLED
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "salt": self.salt,
+            "groups": self.weights,
+            "control": self.control,
+            "min_churn_probability": self.min_churn_probability,
+        }
+
+
+class ExperimentSet:
+    """
+    Every configured experiment.
+
+    Args:
+        config (dict): {'experiments': [experiment config, ...], 'primary': name}; the
+                       primary experiment defaults to the first one.
+    """
+
+    def __init__(self, config):
+        self.experiments = {}
+        for experiment_config in config['experiments']:
+            experiment = Experiment.from_config(experiment_config)
+            if experiment.name in self.experiments:
+                raise ValueError(f"Duplicate experiment '{experiment.name}'.")
+            self.experiments[experiment.name] = experiment
+        primary = config.get('primary', next(iter(self.experiments)))
+        if primary not in self.experiments:
+            raise ValueError(f"Primary experiment '{primary}' is not configured.")
+        self.primary = self.experiments[primary]
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            if path.endswith(('.yaml', '.yml')):
+                import yaml
+
+                return cls(yaml.safe_load(f))
+            return cls(json.load(f))
+
+    def __contains__(self, name):
+        return name in self.experiments
+
+    def get(self, name):
+        return self.experiments.get(name)
+
+    def assign(self, customer_id, churn_probability):
+        """
+        Groups of every experiment the customer is enrolled in.
+
+        Returns:
+            dict: Experiment name -> group, for the experiments the churn probability qualifies for.
+        """
+        return {name: experiment.assign(customer_id)
+                for name, experiment in self.experiments.items() if experiment.eligible(churn_probability)}
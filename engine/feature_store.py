@@ -0,0 +1,467 @@
+# engine/feature_store.py
+
+# A columnar, in-memory customer store.
+# Keeping the CRM table as a pandas DataFrame means every request pays for `.loc`,
+# a fresh one-row DataFrame and several `to_dict()` copies, and the object-dtype
+# string columns are expensive to hold. Here each column is one typed NumPy array,
+# categoricals are dictionary-encoded, and a dict maps CustomerID -> row position.
+#
+# For multi-process serving the store can also be materialized once into a directory of
+# .npy files and opened memory-mapped and read-only by every worker, so the pages are
+# shared through the OS page cache instead of being copied into each process. In that
+# mode the CustomerID index is a sorted, fixed-width ID array searched with
+# np.searchsorted rather than a per-process dict.
+#
+# Upserts never modify a published row. A new or changed customer is written as a new
+# row past the end of the column buffers (which grow by doubling), then the column views
+# and finally the index entry are swapped. A reader that already resolved a position
+# keeps reading a complete, consistent row, and derived state keyed by row position
+# (like precomputed scores) is naturally invalid for exactly the rows that changed.
+
+import json
+import os
+import shutil
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+
+# Same compact dtypes data/generate_data.py writes the data with
+NUMERIC_DTYPES = {
+    'Age': np.int16,
+    'Tenure': np.int16,
+    'MonthlyRevenue': np.float32,
+    'UsageFrequency': np.int16,
+    'SupportTickets': np.int16,
+    'LastInteraction': np.int16,
+    'Churn': np.int8,
+}
+CATEGORICAL_COLUMNS = ['Gender', 'Location', 'SubscriptionTier']
+ID_COLUMN = 'CustomerID'
+
+
+class ReadOnlyStoreError(RuntimeError):
+    """The store is a shared, memory-mapped snapshot and cannot be modified."""
+
+
+def _code_dtype(n_categories):
+    return np.int8 if n_categories < 128 else np.int16 if n_categories < 32768 else np.int32
+
+
+class SortedIdIndex:
+    """
+    A CustomerID -> row position index over two (memory-mappable) arrays: the IDs as
+    sorted fixed-width UTF-8 bytes, and the row position of each sorted ID.
+    Same `get` / `in` interface as the dict index.
+    """
+
+    __slots__ = ('_sorted_ids', '_positions', '_width')
+
+    def __init__(self, sorted_ids, positions):
+        self._sorted_ids = sorted_ids
+        self._positions = positions
+        self._width = sorted_ids.dtype.itemsize
+
+    def get(self, customer_id, default=None):
+        key = customer_id.encode('utf-8') if isinstance(customer_id, str) else customer_id
+        if len(key) > self._width:
+            return default
+        i = int(np.searchsorted(self._sorted_ids, key))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == key:
+            return int(self._positions[i])
+        return default
+
+    def __contains__(self, customer_id):
+        return self.get(customer_id) is not None
+
+
+class CustomerRow(Mapping):
+    """
+    A read-only, zero-copy view of one customer row.
+
+    It behaves like the dict the engines expect (`row['Tenure']`, `row.get(...)`,
+    `**row`), but values are read straight from the store's column arrays.
+    """
+
+    __slots__ = ('_store', '_position')
+
+    def __init__(self, store, position):
+        self._store = store
+        self._position = position
+
+    def __getitem__(self, key):
+        store = self._store
+        column = store.columns[key]
+        categories = store.categories.get(key)
+        if categories is not None:
+            return categories[column[self._position]]
+        return column[self._position]
+
+    def __iter__(self):
+        return iter(self._store.column_names)
+
+    def __len__(self):
+        return len(self._store.column_names)
+
+    def __contains__(self, key):
+        return key in self._store.columns
+
+    @property
+    def position(self):
+        return self._position
+
+    def to_dict(self):
+        """Copies the row into a plain dict of Python values (e.g. for JSON logging)."""
+        return {key: (value.item() if isinstance(value, np.generic) else value) for key, value in self.items()}
+
+
+class CustomerStore:
+    """
+    Typed column arrays for the whole CRM table, plus a CustomerID -> row index.
+
+    Args:
+        ids (np.ndarray): CustomerIDs in row order (str objects, or UTF-8 bytes when shared).
+        columns (dict): Column name -> NumPy array (codes for categorical columns).
+        categories (dict): Categorical column name -> array of category labels.
+        version (int): Data version, so derived state can detect a reload.
+        index: CustomerID -> position index; a dict is built from `ids` if omitted.
+    """
+
+    def __init__(self, ids, columns, categories, version=0, index=None):
+        self.ids = ids
+        self.columns = columns
+        self.categories = categories
+        self.column_names = list(columns)
+        self.version = version
+        self.shared = index is not None
+        self._index = index if index is not None else {customer_id: i for i, customer_id in enumerate(ids.tolist())}
+        # Upsert state: full-capacity buffers behind the published `ids`/`columns` views
+        self._write_lock = threading.Lock()
+        self._id_buffer = ids
+        self._buffers = dict(columns)
+        self._category_codes = None
+        # Rows that came from the source file; rows after them were added by upserts
+        self.base_rows = len(ids)
+        # Set by `compact` on the store it replaces, so late writers can follow it
+        self.successor = None
+
+    @classmethod
+    def from_frame(cls, df, version=0):
+        """Builds the store from a DataFrame with a CustomerID column."""
+        import pandas as pd
+
+        columns, categories = {}, {}
+        for name in df.columns:
+            if name == ID_COLUMN:
+                continue
+            values = df[name]
+            if name in CATEGORICAL_COLUMNS or values.dtype == object:
+                encoded = pd.Categorical(values)
+                categories[name] = np.asarray(encoded.categories, dtype=object)
+                columns[name] = encoded.codes.astype(_code_dtype(len(encoded.categories)))
+            else:
+                columns[name] = values.to_numpy(dtype=NUMERIC_DTYPES.get(name, values.dtype))
+        return cls(df[ID_COLUMN].to_numpy(dtype=object), columns, categories, version=version)
+
+    @classmethod
+    def from_csv(cls, path, version=0):
+        import pandas as pd
+
+        dtypes = {name: dtype for name, dtype in NUMERIC_DTYPES.items()}
+        dtypes.update({name: 'category' for name in CATEGORICAL_COLUMNS})
+        return cls.from_frame(pd.read_csv(path, dtype=dtypes), version=version)
+
+    # --- Shared, memory-mapped form ---
+    def materialize(self, directory):
+        """
+        Writes the store as .npy files (plus a sorted ID index) for `open_shared`.
+
+        The files are written to a temporary directory that is renamed into place, so
+        concurrent readers (or a second writer) never see a half-written store.
+        """
+        staging = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        ids = np.char.encode(np.asarray(self.id_list(), dtype=str), 'utf-8')
+        order = np.argsort(ids, kind='stable')
+        np.save(os.path.join(staging, 'ids.npy'), ids)
+        np.save(os.path.join(staging, 'sorted_ids.npy'), ids[order])
+        np.save(os.path.join(staging, 'sorted_positions.npy'), order.astype(np.int64))
+        for name, column in self.columns.items():
+            np.save(os.path.join(staging, f'col_{name}.npy'), np.ascontiguousarray(column))
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump({
+                "rows": self.row_count,
+                "columns": self.column_names,
+                "categories": {name: labels.tolist() for name, labels in self.categories.items()},
+            }, f)
+
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # Another process materialized the same data first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    @classmethod
+    def open_shared(cls, directory, version=0):
+        """Maps a materialized store read-only; pages are shared by every process that opens it."""
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+
+        def load(file_name):
+            return np.load(os.path.join(directory, file_name), mmap_mode='r')
+
+        columns = {name: load(f'col_{name}.npy') for name in meta["columns"]}
+        categories = {name: np.asarray(labels, dtype=object) for name, labels in meta["categories"].items()}
+        index = SortedIdIndex(load('sorted_ids.npy'), load('sorted_positions.npy'))
+        return cls(load('ids.npy'), columns, categories, version=version, index=index)
+
+    @classmethod
+    def from_csv_shared(cls, path, cache_dir, version=0):
+        """
+        Opens the shared form of the CSV at `path`, materializing it under `cache_dir`
+        first if this exact file (by size and mtime) has not been materialized yet.
+        """
+        stat = os.stat(path)
+        directory = os.path.join(cache_dir, f"{os.path.basename(path)}-{stat.st_size}-{stat.st_mtime_ns}")
+        if not os.path.exists(os.path.join(directory, 'meta.json')):
+            os.makedirs(cache_dir, exist_ok=True)
+            cls.from_csv(path).materialize(directory)
+        return cls.open_shared(directory, version=version)
+
+    def __len__(self):
+        """Number of customers (superseded row versions are not counted)."""
+        return len(self._index)
+
+    @property
+    def customer_count(self):
+        return len(self._index)
+
+    @property
+    def row_count(self):
+        """Number of physical rows, including superseded versions of upserted customers."""
+        return len(self.ids)
+
+    @property
+    def dead_rows(self):
+        return self.row_count - len(self._index)
+
+    def live_positions(self):
+        """Sorted row positions of every customer's current row."""
+        if self.shared:  # Never upserted: every row is live
+            return np.arange(self.row_count, dtype=np.intp)
+        index = self._index
+        return np.sort(np.fromiter(index.values(), dtype=np.intp, count=len(index)))
+
+    def compact(self, version):
+        """
+        A new store with only each customer's current row, in row order, so customers
+        that were never changed come first (`base_rows` of them) and changed ones after.
+        Row positions differ from this store's, hence the new data `version`.
+        """
+        if self.shared:
+            raise ReadOnlyStoreError("The shared customer store is read-only.")
+        with self._write_lock:
+            live = self.live_positions()
+            ids = self.ids[live]
+            columns = {name: column[live] for name, column in self.columns.items()}
+            categories = dict(self.categories)
+            base_rows = int(np.searchsorted(live, self.base_rows))
+        compacted = CustomerStore(ids, columns, categories, version=version)
+        compacted.base_rows = base_rows
+        return compacted
+
+    # --- Upserts ---
+    def coerce(self, fields, replace=False):
+        """
+        Validates and converts raw field values to the store's column types.
+
+        Args:
+            fields (dict): Column name -> value (CustomerID is not a field).
+            replace (bool): Whether the fields are a full record; all columns are then required.
+        Returns:
+            dict: Column name -> NumPy scalar (or label, for categorical columns).
+        Raises:
+            ValueError: On unknown or missing columns, or values that don't fit the column type.
+        """
+        unknown = set(fields) - set(self.column_names)
+        if unknown:
+            raise ValueError(f"Unknown fields: {sorted(unknown)}")
+        if replace:
+            missing = set(self.column_names) - set(fields)
+            if missing:
+                raise ValueError(f"Missing fields: {sorted(missing)}")
+        coerced = {}
+        for name, value in fields.items():
+            if name in self.categories:
+                if not isinstance(value, str) or not value:
+                    raise ValueError(f"'{name}' must be a non-empty string.")
+                coerced[name] = value
+                continue
+            dtype = self._buffers[name].dtype
+            try:
+                if dtype.kind in 'iu' and (isinstance(value, bool) or not float(value).is_integer()):
+                    raise ValueError
+                converted = np.array(value).astype(dtype, casting='unsafe')
+                if dtype.kind in 'iu' and int(converted) != int(value):
+                    raise OverflowError
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"'{name}' must be a {dtype.name} value, got {value!r}.") from None
+            coerced[name] = converted[()]
+        return coerced
+
+    def upsert(self, customer_id, fields, replace=False):
+        """
+        Adds or updates one customer; see `upsert_many`.
+
+        Returns:
+            tuple: (row position, created)
+        """
+        return self.upsert_many([(customer_id, fields, replace)])[0]
+
+    def upsert_many(self, changes):
+        """
+        Applies (customer_id, coerced fields, replace) changes as new row versions.
+
+        A partial update (`replace=False`) starts from the customer's current row. Each
+        change costs O(columns) plus an amortized O(1) buffer growth, independent of the
+        table size.
+
+        Returns:
+            list: (row position, created) per change.
+        Raises:
+            ReadOnlyStoreError: For a shared, memory-mapped store.
+            KeyError: For a partial update of an unknown customer.
+        """
+        if self.shared:
+            raise ReadOnlyStoreError("The shared customer store is read-only.")
+        results = []
+        with self._write_lock:
+            for customer_id, fields, replace in changes:
+                current = self._index.get(customer_id)
+                if current is None and not replace:
+                    raise KeyError(customer_id)
+                if replace:
+                    values = dict(fields)
+                else:
+                    values = {name: self._read(name, current) for name in self.column_names}
+                    values.update(fields)
+                position = self._append_row(customer_id, values)
+                # Publishing the index entry last makes the new row visible to readers
+                self._index[customer_id] = position
+                results.append((position, current is None))
+        return results
+
+    def _read(self, name, position):
+        value = self._buffers[name][position]
+        categories = self.categories.get(name)
+        return categories[value] if categories is not None else value
+
+    def _append_row(self, customer_id, values):
+        position = len(self.ids)
+        if position == len(self._id_buffer):
+            self._grow(max(16, 2 * position))
+
+        codes = {}
+        for name in self.categories:
+            codes[name] = self._category_code(name, values[name])
+
+        self._id_buffer[position] = customer_id
+        for name in self.column_names:
+            self._buffers[name][position] = codes[name] if name in codes else values[name]
+
+        # New views include the row; the old views (held by in-flight readers) don't
+        n_rows = position + 1
+        self.columns = {name: buffer[:n_rows] for name, buffer in self._buffers.items()}
+        self.ids = self._id_buffer[:n_rows]
+        return position
+
+    def _grow(self, capacity):
+        id_buffer = np.empty(capacity, dtype=object)
+        id_buffer[:len(self.ids)] = self.ids
+        buffers = {}
+        for name, column in self.columns.items():
+            buffer = np.zeros(capacity, dtype=self._buffers[name].dtype)
+            buffer[:len(column)] = column
+            buffers[name] = buffer
+        self._id_buffer, self._buffers = id_buffer, buffers
+
+    def _category_code(self, name, label):
+        if self._category_codes is None:
+            self._category_codes = {column: {value: code for code, value in enumerate(labels.tolist())}
+                                    for column, labels in self.categories.items()}
+        codes = self._category_codes[name]
+        code = codes.get(label)
+        if code is None:
+            code = len(codes)
+            buffer = self._buffers[name]
+            if code > np.iinfo(buffer.dtype).max:
+                # Widen the code column (rare: only when a column outgrows its code type)
+                self._buffers[name] = buffer.astype(_code_dtype(code + 1))
+                self.columns = {**self.columns, name: self._buffers[name][:len(self.ids)]}
+            self.categories = {**self.categories, name: np.append(self.categories[name], np.array([label], dtype=object))}
+            codes[label] = code
+        return code
+
+    def __contains__(self, customer_id):
+        return customer_id in self._index
+
+    # --- Lookups ---
+    def position(self, customer_id):
+        """Returns the row position of a customer, or None if unknown."""
+        return self._index.get(customer_id)
+
+    def positions(self, customer_ids):
+        """
+        Resolves many IDs at once.
+
+        Returns:
+            tuple: (known IDs, their row positions as an int array, unknown IDs)
+        """
+        known, positions, unknown = [], [], []
+        index = self._index
+        for customer_id in customer_ids:
+            position = index.get(customer_id)
+            if position is None:
+                unknown.append(customer_id)
+            else:
+                known.append(customer_id)
+                positions.append(position)
+        return known, np.asarray(positions, dtype=np.intp), unknown
+
+    def id_list(self, positions=slice(None)):
+        """CustomerIDs of the given rows as a list of str."""
+        ids = self.ids[positions]
+        if ids.dtype.kind == 'S':
+            return np.char.decode(ids, 'utf-8').tolist()
+        return ids.tolist()
+
+    def row(self, position):
+        return CustomerRow(self, position)
+
+    def take(self, positions):
+        """
+        Gathers rows as a dict of column arrays (categoricals decoded to labels).
+
+        Args:
+            positions: Row positions (int array, list or slice).
+        """
+        taken = {}
+        for name, column in self.columns.items():
+            values = column[positions]
+            categories = self.categories.get(name)
+            taken[name] = categories[values] if categories is not None else values
+        return taken
+
+    def to_frame(self, positions=slice(None)):
+        """Materializes rows as a DataFrame indexed by CustomerID (for pandas-based consumers)."""
+        import pandas as pd
+
+        return pd.DataFrame(self.take(positions), index=pd.Index(self.id_list(positions), name=ID_COLUMN))
+
+    def memory_bytes(self):
+        """Approximate bytes held by the column arrays (excluding the ID index; mapped pages when shared)."""
+        total = sum(column.nbytes for column in self.columns.values())
+        total += sum(labels.nbytes for labels in self.categories.values())
+        return total
@@ -0,0 +1,210 @@
+# engine/generation_cache.py
+
+# A content-addressed cache for generated emails.
+# An email only depends on the rendered prompt and the generation parameters, so the
+# cache key is a hash of exactly those. Entries live in an in-memory LRU with a TTL and
+# a size limit, and optionally in SQLite so they survive restarts.
+#
+# The SQLite connection is opened on first use in each process, never at construction:
+# the cache is created at import time, and a connection made in a preloading gunicorn
+# master must not be shared by the workers forked from it.
+#
+# Only the memory tier is touched on the event loop. `lookup` reads the disk tier in a
+# worker thread, and `put` hands disk writes to a single background writer thread, so a
+# slow disk or a WAL checkpoint delays a cache fill rather than every request in flight.
+# The two tiers have separate locks, so a memory lookup never waits on a disk query.
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class GenerationCache:
+    """
+    Two-tier (memory LRU + optional SQLite) cache of generated texts.
+
+    Args:
+        max_entries (int): Most entries kept in memory; the least recently used is evicted.
+        ttl_seconds (float): How long an entry stays valid, in both tiers.
+        db_path (str): Optional SQLite file for the on-disk tier.
+    """
+
+    def __init__(self, max_entries=10_000, ttl_seconds=24 * 3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+        self._lock = threading.Lock()  # Guards the memory tier and the counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.write_errors = 0
+
+        self.db_path = db_path
+        self._db_lock = threading.Lock()  # Guards the connection
+        self._db = None
+        self._db_pid = None  # Process that opened `_db`
+        self._writer = None  # Single-thread executor for disk writes
+        self._writer_pid = None
+        os.register_at_fork(after_in_child=self._reset_locks)
+
+    @classmethod
+    def from_env(cls):
+        """Builds the cache from EMAIL_CACHE_MAX_ENTRIES, EMAIL_CACHE_TTL_SECONDS and EMAIL_CACHE_DB."""
+        return cls(
+            max_entries=int(os.getenv("EMAIL_CACHE_MAX_ENTRIES", "10000")),
+            ttl_seconds=float(os.getenv("EMAIL_CACHE_TTL_SECONDS", str(24 * 3600))),
+            db_path=os.getenv("EMAIL_CACHE_DB") or None,
+        )
+
+    def _connection(self):
+        """This process's connection to the on-disk tier (None without one). Call with `_db_lock` held."""
+        if self.db_path is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            # A connection inherited across a fork is abandoned, not closed: it belongs to the parent
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db_pid = os.getpid()
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS generations (key TEXT PRIMARY KEY, text TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM generations WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+        return self._db
+
+    def _reset_locks(self):
+        # A lock the parent's writer thread held at the fork would stay locked in the child forever
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt, parameters):
+        """Hashes the fully rendered prompt together with the generation parameters."""
+        payload = json.dumps({"prompt": prompt, "parameters": parameters}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the cached text for `key`, or None on a miss. Blocks on the disk tier; async code uses `lookup`."""
+        text = self._get_memory(key)
+        if text is None and self.db_path is not None:
+            text = self._get_disk(key)
+        if text is None:
+            self._count_miss()
+        return text
+
+    async def lookup(self, key):
+        """`get` for the event loop: the memory tier is checked inline, the disk tier in a worker thread."""
+        text = self._get_memory(key)
+        if text is None and self.db_path is not None:
+            text = await asyncio.to_thread(self._get_disk, key)
+        if text is None:
+            self._count_miss()
+        return text
+
+    def put(self, key, text):
+        """
+        Stores a successfully generated text. Callers must not pass error messages.
+        Never blocks on disk: the SQLite write is queued for the writer thread.
+        """
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store_in_memory(key, text, expires_at)
+            if self.db_path is None:
+                return
+            if self._writer is None or self._writer_pid != os.getpid():
+                # Threads don't survive a fork, so each process starts its own writer
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='email-cache-writer')
+                self._writer_pid = os.getpid()
+            writer = self._writer
+        writer.submit(self._put_disk, key, text, expires_at)
+
+    def _get_memory(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, text = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+            del self._entries[key]
+            self.expirations += 1
+            return None
+
+    def _get_disk(self, key):
+        now = time.time()
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT text, expires_at FROM generations WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            # Promote to the memory tier
+            self._store_in_memory(key, row[0], row[1])
+            self.hits += 1
+            self.disk_hits += 1
+        return row[0]
+
+    def _put_disk(self, key, text, expires_at):
+        try:
+            with self._db_lock:
+                db = self._connection()
+                db.execute(
+                    "INSERT OR REPLACE INTO generations (key, text, expires_at) VALUES (?, ?, ?)",
+                    (key, text, expires_at),
+                )
+                db.commit()
+        except Exception as e:  # The entry is still in memory; only its disk copy is lost
+            with self._lock:
+                self.write_errors += 1
+            print(f"Email cache disk write failed: {e!r}")
+
+    def _count_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _store_in_memory(self, key, text, expires_at):
+        self._entries[key] = (expires_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_tier": self.db_path is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "write_errors": self.write_errors,
+            }
+
+    def close(self):
+        """Finishes the queued disk writes, then closes this process's connection."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None and self._writer_pid == os.getpid():
+            writer.shutdown(wait=True)
+        with self._db_lock:
+            if self._db is not None and self._db_pid == os.getpid():
+                self._db.close()
+            self._db = None
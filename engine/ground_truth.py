@@ -0,0 +1,199 @@
+# engine/ground_truth.py
+
+# Ground-truth labels joined back to the predictions they judge.
+# Predictions are recorded in a SQLite table indexed by customer ID, in batches, from the
+# prediction log writer's thread (never on the request path). When labels arrive, each
+# one is matched through that index to the customer's still-unlabeled predictions made
+# before the label was observed, so ingestion costs O(log n) per label rather than a
+# scan of the JSONL logs. Model quality over the labeled predictions is then a couple of
+# aggregate queries.
+#
+# Predictions still unlabeled after `retention_days` are deleted (checked at most once a
+# minute, when a batch is recorded), so the table holds a bounded window of traffic
+# plus the labeled rows; a label arriving later than that finds nothing to join.
+#
+# Label batches get strictly increasing `labeled_at` times, so `labeled_since(cursor)`
+# hands each labeled prediction to a consumer (the experiment analytics) exactly once.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Seconds between two retention passes
+PRUNE_INTERVAL_SECONDS = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    customer_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    run_id TEXT,
+    churn_probability REAL NOT NULL,
+    experiment_group TEXT,
+    experiments TEXT,
+    action TEXT,
+    churned INTEGER,
+    labeled_at REAL
+);
+CREATE INDEX IF NOT EXISTS predictions_by_customer ON predictions (customer_id, ts);
+CREATE INDEX IF NOT EXISTS predictions_by_label ON predictions (labeled_at) WHERE churned IS NOT NULL;
+CREATE INDEX IF NOT EXISTS predictions_unlabeled_by_ts ON predictions (ts) WHERE churned IS NULL;
+CREATE TABLE IF NOT EXISTS labels (
+    customer_id TEXT PRIMARY KEY,
+    churned INTEGER NOT NULL,
+    observed_at REAL NOT NULL
+);
+"""
+
+
+class GroundTruthStore:
+    """
+    SQLite store of predictions and their ground-truth labels.
+
+    Args:
+        path (str): The database file; created if missing. Several processes may share it.
+        threshold (float): Churn probability counted as a positive prediction for accuracy.
+        retention_days (float): Unlabeled predictions older than this are deleted (None = kept).
+    """
+
+    def __init__(self, path, threshold=0.5, retention_days=30.0):
+        self.path = path
+        self.threshold = threshold
+        self.retention_days = retention_days
+        self._next_prune_at = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0, isolation_level=None)
+        # WAL: readers don't block the writer, and gunicorn workers can share the file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(predictions)")}
+        if 'experiments' not in columns:  # Created before assignments were recorded
+            self._conn.execute("ALTER TABLE predictions ADD COLUMN experiments TEXT")
+
+    @classmethod
+    def from_env(cls, threshold=0.5):
+        """Opt-in: None unless GROUND_TRUTH_DB is set (like EMAIL_CACHE_DB)."""
+        path = os.getenv("GROUND_TRUTH_DB", "")
+        retention_days = float(os.getenv("GROUND_TRUTH_RETENTION_DAYS", "30"))
+        return cls(path, threshold=threshold, retention_days=retention_days or None) if path else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record_predictions(self, records):
+        """
+        Inserts a batch of prediction log records, then applies the retention window.
+        Used as a PredictionLogWriter sink.
+        """
+        rows = [(
+            record["customer_id"],
+            float(record["timestamp"]),
+            record.get("model_version"),
+            float(record["prediction"]["churn_probability"]),
+            record.get("experiment", {}).get("group"),
+            json.dumps(record["experiments"]) if record.get("experiments") else None,
+            record.get("experiment", {}).get("action_taken"),
+        ) for record in records]
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO predictions (customer_id, ts, run_id, churn_probability, experiment_group, "
+                    "experiments, action) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            now = time.time()
+            if self.retention_days is not None and now >= self._next_prune_at:
+                self._next_prune_at = now + PRUNE_INTERVAL_SECONDS
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.execute("DELETE FROM predictions WHERE churned IS NULL AND ts < ?",
+                                       (now - self.retention_days * 86400.0,))
+
+    def add_labels(self, labels):
+        """
+        Stores labels and joins each to the customer's unlabeled predictions made up to
+        the time it was observed.
+
+        Args:
+            labels (list): (customer_id, churned, observed_at) tuples; observed_at may be None (now).
+        Returns:
+            int: Number of predictions that got a label.
+        """
+        matched = 0
+        with self._lock:
+            with self._conn:
+                # IMMEDIATE takes the write lock first, so batches are timestamped in commit order,
+                # and each one strictly after the last (even across processes sharing the file)
+                self._conn.execute("BEGIN IMMEDIATE")
+                last = self._conn.execute("SELECT MAX(labeled_at) FROM predictions").fetchone()[0] or 0.0
+                now = max(time.time(), last + 1e-6)
+                for customer_id, churned, observed_at in labels:
+                    observed_at = now if observed_at is None else float(observed_at)
+                    self._conn.execute(
+                        "INSERT INTO labels (customer_id, churned, observed_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT (customer_id) DO UPDATE SET churned = excluded.churned, "
+                        "observed_at = excluded.observed_at", (customer_id, int(churned), observed_at))
+                    matched += self._conn.execute(
+                        "UPDATE predictions SET churned = ?, labeled_at = ? "
+                        "WHERE customer_id = ? AND ts <= ? AND churned IS NULL",
+                        (int(churned), now, customer_id, observed_at)).rowcount
+        return matched
+
+    def labeled_since(self, cursor=(0.0, 0), limit=10_000):
+        """
+        Predictions labeled after `cursor`, in labeling order, one per customer: a label
+        is written onto every earlier prediction of the customer, and only the latest of
+        those is returned. A customer labeled again in a later call appears again.
+
+        Args:
+            cursor (tuple): (labeled_at, id) of the last prediction already consumed.
+        Returns:
+            tuple: (rows, new cursor); rows are (customer_id, churn_probability, experiment_group,
+                   experiments, churned) tuples, where `experiments` is the logged assignments
+                   dict (None for older rows).
+        """
+        labeled_at, last_id = cursor
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT labeled_at, id, customer_id, churn_probability, experiment_group, experiments, churned "
+                "FROM predictions "
+                "WHERE churned IS NOT NULL AND (labeled_at > ? OR (labeled_at = ? AND id > ?)) "
+                "ORDER BY labeled_at, id LIMIT ?", (labeled_at, labeled_at, last_id, limit)).fetchall()
+        if rows:
+            cursor = (rows[-1][0], rows[-1][1])
+        # Ordered by (labeled_at, id), so the last row of a customer is their latest prediction
+        latest = {row[2]: row for row in rows}
+        return [(customer_id, probability, group, json.loads(assignments) if assignments else None, churned)
+                for _, _, customer_id, probability, group, assignments, churned in latest.values()], cursor
+
+    def performance(self, since=None):
+        """
+        Quality of the labeled predictions, per model run_id.
+
+        Args:
+            since (float): Only predictions labeled at or after this time (None = all, a full scan).
+        """
+        where = "churned IS NOT NULL" + (" AND labeled_at >= ?" if since is not None else "")
+        params = (self.threshold,) + ((since,) if since is not None else ())
+        query = (
+            "SELECT run_id, COUNT(*), AVG(churned), AVG(churn_probability), "
+            "AVG((churn_probability - churned) * (churn_probability - churned)), "
+            "AVG((churn_probability >= ?) = churned) "
+            f"FROM predictions WHERE {where} GROUP BY run_id"
+        )
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            # Row ids only grow, so this is an index lookup rather than a COUNT(*) scan
+            total = self._conn.execute("SELECT MAX(id) FROM predictions").fetchone()[0] or 0
+        by_run = {run_id: {
+            "labeled": n,
+            "churn_rate": round(churn_rate, 6),
+            "mean_churn_probability": round(mean_probability, 6),
+            "brier_score": round(brier, 6),
+            "accuracy": round(accuracy, 6),
+        } for run_id, n, churn_rate, mean_probability, brier, accuracy in rows}
+        return {"predictions_recorded": total, "labeled": sum(entry["labeled"] for entry in by_run.values()),
+                "threshold": self.threshold, "by_run_id": by_run}
@@ -0,0 +1,180 @@
+# engine/llm_client.py
+
+# An async client for the Hugging Face text-generation Inference API.
+# One pooled httpx.AsyncClient is shared by all requests. A semaphore caps how many
+# generations run at once, every attempt has a timeout, and transient failures
+# (network errors, 429, 5xx) are retried a bounded number of times with backoff.
+# `stream_generation` uses the API's streaming mode (Server-Sent Events, one event per
+# token), so callers can pass tokens on as they are produced.
+
+import asyncio
+import json
+import os
+import random
+
+import httpx
+
+DEFAULT_MODEL_ID = "mistralai/Mistral-7B-Instruct-v0.2"
+DEFAULT_API_URL = f"https://api-inference.huggingface.co/models/{DEFAULT_MODEL_ID}"
+
+# Status codes worth another attempt: rate limiting, model loading, gateway hiccups
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    """The LLM call failed after all retries."""
+
+
+class AsyncLLMClient:
+    """
+    Connection-pooled, concurrency-limited text-generation client.
+
+    Args:
+        api_url (str): Inference endpoint (Hugging Face API or a compatible stand-in server).
+        token (str): Bearer token, e.g. HF_TOKEN.
+        max_concurrency (int): Most generations in flight at once; extra calls wait.
+        timeout (float): Seconds allowed for each HTTP attempt.
+        max_retries (int): Extra attempts after the first one for retryable failures.
+        backoff_base (float): First retry delay in seconds; doubles on each retry, with jitter.
+    """
+
+    def __init__(self, api_url=DEFAULT_API_URL, token=None, max_concurrency=8, timeout=30.0,
+                 max_retries=2, backoff_base=0.5):
+        self.api_url = api_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self._client = httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def from_env(cls):
+        """Builds a client from HF_API_URL, HF_TOKEN and the LLM_* settings."""
+        return cls(
+            api_url=os.getenv("HF_API_URL", DEFAULT_API_URL),
+            token=os.getenv("HF_TOKEN"),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            backoff_base=float(os.getenv("LLM_BACKOFF_SECONDS", "0.5")),
+        )
+
+    async def text_generation(self, prompt, **parameters):
+        """
+        Generates a completion for `prompt`.
+
+        Args:
+            prompt (str): The full prompt.
+            **parameters: Generation parameters (max_new_tokens, temperature, ...).
+        Returns:
+            str: The generated text (without the prompt).
+        Raises:
+            LLMError: If every attempt failed.
+        """
+        payload = {"inputs": prompt, "parameters": {**parameters, "return_full_text": False}}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            # Held per attempt only: a caller backing off doesn't keep a slot from the others
+            async with self._semaphore:
+                try:
+                    response = await self._client.post(self.api_url, json=payload)
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        response.raise_for_status()
+                        return self._parse(response.json())
+                    last_error = LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+                except httpx.TransportError as e:  # includes timeouts
+                    last_error = e
+                except httpx.HTTPStatusError as e:
+                    raise LLMError(f"HTTP {e.response.status_code}: {e.response.text[:200]}") from e
+
+            if attempt < self.max_retries:
+                await self._backoff(attempt)
+        raise LLMError(f"Generation failed after {self.max_retries + 1} attempts: {last_error}")
+
+    async def stream_generation(self, prompt, **parameters):
+        """
+        Streams a completion for `prompt`, token by token.
+
+        Failures before the first token are retried like in `text_generation`. Closing the
+        generator early (e.g. because the caller was cancelled) closes the connection, which
+        stops the generation upstream.
+
+        Args:
+            prompt (str): The full prompt.
+            **parameters: Generation parameters (max_new_tokens, temperature, ...).
+        Yields:
+            str: The text of each generated token.
+        Raises:
+            LLMError: If every attempt failed, or the stream broke once tokens had been sent.
+        """
+        payload = {"inputs": prompt, "parameters": {**parameters, "return_full_text": False}, "stream": True}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            streamed = False
+            # Held per attempt (for the whole stream), released before backing off
+            async with self._semaphore:
+                try:
+                    async with self._client.stream("POST", self.api_url, json=payload) as response:
+                        if response.status_code in RETRYABLE_STATUS_CODES:
+                            await response.aread()
+                            last_error = LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+                        else:
+                            if response.is_error:
+                                await response.aread()
+                                raise LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+                            async for event in self._events(response):
+                                if "error" in event:
+                                    raise LLMError(f"Generation failed: {event['error']}")
+                                token = event.get("token") or {}
+                                if token.get("text") and not token.get("special"):
+                                    streamed = True
+                                    yield token["text"]
+                            return
+                except httpx.TransportError as e:  # includes timeouts between tokens
+                    if streamed:
+                        # Tokens already went out; a retry would repeat them
+                        raise LLMError(f"Stream interrupted after it started: {e!r}") from e
+                    last_error = e
+
+            if attempt < self.max_retries:
+                await self._backoff(attempt)
+        raise LLMError(f"Streaming generation failed after {self.max_retries + 1} attempts: {last_error}")
+
+    async def _backoff(self, attempt):
+        delay = self.backoff_base * (2 ** attempt)
+        await asyncio.sleep(delay * (0.5 + random.random()))
+
+    @staticmethod
+    async def _events(response):
+        # Server-Sent Events: "data:" lines, an event ends at a blank line
+        data = []
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                data.append(line[5:].strip())
+            elif not line and data:
+                payload, data = "\n".join(data), []
+                if payload != "[DONE]":
+                    yield json.loads(payload)
+        if data and data != ["[DONE]"]:
+            yield json.loads("\n".join(data))
+
+    @staticmethod
+    def _parse(body):
+        # The Inference API returns [{"generated_text": ...}]; TGI's /generate returns a dict
+        if isinstance(body, list):
+            body = body[0]
+        return body["generated_text"]
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -0,0 +1,113 @@
+# engine/metrics.py
+
+# Request-level latency and outcome metrics, exposed in Prometheus text format.
+# /predict times each stage with a `StageTimer` (a couple of perf_counter() calls per
+# stage) and records the laps once, at the end of the request, labeled with the
+# experiment group, the action and the model run_id. A small fraction of requests, plus
+# every slow one, also gets a request-ID-tagged stage breakdown in its log entry.
+#
+# Under gunicorn, set PROMETHEUS_MULTIPROC_DIR so every worker's samples are aggregated.
+
+import os
+import random
+import time
+import uuid
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+
+# Stage latencies are mostly sub-millisecond; the LLM call takes seconds
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    'churn_api_stage_seconds', "Time spent in each /predict stage.",
+    ['stage', 'group', 'action', 'run_id'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    'churn_api_request_seconds', "End-to-end /predict handler time.",
+    ['group', 'action', 'run_id'], buckets=LATENCY_BUCKETS,
+)
+LLM_SECONDS = Histogram(
+    'churn_api_llm_seconds', "LLM generation calls (cache misses only).",
+    ['outcome'], buckets=LATENCY_BUCKETS,
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    'churn_api_llm_first_token_seconds', "Time to the first token of streamed LLM generations.",
+    buckets=LATENCY_BUCKETS,
+)
+NOT_FOUND = Counter('churn_api_customer_not_found_total', "Requests for unknown customer IDs.", ['endpoint'])
+LLM_ERRORS = Counter('churn_api_llm_errors_total', "Email generations that failed after all retries.")
+EMAIL_STREAMS = Counter('churn_api_email_streams_total', "Streamed emails, by how the stream ended.", ['outcome'])
+EMAIL_FALLBACKS = Counter('churn_api_email_fallbacks_total', "Emails rendered from a local template instead of the LLM.",
+                          ['reason'])
+COALESCED = Counter('churn_api_coalesced_requests_total',
+                    "/predict requests answered with another request's result.", ['mode'])
+EMAIL_CACHE = Counter('churn_api_email_cache_total', "Generated-email cache lookups.", ['result'])
+
+# Requests slower than this always carry a stage breakdown in their log entry...
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_MS", "500")) / 1000.0
+# ...and this fraction of all requests does too
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+
+# `Histogram.labels()` hashes and validates the label values on every call; the label
+# combinations are few, so the children are looked up once and kept here.
+_children = {}
+
+
+def _child(histogram, *label_values):
+    key = (histogram, label_values)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = histogram.labels(*label_values)
+    return child
+
+
+class StageTimer:
+    """
+    Laps of one request. Call `lap(stage)` at the end of each stage; the time since the
+    previous lap (or since the timer was created) is added to that stage.
+    """
+
+    __slots__ = ('started', 'stages', '_last')
+
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+        self.stages = {}
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def total(self):
+        return self._last - self.started
+
+    def observe(self, group, action, run_id):
+        """Records every stage and the total into the histograms."""
+        for stage, seconds in self.stages.items():
+            _child(STAGE_SECONDS, stage, group, action, run_id).observe(seconds)
+        _child(REQUEST_SECONDS, group, action, run_id).observe(self.total())
+
+    def profile(self):
+        """A stage breakdown for the log entry if this request is slow or sampled, else None."""
+        total = self.total()
+        if total < SLOW_REQUEST_SECONDS and random.random() >= PROFILE_SAMPLE_RATE:
+            return None
+        return {
+            "request_id": uuid.uuid4().hex,
+            "slow": total >= SLOW_REQUEST_SECONDS,
+            "total_ms": round(total * 1000.0, 3),
+            "stages_ms": {stage: round(seconds * 1000.0, 3) for stage, seconds in self.stages.items()},
+        }
+
+
+def render():
+    """Returns (body, content type) for the /metrics endpoint."""
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=multiproc_dir)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,178 @@
+# engine/model_cache.py
+
+# A local, versioned copy of the served model for fast cold starts.
+# Resolving the registry and loading through mlflow is the slowest part of starting a
+# replica, followed by importing sklearn to unpickle the pipeline. After a model has been
+# loaded once, its model.pkl, MLmodel and serving example are copied into
+# <cache_dir>/<run_id>-<version>/ together with the compiled engine's parameters
+# (compiled.npz) and a manifest: source URI, registry version, run_id, the sha256 of
+# every file and the expected probabilities for the serving example. A `current` pointer
+# names the entry to start from. A fast start loads compiled.npz directly (no mlflow, no
+# sklearn, no pickle) after checking the hashes and reproducing the expected outputs.
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from engine.fast_inference import CompiledChurnModel, ParityError, warm_up
+
+CACHED_FILES = ('model.pkl', 'MLmodel', 'serving_input_example.json')
+COMPILED_FILE = 'compiled.npz'
+MANIFEST = 'manifest.json'
+POINTER = 'current'
+
+# The two fields of mlflow's ModelMetadata that the serving code reads
+CachedModelMetadata = namedtuple('CachedModelMetadata', ['run_id', 'saved_input_example_info'])
+
+
+class ModelCacheError(RuntimeError):
+    """The cache has no usable entry (missing, for another URI, or failed verification)."""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_example_columns(path):
+    """Reads serving_input_example.json as a mapping of column -> array, without pandas."""
+    with open(path) as f:
+        split = json.load(f)['dataframe_split']
+    return {column: np.asarray([row[i] for row in split['data']]) for i, column in enumerate(split['columns'])}
+
+
+class ModelCache:
+    """
+    Versioned on-disk model cache.
+
+    Args:
+        root (str): Cache directory; created on first store.
+        keep (int): Number of entries kept; older ones are removed after a store.
+    """
+
+    def __init__(self, root, keep=3):
+        self.root = root
+        self.keep = keep
+
+    def store(self, model_dir, model_uri, fingerprint, model):
+        """
+        Copies a loaded model into a new entry and points `current` at it.
+
+        Args:
+            model_dir (str): The local MLflow model directory that was just loaded.
+            model_uri (str): The configured URI (a cache entry is only used for the same URI).
+            fingerprint (str): Registry version (or local mtime) the model was resolved to.
+            model: The loaded model; a CompiledChurnModel is also stored in compiled form.
+        """
+        run_id = model.metadata.run_id
+        name = f"{run_id}-{fingerprint}"
+        entry = os.path.join(self.root, name)
+        if not os.path.exists(os.path.join(entry, MANIFEST)):
+            staging = os.path.join(self.root, f".{name}.{os.getpid()}.tmp")
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            for file_name in CACHED_FILES:
+                source = os.path.join(model_dir, file_name)
+                if os.path.exists(source):
+                    shutil.copyfile(source, os.path.join(staging, file_name))
+
+            expected = None
+            example_path = os.path.join(staging, 'serving_input_example.json')
+            if isinstance(model, CompiledChurnModel) and os.path.exists(example_path):
+                # The compiled model already passed its parity check against the pipeline
+                model.save(os.path.join(staging, COMPILED_FILE))
+                expected = model.predict(read_example_columns(example_path)).tolist()
+
+            files = {file_name: _sha256(os.path.join(staging, file_name)) for file_name in sorted(os.listdir(staging))}
+            manifest = {
+                "model_uri": model_uri,
+                "fingerprint": fingerprint,
+                "run_id": run_id,
+                "cached_at": time.time(),
+                "files": files,
+                "expected_probabilities": expected,
+            }
+            with open(os.path.join(staging, MANIFEST), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(staging, entry)
+
+        self._write_pointer(name)
+        self._prune(keep=name)
+
+    def _write_pointer(self, name):
+        # Written to a temp file and renamed, so readers never see a partial pointer
+        tmp = os.path.join(self.root, f".{POINTER}.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(self.root, POINTER))
+
+    def _prune(self, keep):
+        entries = []
+        for name in os.listdir(self.root):
+            manifest = os.path.join(self.root, name, MANIFEST)
+            if name != keep and os.path.exists(manifest):
+                entries.append((os.path.getmtime(manifest), name))
+        for _, name in sorted(entries, reverse=True)[self.keep - 1:]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def current(self):
+        """Returns (entry_dir, manifest) for the `current` entry, or None."""
+        try:
+            with open(os.path.join(self.root, POINTER)) as f:
+                entry = os.path.join(self.root, f.read().strip())
+            with open(os.path.join(entry, MANIFEST)) as f:
+                return entry, json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_current(self, model_uri, backend='native'):
+        """
+        Loads the `current` entry.
+
+        Args:
+            model_uri (str): The configured URI; an entry cached for another URI is not used.
+            backend (str): 'native' loads compiled.npz without mlflow or sklearn; 'pyfunc'
+                           loads the entry with mlflow.pyfunc (skips the registry, not the import).
+        Returns:
+            tuple: (model, manifest).
+        Raises:
+            ModelCacheError: If there is no entry for `model_uri` or it fails verification.
+        """
+        found = self.current()
+        if found is None:
+            raise ModelCacheError(f"No cached model in {self.root}.")
+        entry, manifest = found
+        if manifest.get("model_uri") != model_uri:
+            raise ModelCacheError(f"Cached model is for {manifest.get('model_uri')}, not {model_uri}.")
+        for file_name, expected_hash in manifest["files"].items():
+            path = os.path.join(entry, file_name)
+            if not os.path.exists(path) or _sha256(path) != expected_hash:
+                raise ModelCacheError(f"Cached {file_name} is missing or corrupt in {entry}.")
+
+        if backend == 'pyfunc':
+            import mlflow
+
+            return mlflow.pyfunc.load_model(entry), manifest
+
+        if COMPILED_FILE not in manifest["files"] or manifest.get("expected_probabilities") is None:
+            raise ModelCacheError("Cached entry has no verified compiled model.")
+        metadata = CachedModelMetadata(
+            run_id=manifest["run_id"],
+            saved_input_example_info={"serving_input_path": "serving_input_example.json"},
+        )
+        model = CompiledChurnModel.load(os.path.join(entry, COMPILED_FILE), metadata=metadata)
+        examples = read_example_columns(os.path.join(entry, 'serving_input_example.json'))
+        max_diff = float(np.max(np.abs(model.predict(examples) - np.asarray(manifest["expected_probabilities"]))))
+        if max_diff > 1e-9:
+            raise ParityError(f"Cached compiled model differs from the recorded outputs by {max_diff:.3g}.")
+        warm_up(model, examples)
+        return model, manifest
@@ -0,0 +1,201 @@
+# engine/model_registry.py
+
+# Zero-downtime model updates.
+# The served model used to be resolved once at startup, so promoting a new version in
+# the MLflow registry needed a restart. The watcher below polls the registry (and can be
+# triggered on demand), loads and warms up a new version on its own thread, and only
+# then hands it to the app, which swaps a single global reference. Requests that already
+# captured the old model finish on it.
+
+import os
+import threading
+import time
+from collections import deque
+
+from engine.fast_inference import download_model, load_model_dir
+
+
+def parse_registry_uri(model_uri):
+    """
+    Splits "models:/<name>/<stage|version|@alias>" into (name, reference).
+
+    Returns None for URIs that do not point at the model registry (local paths, runs:/ ...).
+    """
+    if not model_uri.startswith("models:/"):
+        return None
+    name, _, reference = model_uri[len("models:/"):].partition("/")
+    if not name or not reference:
+        return None
+    return name, reference
+
+
+class ModelWatcher:
+    """
+    Keeps the served churn model in sync with the model registry.
+
+    Args:
+        model_uri (str): e.g. "models:/churn-predictor/Production". A fixed version never
+                         changes; a stage or alias is re-resolved on every check. For a
+                         local model directory the MLmodel file's mtime is watched instead.
+        on_swap: Called with the new model once it is loaded and warmed up.
+        backend (str): Inference backend passed to `load_model_dir`.
+        poll_seconds (float): Polling interval; 0 disables the background poller.
+        cache (ModelCache): Optional local model cache. Every loaded model is stored in
+                            it, and `load(prefer_cache=True)` starts from it.
+    """
+
+    def __init__(self, model_uri, on_swap, backend='native', poll_seconds=60.0, cache=None):
+        self.model_uri = model_uri
+        self.backend = backend
+        self.poll_seconds = poll_seconds
+        self.cache = cache
+        self._on_swap = on_swap
+        self._check_lock = threading.Lock()  # One load at a time (poller vs. admin endpoint)
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.current_fingerprint = None
+        self.current_run_id = None
+        self.last_load_seconds = None
+        self.last_checked_at = None
+        self.last_error = None
+        self.loaded_from_cache = False
+        self.swaps = deque(maxlen=20)  # Most recent swap events, oldest first
+
+    def resolve(self):
+        """
+        Finds what the configured URI currently points to.
+
+        Returns:
+            tuple: (fingerprint, load_uri). The fingerprint changes whenever a different
+                   model should be served; load_uri pins that exact model.
+        """
+        registry_ref = parse_registry_uri(self.model_uri)
+        if registry_ref is None:
+            mlmodel = os.path.join(self.model_uri, "MLmodel")
+            fingerprint = os.stat(mlmodel).st_mtime_ns if os.path.exists(mlmodel) else self.model_uri
+            return str(fingerprint), self.model_uri
+
+        name, reference = registry_ref
+        if reference.isdigit():
+            return reference, self.model_uri
+
+        from mlflow.tracking import MlflowClient
+
+        client = MlflowClient()
+        if reference.startswith("@"):
+            version = client.get_model_version_by_alias(name, reference[1:]).version
+        else:
+            versions = client.get_latest_versions(name, stages=[reference])
+            if not versions:
+                raise LookupError(f"No version of model '{name}' is in stage '{reference}'.")
+            version = max(versions, key=lambda v: int(v.version)).version
+        return str(version), f"models:/{name}/{version}"
+
+    def load(self, prefer_cache=False):
+        """
+        Loads whatever the URI points to now and installs it. Raises on failure.
+
+        With `prefer_cache` the local cache entry for this URI is used when it verifies,
+        skipping the registry; `start()` then checks the registry in the background.
+        """
+        with self._check_lock:
+            if prefer_cache and self.cache is not None:
+                try:
+                    start = time.perf_counter()
+                    model, manifest = self.cache.load_current(self.model_uri, backend=self.backend)
+                    self._swap(model, manifest["fingerprint"], f"cache:{manifest['run_id']}", time.perf_counter() - start)
+                    self.loaded_from_cache = True
+                    return
+                except Exception as e:
+                    print(f"Model cache not used: {e}")
+            fingerprint, load_uri = self.resolve()
+            self._load_and_swap(fingerprint, load_uri)
+
+    def check(self):
+        """
+        Loads and swaps in a new model if the registry points somewhere else.
+
+        Returns:
+            bool: True if a new model was installed.
+        """
+        with self._check_lock:
+            self.last_checked_at = time.time()
+            try:
+                fingerprint, load_uri = self.resolve()
+                if fingerprint == self.current_fingerprint:
+                    self.last_error = None
+                    return False
+                self._load_and_swap(fingerprint, load_uri)
+                self.last_error = None
+                return True
+            except Exception as e:
+                # Keep serving the current model
+                self.last_error = str(e)
+                print(f"Model refresh failed, keeping run_id={self.current_run_id}: {e}")
+                return False
+
+    def _load_and_swap(self, fingerprint, load_uri):
+        start = time.perf_counter()
+        model_dir = download_model(load_uri)
+        model = load_model_dir(model_dir, backend=self.backend, warmup=True)
+        self._swap(model, fingerprint, load_uri, time.perf_counter() - start)
+        self.loaded_from_cache = False
+        if self.cache is not None:
+            try:
+                self.cache.store(model_dir, self.model_uri, fingerprint, model)
+            except Exception as e:
+                print(f"Could not cache model locally: {e}")
+
+    def _swap(self, model, fingerprint, load_uri, load_seconds):
+        previous_run_id = self.current_run_id
+        self._on_swap(model)
+        self.current_fingerprint = fingerprint
+        self.current_run_id = model.metadata.run_id
+        self.last_load_seconds = load_seconds
+        self.swaps.append({
+            "swapped_at": time.time(),
+            "model_uri": load_uri,
+            "from_run_id": previous_run_id,
+            "to_run_id": self.current_run_id,
+            "load_seconds": round(load_seconds, 4),
+        })
+        print(f"Model swapped in: {load_uri} (run_id={self.current_run_id}, loaded in {load_seconds:.2f}s).")
+
+    # --- Background poller ---
+    def start(self):
+        # A model started from the cache is checked against the registry right away
+        if (self.poll_seconds <= 0 and not self.loaded_from_cache) or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _poll(self):
+        if self.loaded_from_cache:
+            self.check()
+        if self.poll_seconds <= 0:
+            return
+        while not self._stop.wait(self.poll_seconds):
+            self.check()
+
+    def status(self):
+        return {
+            "model_uri": self.model_uri,
+            "backend": self.backend,
+            "run_id": self.current_run_id,
+            "fingerprint": self.current_fingerprint,
+            "loaded_from_cache": self.loaded_from_cache,
+            "last_load_seconds": round(self.last_load_seconds, 4) if self.last_load_seconds is not None else None,
+            "poll_seconds": self.poll_seconds,
+            "polling": self._thread is not None and self._thread.is_alive(),
+            "last_checked_at": self.last_checked_at,
+            "last_error": self.last_error,
+            "swaps": list(self.swaps),
+        }
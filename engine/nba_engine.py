@@ -1,24 +1,111 @@
 # engine/nba_engine.py
 
-# This dictionary holds the "learned" rules from our analysis.
-# In a real system, this could be loaded from a config file or a database.
-NBA_RULES = {
-    'Struggling User': 'Proactive Support Call',
-    'New and Inactive': 'Send Educational Content',
-    'High-Value, Low-Engagement': '20% Discount Offer',
-    'General At-Risk': '20% Discount Offer' # From our analysis, discount was best for the general group
+import json
+import operator
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+# The "learned" rules from our analysis live in a config file (JSON, or YAML if PyYAML
+# is installed): an ordered list of segments, each with AND-ed predicates, plus the
+# segment -> action map. The first matching segment wins, like an if/elif chain.
+# From our analysis, discount was best for the general at-risk group.
+RULES_PATH = os.getenv("NBA_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nba_rules.json'))
+
+# Comparison operators allowed in predicates; they work on scalars and NumPy arrays alike
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
 }
 
+
+class RuleSet:
+    """
+    Compiled Next-Best-Action rules.
+
+    Args:
+        config (dict): Parsed rules config with keys 'segments' (ordered list of
+                       {'name', 'when': [[feature, op, value], ...]}), 'default_segment',
+                       'actions' (segment -> action), and optionally 'default_action'
+                       and 'missing_value' (used for features a customer lacks).
+    """
+
+    def __init__(self, config):
+        self.missing_value = config.get('missing_value', 0)
+        self.default_segment = config['default_segment']
+        self.default_action = config.get('default_action', 'No Action')
+        self.actions = dict(config['actions'])
+
+        self.segments = []  # (name, [(feature, op, value), ...])
+        for segment in config['segments']:
+            predicates = []
+            for feature, op, value in segment['when']:
+                if op not in OPERATORS:
+                    raise ValueError(f"Unknown operator '{op}' in segment '{segment['name']}'.")
+                predicates.append((feature, OPERATORS[op], value))
+            self.segments.append((segment['name'], predicates))
+
+        # Lookup arrays for the vectorized path: segment code -> name / action
+        names = [name for name, _ in self.segments] + [self.default_segment]
+        self.segment_names = np.asarray(names, dtype=object)
+        self.segment_actions = np.asarray([self.actions.get(name, self.default_action) for name in names], dtype=object)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            if path.endswith(('.yaml', '.yml')):
+                import yaml
+
+                return cls(yaml.safe_load(f))
+            return cls(json.load(f))
+
+    # --- Scalar path: one customer (dict or CustomerRow) ---
+    def segment(self, customer_data):
+        get = customer_data.get
+        missing = self.missing_value
+        for name, predicates in self.segments:
+            for feature, op, value in predicates:
+                if not op(get(feature, missing), value):
+                    break
+            else:
+                return name
+        return self.default_segment
+
+    # --- Vectorized path: whole columns ---
+    def segment_codes(self, columns, n_rows):
+        """
+        Evaluates every segment over whole columns with first-match-wins semantics.
+
+        Args:
+            columns: A DataFrame or a mapping of column name -> array.
+            n_rows (int): Number of rows (used when a feature column is missing).
+        Returns:
+            np.ndarray: Index into `segment_names` for every row.
+        """
+        conditions = []
+        for _, predicates in self.segments:
+            condition = np.ones(n_rows, dtype=bool)
+            for feature, op, value in predicates:
+                values = np.asarray(columns[feature]) if feature in columns else self.missing_value
+                condition &= op(values, value)
+            conditions.append(condition)
+        return np.select(conditions, np.arange(len(conditions)), default=len(conditions))
+
+
+rules = RuleSet.from_file(RULES_PATH)
+
+# Segment -> action map, kept under its original name
+NBA_RULES = rules.actions
+
+
 def get_customer_segment(customer_data):
     """Assigns a customer to a pre-defined segment."""
-    if customer_data.get('SupportTickets', 0) > 4:
-        return 'Struggling User'
-    elif customer_data.get('Tenure', 0) < 12 and customer_data.get('UsageFrequency', 0) < 20:
-        return 'New and Inactive'
-    elif customer_data.get('MonthlyRevenue', 0) > 75 and customer_data.get('UsageFrequency', 0) < 40:
-        return 'High-Value, Low-Engagement'
-    else:
-        return 'General At-Risk'
+    return rules.segment(customer_data)
 
 
 def recommend_action(customer_data):
@@ -36,4 +123,18 @@ def recommend_action(customer_data):
     segment = get_customer_segment(customer_data)
 
     # 2. Return the best action for that segment
-    return NBA_RULES.get(segment, "No Action")
\ No newline at end of file
+    return NBA_RULES.get(segment, rules.default_action)
+
+
+def recommend_actions(columns):
+    """
+    Segments many customers at once and recommends an action for each.
+
+    Args:
+        columns: A DataFrame or a mapping of column name -> array (e.g. CustomerStore.take()).
+    Returns:
+        tuple: (segments, actions), two object arrays with one entry per row.
+    """
+    n_rows = len(next(iter(columns.values()))) if isinstance(columns, Mapping) else len(columns)
+    codes = rules.segment_codes(columns, n_rows)
+    return rules.segment_names[codes], rules.segment_actions[codes]
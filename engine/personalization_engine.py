@@ -1,3 +1,12 @@
+import asyncio
+import string
+import time
+import zlib
+from collections import ChainMap
+
+from engine import metrics
+from engine.llm_client import AsyncLLMClient
+
 # Cell 3: Define Mistral-formatted Prompt Templates
 
 PROMPT_TEMPLATES = {
@@ -63,43 +72,372 @@ PROMPT_TEMPLATES = {
     """
 }
 
+# Generation settings shared by every email
+GENERATION_PARAMETERS = {
+    "max_new_tokens": 250,  # Max length of the generated email
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "repetition_penalty": 1.1,
+}
+
+def build_prompt(customer_data, action):
+    """
+    Renders the prompt template for an action.
+
+    Args:
+        customer_data (Mapping): The customer's info (a dict or a CustomerRow view).
+        action (str): The next-best-action to take.
+
+    Returns:
+        str: The rendered prompt, or None if there is no template for the action.
+    """
+    if action not in PROMPT_TEMPLATES:
+        return None
+
+    # Add a fake name for the example (without modifying the caller's data)
+    if 'Name' not in customer_data:
+        customer_data = ChainMap({'Name': placeholder_name(customer_data, action)}, customer_data)
+
+    return PROMPT_TEMPLATES[action].format_map(customer_data)
+
+# Customer fields each prompt renders (besides the name)
+TEMPLATE_FIELDS = {
+    action: sorted({field for _, field, _, _ in string.Formatter().parse(template) if field and field != 'Name'})
+    for action, template in PROMPT_TEMPLATES.items()
+}
+
+def placeholder_name(customer_data, action):
+    """
+    Picks a fake first name that is stable for a customer, so repeat requests render the
+    same prompt (and can be served from the generation cache). It is seeded from the
+    CustomerID when the data has one, else from the fields the action's prompt renders:
+    an update to any other field leaves the prompt, and its cache entry, unchanged.
+    """
+    if 'CustomerID' in customer_data:
+        profile = f"CustomerID={customer_data['CustomerID']}"
+    else:
+        profile = "|".join(f"{field}={customer_data[field]}" for field in TEMPLATE_FIELDS[action])
+    fake = _faker()
+    fake.seed_instance(zlib.crc32(profile.encode('utf-8')))
+    return fake.first_name()
+
+class NoTemplateError(ValueError):
+    """There is no prompt template for the requested action."""
+
 # Cell 4: Create the Email Generation Function (using Hugging Face)
-def generate_personalized_email(customer_data, action):
+async def generate_email(customer_data, action, client, cache=None):
     """
     Generates a personalized email using the Hugging Face Inference API.
 
     Args:
-        customer_data (dict): A dictionary with the customer's info.
+        customer_data (Mapping): The customer's info (a dict or a CustomerRow view).
         action (str): The next-best-action to take.
+        client (AsyncLLMClient): The shared, connection-pooled LLM client.
+        cache (GenerationCache): Optional cache keyed by the rendered prompt and parameters.
 
     Returns:
-        str: The generated email content, or an error message.
+        str: The generated email content.
+    Raises:
+        NoTemplateError: If the action has no prompt template.
+        LLMError: If the LLM call failed.
     """
-    if action not in PROMPT_TEMPLATES:
-        return "Error: No prompt template found for the given action."
+    prompt = _prompt_or_raise(customer_data, action)
+    cache_key, cached = await _cache_lookup(prompt, client, cache)
+    if cached is not None:
+        return cached
+    return await _call_llm(prompt, action, client, cache, cache_key)
 
-    # Add a fake name for the example
+def _prompt_or_raise(customer_data, action):
+    prompt = build_prompt(customer_data, action)
+    if prompt is None:
+        raise NoTemplateError("No prompt template found for the given action.")
+    return prompt
+
+async def _cache_lookup(prompt, client, cache):
+    """Returns (cache key, cached email or None); the key is None without a cache."""
+    if cache is None:
+        return None, None
+    cache_key = cache.make_key(prompt, {"model": client.api_url, **GENERATION_PARAMETERS})
+    # Only a disk-tier lookup leaves the event loop
+    cached = await cache.lookup(cache_key)
+    metrics.EMAIL_CACHE.labels('hit' if cached is not None else 'miss').inc()
+    return cache_key, cached
+
+async def _call_llm(prompt, action, client, cache, cache_key):
+    print(f"--- Calling Hugging Face Inference API for action: {action} ---")
+    # Note: The first time you run this for a model, it might take longer as the model loads on the server.
+    started = time.perf_counter()
+    try:
+        response = await client.text_generation(prompt, **GENERATION_PARAMETERS)
+    except asyncio.CancelledError:
+        # Given up on (e.g. past its deadline): neither a success nor an LLM error
+        metrics.LLM_SECONDS.labels('cancelled').observe(time.perf_counter() - started)
+        raise
+    except Exception:
+        metrics.LLM_SECONDS.labels('error').observe(time.perf_counter() - started)
+        metrics.LLM_ERRORS.inc()
+        raise
+    metrics.LLM_SECONDS.labels('ok').observe(time.perf_counter() - started)
+    email = response.strip()
+    # Only successful generations reach the cache
+    if cache_key is not None:
+        cache.put(cache_key, email)
+    return email
+
+# Where an email came from, as reported in the response and the log entry
+SOURCE_LLM = 'llm'
+SOURCE_CACHE = 'cache'
+SOURCE_FALLBACK = 'fallback'
+
+# Local emails for when the LLM can't answer in time: one per PROMPT_TEMPLATES action,
+# following the same instructions, filled in from the same customer fields
+FALLBACK_TEMPLATES = {
+    "Proactive Support Call": (
+        "Hi {Name},\n\n"
+        "Thank you for being a valued ConnectSphere {SubscriptionTier} customer. I noticed you've been in touch "
+        "with our support team recently ({SupportTickets} tickets), and I wanted to reach out personally.\n\n"
+        "Would a 15-minute call help? We can go through what you're working towards and make sure the product "
+        "is doing its part. There's no pressure at all; just reply with a time that suits you.\n\n"
+        "Warm regards,\nYour ConnectSphere Customer Success team"
+    ),
+    "20% Discount Offer": (
+        "Hi {Name},\n\n"
+        "Thank you for being with ConnectSphere for {Tenure} months. As a token of our appreciation, we'd like "
+        "to offer you 20% off your {SubscriptionTier} plan for the next 3 months.\n\n"
+        "Your plan keeps getting better, with recent updates that make everyday work on {SubscriptionTier} "
+        "faster and simpler. To claim your discount, visit connectsphere.example.com/thank-you before the end "
+        "of the month.\n\n"
+        "With thanks,\nThe ConnectSphere team"
+    ),
+    "Send Educational Content": (
+        "Hi {Name},\n\n"
+        "Welcome again to the ConnectSphere {SubscriptionTier} plan! Getting started with a new tool can be "
+        "overwhelming, so we've put together a short video guide to one of the features our customers find "
+        "most useful: connectsphere.example.com/guides/getting-started.\n\n"
+        "It takes five minutes and can save you hours every week. Explore at your own pace, and reply to this "
+        "email if anything is unclear; we're happy to help.\n\n"
+        "Cheers,\nThe ConnectSphere Product team"
+    ),
+}
+
+def render_fallback_email(customer_data, action):
+    """
+    Renders the local fallback email for an action. Deterministic: the same customer and
+    action always get the same text, with the same placeholder name as the LLM prompt.
+
+    Raises:
+        NoTemplateError: If the action has no prompt template.
+    """
+    if action not in FALLBACK_TEMPLATES:
+        raise NoTemplateError("No prompt template found for the given action.")
     if 'Name' not in customer_data:
-        customer_data['Name'] = fake.first_name()
+        customer_data = ChainMap({'Name': placeholder_name(customer_data, action)}, customer_data)
+    return FALLBACK_TEMPLATES[action].format_map(customer_data)
+
+async def generate_email_within(customer_data, action, client, deadline, cache=None, breaker=None,
+                                count_timeouts=True):
+    """
+    Generates an email, falling back to `render_fallback_email` if the LLM hasn't answered
+    within `deadline` seconds, fails, or is skipped because the circuit breaker is open.
+    A call past its deadline is cancelled. Upstream errors count as breaker failures;
+    timeouts only with `count_timeouts`, so a caller who shortened its own deadline can't
+    open the circuit for everyone.
+
+    Args:
+        customer_data (Mapping): The customer's info (a dict or a CustomerRow view).
+        action (str): The next-best-action to take.
+        client (AsyncLLMClient): The shared, connection-pooled LLM client.
+        deadline (float): Seconds the LLM may take; <= 0 goes straight to the fallback.
+        cache (GenerationCache): Optional cache keyed by the rendered prompt and parameters.
+        breaker (CircuitBreaker): Optional circuit breaker around the LLM.
+        count_timeouts (bool): Whether a timeout counts as a breaker failure (pass False
+                               when `deadline` is shorter than the server's own budget).
+
+    Returns:
+        tuple: (email, source, fallback reason): source is SOURCE_LLM, SOURCE_CACHE or
+               SOURCE_FALLBACK, and the reason ('deadline', 'circuit_open' or 'llm_error')
+               is None unless the fallback was used.
+    Raises:
+        NoTemplateError: If the action has no prompt template.
+    """
+    prompt = _prompt_or_raise(customer_data, action)
+    cache_key, cached = await _cache_lookup(prompt, client, cache)
+    if cached is not None:
+        return cached, SOURCE_CACHE, None
+    if deadline <= 0:
+        reason = 'deadline'
+    elif breaker is not None and not breaker.allow():
+        reason = 'circuit_open'
+    else:
+        try:
+            email = await asyncio.wait_for(_call_llm(prompt, action, client, cache, cache_key), deadline)
+        except asyncio.TimeoutError:
+            reason = 'deadline'
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release()
+            raise
+        except Exception as e:
+            print(f"LLM call failed, using the fallback email: {e!r}")
+            reason = 'llm_error'
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return email, SOURCE_LLM, None
+        if breaker is not None:
+            if reason == 'deadline' and not count_timeouts:
+                # A deadline the caller shortened says nothing about the upstream's health
+                breaker.release()
+            else:
+                breaker.record_failure()
+    metrics.EMAIL_FALLBACKS.labels(reason).inc()
+    return render_fallback_email(customer_data, action), SOURCE_FALLBACK, reason
+
+async def stream_email(customer_data, action, client, cache=None):
+    """
+    Streaming version of `generate_email`: yields the email as the LLM produces it. The
+    complete email is cached once the stream ends; a cached email is yielded in one piece.
 
-    prompt = PROMPT_TEMPLATES[action].format(**customer_data)
+    Args:
+        customer_data (Mapping): The customer's info (a dict or a CustomerRow view).
+        action (str): The next-best-action to take.
+        client (AsyncLLMClient): The shared, connection-pooled LLM client.
+        cache (GenerationCache): Optional cache keyed by the rendered prompt and parameters.
+
+    Yields:
+        str: Consecutive pieces of the email.
+    Raises:
+        NoTemplateError: If the action has no prompt template.
+        LLMError: If the LLM call failed.
+    """
+    prompt = _prompt_or_raise(customer_data, action)
+    # Same key as `generate_email`, so both paths share cached emails
+    cache_key, cached = await _cache_lookup(prompt, client, cache)
+    if cached is not None:
+        yield cached
+        return
+    async for text in _stream_llm(prompt, action, client, cache, cache_key):
+        yield text
 
+async def _stream_llm(prompt, action, client, cache, cache_key):
+    print(f"--- Streaming from Hugging Face Inference API for action: {action} ---")
+    started = time.perf_counter()
+    pieces = []
     try:
-        print(f"--- Calling Hugging Face Inference API for action: {action} ---")
-        # Use the client to generate text
-        # Note: The first time you run this for a model, it might take longer as the model loads on the server.
-        response = client.text_generation(
-            prompt,
-            max_new_tokens=250,  # Max length of the generated email
-            temperature=0.7,
-            top_p=0.95,
-            repetition_penalty=1.1,
-        )
-        return response.strip()
+        async for text in client.stream_generation(prompt, **GENERATION_PARAMETERS):
+            if not pieces:
+                # Leading whitespace is dropped, as `generate_email` strips it
+                text = text.lstrip()
+                if not text:
+                    continue
+                metrics.LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+            pieces.append(text)
+            yield text
+    except Exception:
+        metrics.LLM_SECONDS.labels('error').observe(time.perf_counter() - started)
+        metrics.LLM_ERRORS.inc()
+        raise
+    # Not reached when the consumer stops early: a partial email is never cached
+    metrics.LLM_SECONDS.labels('ok').observe(time.perf_counter() - started)
+    if cache_key is not None:
+        cache.put(cache_key, "".join(pieces).strip())
 
+async def stream_email_within(customer_data, action, client, deadline, cache=None, breaker=None,
+                              count_timeouts=True):
+    """
+    Streaming version of `generate_email_within`: here the deadline bounds the wait for
+    the first token. Once tokens have gone out the email can no longer be swapped for
+    the fallback, so a failure after that raises.
+
+    Yields:
+        tuple: (text, source, fallback reason) for each consecutive piece of the email;
+               source and reason are as in `generate_email_within`.
+    Raises:
+        NoTemplateError: If the action has no prompt template.
+        LLMError: If the LLM failed after the first token.
+    """
+    prompt = _prompt_or_raise(customer_data, action)
+    cache_key, cached = await _cache_lookup(prompt, client, cache)
+    if cached is not None:
+        yield cached, SOURCE_CACHE, None
+        return
+    if deadline <= 0:
+        reason = 'deadline'
+    elif breaker is not None and not breaker.allow():
+        reason = 'circuit_open'
+    else:
+        tokens = _stream_llm(prompt, action, client, cache, cache_key)
+        try:
+            # Timing out cancels the pending read inside the generator, which ends it and
+            # closes the upstream connection
+            first = await asyncio.wait_for(anext(tokens), deadline)
+        except asyncio.TimeoutError:
+            reason = 'deadline'
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release()
+            raise
+        except StopAsyncIteration:  # An empty completion
+            if breaker is not None:
+                breaker.record_success()
+            yield "", SOURCE_LLM, None
+            return
+        except Exception as e:
+            print(f"LLM stream failed, using the fallback email: {e!r}")
+            reason = 'llm_error'
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            yield first, SOURCE_LLM, None
+            try:
+                async for text in tokens:
+                    yield text, SOURCE_LLM, None
+            except Exception:
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            return
+        if breaker is not None:
+            if reason == 'deadline' and not count_timeouts:
+                # A deadline the caller shortened says nothing about the upstream's health
+                breaker.release()
+            else:
+                breaker.record_failure()
+    metrics.EMAIL_FALLBACKS.labels(reason).inc()
+    yield render_fallback_email(customer_data, action), SOURCE_FALLBACK, reason
+
+async def generate_personalized_email_async(customer_data, action, client, cache=None):
+    """
+    Same as `generate_email`, but returns an error message instead of raising.
+
+    Returns:
+        str: The generated email content, or an error message.
+    """
+    try:
+        return await generate_email(customer_data, action, client, cache=cache)
+    except NoTemplateError as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"An error occurred with the Hugging Face API: {e}"
 
-# We need a fake name generator for this example
-from faker import Faker
-fake = Faker()
\ No newline at end of file
+def generate_personalized_email(customer_data, action):
+    """
+    Blocking version of `generate_personalized_email_async` for notebooks and scripts.
+    It opens a short-lived client configured from the environment (HF_TOKEN, HF_API_URL).
+    """
+    async def _generate():
+        async with AsyncLLMClient.from_env() as client:
+            return await generate_personalized_email_async(customer_data, action, client)
+
+    return asyncio.run(_generate())
+
+# We need a fake name generator for this example.
+# Faker is slow to import and build, so it is created on first use instead of at import time.
+_fake = None
+
+def _faker():
+    global _fake
+    if _fake is None:
+        from faker import Faker
+        _fake = Faker()
+    return _fake
\ No newline at end of file
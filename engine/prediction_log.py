@@ -0,0 +1,255 @@
+# engine/prediction_log.py
+
+# Non-blocking prediction logging.
+# The request path only puts the log record on a bounded in-memory queue. A background
+# thread serializes records to real JSON lines, writes them in batches (on a size or
+# time threshold), rotates the file by size and/or hour, and can additionally write
+# compact Parquet files for analytics. If the queue is full the record is dropped and
+# counted, so logging can never block or grow memory without bound.
+#
+# Parquet files all share one explicit schema (`parquet_schema`): the optional parts of a
+# record (email, experiments, profile) are nullable columns, so a file has them even when
+# its first record doesn't, and every file can be read as one dataset.
+
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from engine.feature_store import CATEGORICAL_COLUMNS, NUMERIC_DTYPES
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+_STOP = object()
+
+
+def _json_default(value):
+    # NumPy scalars (e.g. values read from the customer store)
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_line(record):
+    """Serializes one record as a JSON line (bytes, newline-terminated)."""
+    if orjson is not None:
+        return orjson.dumps(record, default=_json_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, default=_json_default) + "\n").encode('utf-8')
+
+
+def parquet_schema():
+    """The Arrow schema of a prediction log record (see main.log_prediction); every column is nullable."""
+    import pyarrow as pa
+
+    features = [(name, pa.float64() if np.issubdtype(dtype, np.floating) else pa.int64())
+                for name, dtype in NUMERIC_DTYPES.items()]
+    features += [(name, pa.string()) for name in CATEGORICAL_COLUMNS]
+    return pa.schema([
+        ("timestamp", pa.int64()),
+        ("model_version", pa.string()),
+        ("customer_id", pa.string()),
+        ("features", pa.struct(features)),
+        ("prediction", pa.struct([("churn_probability", pa.float64())])),
+        ("experiment", pa.struct([("group", pa.string()), ("action_taken", pa.string())])),
+        ("ground_truth_churn", pa.int8()),
+        # Optional keys
+        ("email", pa.struct([("source", pa.string()), ("fallback_reason", pa.string())])),
+        ("experiments", pa.map_(pa.string(), pa.string())),
+        ("profile", pa.struct([
+            ("request_id", pa.string()),
+            ("slow", pa.bool_()),
+            ("total_ms", pa.float64()),
+            ("stages_ms", pa.map_(pa.string(), pa.float64())),
+        ])),
+    ])
+
+
+class PredictionLogWriter:
+    """
+    Background, batched writer for prediction records.
+
+    Args:
+        path (str): The active JSONL file. Rotated files get a timestamp suffix.
+        max_queue (int): Most records waiting to be written; more are dropped and counted.
+        batch_size (int): Write as soon as this many records are waiting...
+        flush_interval (float): ...or when this many seconds have passed.
+        max_bytes (int): Rotate when the active file would grow past this size (0 = never).
+        rotate_hourly (bool): Also rotate when the hour changes.
+        parquet_dir (str): If set, records are also written there as Parquet files.
+        parquet_rows (int): Rows buffered per Parquet file.
+    """
+
+    def __init__(self, path='/tmp/prediction_logs.jsonl', max_queue=100_000, batch_size=1000,
+                 flush_interval=1.0, max_bytes=100 * 1024 * 1024, rotate_hourly=False,
+                 parquet_dir=None, parquet_rows=50_000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_hourly = rotate_hourly
+        self.parquet_dir = parquet_dir
+        self.parquet_rows = parquet_rows
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._file = None
+        self._file_hour = None
+        self._parquet_buffer = []
+        self._parquet_schema = None
+        # Callables given every written batch, on the writer thread (e.g. the ground-truth store)
+        self.sinks = []
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.rotations = 0
+        self.parquet_files = 0
+        self.write_errors = 0
+        self.sink_errors = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv("PREDICTION_LOG_PATH", "/tmp/prediction_logs.jsonl"),
+            max_queue=int(os.getenv("PREDICTION_LOG_QUEUE_SIZE", "100000")),
+            batch_size=int(os.getenv("PREDICTION_LOG_BATCH_SIZE", "1000")),
+            flush_interval=float(os.getenv("PREDICTION_LOG_FLUSH_SECONDS", "1.0")),
+            max_bytes=int(os.getenv("PREDICTION_LOG_MAX_BYTES", str(100 * 1024 * 1024))),
+            rotate_hourly=os.getenv("PREDICTION_LOG_ROTATE_HOURLY", "false").lower() in ("1", "true", "yes"),
+            parquet_dir=os.getenv("PREDICTION_LOG_PARQUET_DIR") or None,
+        )
+
+    # --- Request path ---
+    def log(self, record):
+        """Enqueues a record without blocking. Returns False if it had to be dropped."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='prediction-log-writer', daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=10.0):
+        """Writes everything still queued, then stops the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # --- Writer thread ---
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                self._flush(batch)
+                self._flush_parquet()
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+            if record is not None:
+                batch.append(record)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            data = b"".join(dumps_line(record) for record in batch)
+            self._maybe_rotate(len(data))
+            self._file.write(data)
+            self._file.flush()
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.write_errors += 1
+            print(f"Prediction log write failed ({len(batch)} records lost): {e}")
+
+        if self.parquet_dir:
+            self._parquet_buffer.extend(batch)
+            if len(self._parquet_buffer) >= self.parquet_rows:
+                self._flush_parquet()
+
+        for sink in self.sinks:
+            try:
+                sink(batch)
+            except Exception as e:
+                self.sink_errors += 1
+                print(f"Prediction log sink {getattr(sink, '__qualname__', sink)!r} failed: {e!r}")
+
+    def _maybe_rotate(self, incoming_bytes):
+        hour = time.strftime('%Y%m%d%H')
+        if self._file is not None:
+            too_big = self.max_bytes and self._file.tell() + incoming_bytes > self.max_bytes and self._file.tell() > 0
+            new_hour = self.rotate_hourly and hour != self._file_hour
+            if not (too_big or new_hour):
+                return
+            self._file.close()
+            rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}"
+            suffix = 1
+            while os.path.exists(rotated):
+                rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+                suffix += 1
+            os.replace(self.path, rotated)
+            self.rotations += 1
+        self._file = open(self.path, 'ab')
+        self._file_hour = hour
+
+    def _flush_parquet(self):
+        if not self._parquet_buffer:
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            os.makedirs(self.parquet_dir, exist_ok=True)
+            if self._parquet_schema is None:
+                self._parquet_schema = parquet_schema()
+            table = pa.Table.from_pylist(self._parquet_buffer, schema=self._parquet_schema)
+            name = f"predictions-{time.strftime('%Y%m%d-%H%M%S')}-{self.parquet_files:05d}.parquet"
+            pq.write_table(table, os.path.join(self.parquet_dir, name), compression='zstd')
+            self.parquet_files += 1
+        except Exception as e:
+            self.write_errors += 1
+            print(f"Parquet prediction log write failed: {e}")
+        self._parquet_buffer = []
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "rotations": self.rotations,
+            "parquet_files": self.parquet_files,
+            "write_errors": self.write_errors,
+            "sink_errors": self.sink_errors,
+        }
@@ -0,0 +1,138 @@
+# engine/score_table.py
+
+# Precomputed churn scores for the whole customer table.
+# The CRM data only changes when it is reloaded, so instead of running the full
+# preprocessing + GradientBoosting pipeline on every request we can score every
+# customer once, in large vectorized chunks, and serve requests from an array.
+# Rows added after a build (new customers, or new versions of upserted ones) are scored
+# on first use and kept in a small per-snapshot overlay, so an upsert never forces a
+# rebuild of the whole table.
+
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from engine.fast_inference import predict_columns
+
+# One immutable build result. Swapping a single reference keeps readers consistent:
+# they either see the old snapshot or the new one, never a mix of both.
+ScoreSnapshot = namedtuple('ScoreSnapshot', ['scores', 'run_id', 'data_version', 'built_at', 'build_seconds', 'extra'])
+
+
+class ScoreTable:
+    """
+    Churn probabilities for every customer row, aligned with the row order of the
+    customer table, so a request-time lookup is a single array read.
+
+    The table remembers the model `run_id` and the data version it was built from.
+    Lookups against a different model or data version miss, and the caller can
+    schedule a rebuild with `refresh_in_background`.
+    """
+
+    def __init__(self, chunk_size=50_000):
+        self.chunk_size = chunk_size
+        self._snapshot = None
+        self._build_lock = threading.Lock()
+        self._build_thread = None
+        self.last_error = None
+
+    def build(self, model, customer_data, data_version):
+        """
+        Scores every row of `customer_data` in chunks and publishes the result.
+
+        Args:
+            model: A loaded churn model exposing `predict` and `metadata.run_id`.
+            customer_data (CustomerStore): The columnar customer table.
+            data_version (int): Version of the customer table being scored.
+        """
+        run_id = model.metadata.run_id
+        start = time.perf_counter()
+        n_rows = customer_data.row_count  # Positional: superseded rows are scored too (compaction keeps them few)
+        scores = np.empty(n_rows, dtype=np.float64)
+        for begin in range(0, n_rows, self.chunk_size):
+            end = min(begin + self.chunk_size, n_rows)
+            scores[begin:end] = predict_columns(model, customer_data.take(slice(begin, end)))
+        scores.flags.writeable = False
+
+        self._snapshot = ScoreSnapshot(
+            scores=scores,
+            run_id=run_id,
+            data_version=data_version,
+            built_at=time.time(),
+            build_seconds=time.perf_counter() - start,
+            extra={},  # row position -> score, for rows appended after the build
+        )
+        print(f"Score table built: {n_rows} rows in {self._snapshot.build_seconds:.2f}s (run_id={run_id}).")
+
+    def refresh_in_background(self, model, customer_data, data_version):
+        """Starts a background rebuild unless one is already running."""
+        with self._build_lock:
+            if self._build_thread is not None and self._build_thread.is_alive():
+                return
+            self._build_thread = threading.Thread(
+                target=self._safe_build,
+                args=(model, customer_data, data_version),
+                name='score-table-build',
+                daemon=True,
+            )
+            self._build_thread.start()
+
+    def _safe_build(self, model, customer_data, data_version):
+        try:
+            self.build(model, customer_data, data_version)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Score table build failed: {e}")
+
+    def is_fresh(self, run_id, data_version):
+        snapshot = self._snapshot
+        return snapshot is not None and snapshot.run_id == run_id and snapshot.data_version == data_version
+
+    def lookup(self, positions, run_id, data_version):
+        """
+        Returns the precomputed scores for the given row positions, or None if the
+        table is missing or was built from a different model/data version.
+
+        Rows the table doesn't cover yet (appended after the build) are NaN; score
+        them and hand the result to `fill`.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.run_id != run_id or snapshot.data_version != data_version:
+            return None
+        positions = np.asarray(positions, dtype=np.intp)
+        covered = positions < len(snapshot.scores)
+        if covered.all():
+            return snapshot.scores[positions]
+        scores = np.full(len(positions), np.nan)
+        scores[covered] = snapshot.scores[positions[covered]]
+        extra = snapshot.extra
+        for i in np.flatnonzero(~covered):
+            scores[i] = extra.get(int(positions[i]), np.nan)
+        return scores
+
+    def fill(self, positions, scores, run_id, data_version):
+        """Remembers scores for rows appended after the build (ignored if the table is stale)."""
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.run_id != run_id or snapshot.data_version != data_version:
+            return
+        snapshot.extra.update(zip(np.asarray(positions).tolist(), np.asarray(scores).tolist()))
+
+    def status(self):
+        snapshot = self._snapshot
+        building = self._build_thread is not None and self._build_thread.is_alive()
+        if snapshot is None:
+            return {"ready": False, "building": building, "last_error": self.last_error}
+        return {
+            "ready": True,
+            "building": building,
+            "run_id": snapshot.run_id,
+            "data_version": snapshot.data_version,
+            "row_count": int(len(snapshot.scores)),
+            "appended_rows_scored": len(snapshot.extra),
+            "built_at": snapshot.built_at,
+            "build_seconds": round(snapshot.build_seconds, 4),
+            "last_error": self.last_error,
+        }
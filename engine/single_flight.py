@@ -0,0 +1,98 @@
+# engine/single_flight.py
+
+# Request coalescing ("single flight").
+# Concurrent calls with the same key share one computation: the first caller starts
+# it, later ones await the same result, and all of them get the same object back (or
+# the same exception). A result stays reusable for `reuse_seconds` after it completes,
+# so a burst of duplicates that arrives just after the first one finished is absorbed
+# too. Failures are never reused, nor are results the `reusable` predicate rejects.
+#
+# The computation runs as its own task, so a caller that goes away doesn't cancel it for
+# the others still waiting on it.
+
+import asyncio
+import time
+from collections import OrderedDict
+
+# How a call was answered
+COMPUTED = 'computed'
+IN_FLIGHT = 'in_flight'  # Joined a computation another call had started
+REUSED = 'reused'  # Took a result completed within the reuse window
+
+
+class SingleFlight:
+    """
+    Args:
+        reuse_seconds (float): How long a completed result is handed to new calls (0 = only
+                               calls that overlap the computation share it).
+        max_entries (int): Most completed results kept for reuse; the oldest are dropped first.
+        reusable (callable): Optional predicate on a result; False keeps it out of the reuse
+                             window (callers that overlapped the computation still share it).
+    """
+
+    def __init__(self, reuse_seconds=1.0, max_entries=10_000, reusable=None):
+        self.reuse_seconds = reuse_seconds
+        self.max_entries = max_entries
+        self.reusable = reusable
+        self._in_flight = {}  # key -> asyncio.Task
+        self._done = OrderedDict()  # key -> (expires_at, result), oldest first
+        self.computed = 0
+        self.joined = 0
+        self.reused = 0
+
+    async def run(self, key, compute):
+        """
+        Returns (result, how) where `how` is COMPUTED, IN_FLIGHT or REUSED.
+
+        Args:
+            key: Hashable key; calls with equal keys share a result.
+            compute: Zero-argument async function producing the result.
+        """
+        self._purge_expired()
+        entry = self._done.get(key)
+        if entry is not None:
+            self.reused += 1
+            return entry[1], REUSED
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.joined += 1
+            how = IN_FLIGHT
+        else:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.computed += 1
+            how = COMPUTED
+        # shield(): cancelling this caller leaves the computation running for the others
+        return await asyncio.shield(task), how
+
+    def _finished(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if self.reuse_seconds <= 0 or task.cancelled() or task.exception() is not None:
+            return
+        if self.reusable is None or self.reusable(task.result()):
+            self._done[key] = (time.monotonic() + self.reuse_seconds, task.result())
+            self._done.move_to_end(key)
+            while len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        while self._done:
+            expires_at, _ = next(iter(self._done.values()))
+            if expires_at > now:
+                break
+            self._done.popitem(last=False)
+
+    def stats(self):
+        self._purge_expired()
+        return {
+            "reuse_seconds": self.reuse_seconds,
+            "in_flight": len(self._in_flight),
+            "reusable": len(self._done),
+            "computed": self.computed,
+            "coalesced_in_flight": self.joined,
+            "coalesced_reused": self.reused,
+        }
@@ -0,0 +1,41 @@
+# gunicorn.conf.py
+
+# Multi-worker serving: gunicorn runs N uvicorn workers that share the model and the
+# customer table instead of each loading its own copy.
+#   * preload_app imports main once in the master,
+#   * when_ready loads the model, maps the customer table (materialized once as .npy
+#     files) and freezes the GC, all before the workers fork,
+#   * each worker then maps the same read-only pages and only starts its own threads
+#     (prediction log writer, model watcher) and LLM client.
+#
+# Usage:
+#     gunicorn -c gunicorn.conf.py main:app
+#     WEB_CONCURRENCY=4 PORT=8080 gunicorn -c gunicorn.conf.py main:app
+
+import multiprocessing
+import os
+
+# Read by main at import time, which preload_app does after this file is loaded
+os.environ.setdefault("SHARED_CUSTOMER_STORE", "true")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is spawned
+    import main
+
+    main.preload_for_workers()
+
+
+def child_exit(server, worker):
+    # With PROMETHEUS_MULTIPROC_DIR set, drop a dead worker's live gauges from /metrics
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,29 +1,50 @@
 # main.py (Final Version with A/B Testing)
 
 # 1. Library Imports
-import pandas as pd
-import mlflow
+import gc
 import time
-import logging
 import os
-import random # Import the random module
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-
-from engine.nba_engine import recommend_action
-from engine.personalization_engine import generate_personalized_email
-
-# Logger setup (remains the same)
-def setup_logger():
-    logger = logging.getLogger('prediction_logger')
-    logger.setLevel(logging.INFO)
-    handler = logging.FileHandler('/tmp/prediction_logs.jsonl', mode='a')
-    formatter = logging.Formatter('%(message)s')
-    handler.setFormatter(formatter)
-    if not logger.handlers:
-        logger.addHandler(handler)
-    return logger
-prediction_logger = setup_logger()
+import json
+import threading
+import numpy as np
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict
+
+from engine.nba_engine import recommend_action, recommend_actions
+from engine.personalization_engine import (SOURCE_FALLBACK, NoTemplateError, generate_email, generate_email_within,
+                                           stream_email_within)
+from engine.circuit_breaker import CircuitBreaker
+from engine.single_flight import COMPUTED, SingleFlight
+from engine.llm_client import AsyncLLMClient
+from engine.generation_cache import GenerationCache
+from engine.email_jobs import EmailJobQueue, QUEUE_FULL
+from engine.score_table import ScoreTable
+from engine.fast_inference import predict_columns
+from engine.model_registry import ModelWatcher
+from engine.model_cache import ModelCache
+from engine.feature_store import CATEGORICAL_COLUMNS, ID_COLUMN, NUMERIC_DTYPES, CustomerStore, ReadOnlyStoreError
+from engine.change_log import ChangeLog, apply_changes, compact
+from engine.prediction_log import PredictionLogWriter
+from engine.experiments import EXPERIMENTS_PATH, NOT_ENROLLED, ExperimentSet
+from engine.experiment_analytics import ExperimentAnalytics
+from engine.drift_monitor import DriftMonitor, build_reference, score_reference
+from engine.ground_truth import GroundTruthStore
+from engine import metrics
+
+# Prediction log: requests only enqueue a record; a background thread writes JSON lines in batches
+prediction_log = PredictionLogWriter.from_env()
+# Customer upserts: appended here before they are applied, and replayed on every data load
+change_log = ChangeLog.from_env()
+# Sticky, hash-based experiment groups; the primary experiment drives the A/B split in /predict
+experiments = ExperimentSet.from_file(EXPERIMENTS_PATH)
+ab_experiment = experiments.primary
+# Running per-group statistics, kept up to date by tailing the prediction logs
+experiment_analytics = ExperimentAnalytics.from_env(prediction_log.path, experiments)
+# Sliding-window feature/score drift against the training data; labels are joined back in SQLite
+drift_monitor = DriftMonitor.from_env()
+ground_truth = None
 
 # App Initialization
 app = FastAPI(
@@ -32,21 +53,245 @@ app = FastAPI(
     version="3.0.0"
 )
 
+# --- Configuration ---
+CUSTOMER_DATA_PATH = 'data/crm_data.csv'
+MODEL_URI = os.getenv("CHURN_MODEL_URI", "models:/churn-predictor/Production")
+# Optional precompute mode: score every customer once and serve requests from a lookup table
+PRECOMPUTE_SCORES = os.getenv("PRECOMPUTE_SCORES", "false").lower() in ("1", "true", "yes")
+# 'native' evaluates the pipeline with the compiled NumPy engine; 'pyfunc' uses mlflow.pyfunc as before
+CHURN_INFERENCE_BACKEND = os.getenv("CHURN_INFERENCE_BACKEND", "native")
+# Opt-in background email generation: /predict returns an email job ID instead of waiting for the LLM
+ASYNC_EMAIL_DEFAULT = os.getenv("ASYNC_EMAIL", "false").lower() in ("1", "true", "yes")
+# How often the registry is checked for a newly promoted model version (0 = only via POST /admin/model/refresh)
+MODEL_POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", "60"))
+# Fast cold start: serve the locally cached model right away and check the registry in the background
+FAST_START = os.getenv("FAST_START", "false").lower() in ("1", "true", "yes")
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/tmp/churn-model-cache")
+# Multi-worker mode: the customer table is materialized once as .npy files and memory-mapped by every worker
+SHARED_CUSTOMER_STORE = os.getenv("SHARED_CUSTOMER_STORE", "false").lower() in ("1", "true", "yes")
+SHARED_DATA_DIR = os.getenv("SHARED_DATA_DIR", "/tmp/churn-shared-data")
+# Drift reference: loaded from this file if it exists, else built from the CRM data (and saved there if set)
+DRIFT_REFERENCE_PATH = os.getenv("DRIFT_REFERENCE_PATH") or None
+DRIFT_REFERENCE_ROWS = int(os.getenv("DRIFT_REFERENCE_ROWS", "50000"))
+# The customer store and change log are compacted once superseded rows exceed this share of all rows
+CRM_COMPACT_DEAD_RATIO = float(os.getenv("CRM_COMPACT_DEAD_RATIO", "0.25"))
+# Latency budget of a request that writes an email; past it the email comes from a local template.
+# A caller can shorten it with the X-Email-Deadline-Ms header.
+EMAIL_DEADLINE_SECONDS = float(os.getenv("EMAIL_DEADLINE_MS", "2000")) / 1000.0
+# Duplicate /predict calls for the same customer share one computation; its result is reused for this long after
+PREDICT_REUSE_SECONDS = float(os.getenv("PREDICT_COALESCE_REUSE_MS", "1000")) / 1000.0
+
+score_table = ScoreTable(chunk_size=int(os.getenv("SCORE_TABLE_CHUNK_SIZE", "50000")))
+# Its SQLite tier (EMAIL_CACHE_DB) is connected on first use in each worker, never in a preloading master
+email_cache = GenerationCache.from_env()
+# Skips the LLM after repeated timeouts or errors, and probes it again after a cooldown
+llm_breaker = CircuitBreaker.from_env()
+# A fallback email isn't reused after it completes: the next call may get the LLM's
+prediction_flights = SingleFlight(reuse_seconds=PREDICT_REUSE_SECONDS,
+                                  reusable=lambda response: response.email_source != SOURCE_FALLBACK)
+_data_reloads = 0
+_preloaded = False
+churn_model = None
+customer_data = None
+
+
+def load_customer_data(refresh_scores=True):
+    """(Re)loads the CRM table. Each load gets a new data version so derived state can tell it is stale."""
+    global customer_data, _data_reloads
+    _data_reloads += 1
+    # The version travels with the store, so a request always sees a matching (data, version) pair
+    if SHARED_CUSTOMER_STORE:
+        data = CustomerStore.from_csv_shared(CUSTOMER_DATA_PATH, SHARED_DATA_DIR, version=_data_reloads)
+    else:
+        data = CustomerStore.from_csv(CUSTOMER_DATA_PATH, version=_data_reloads)
+        # Upserts made since the CSV was written; applied before the store is published
+        replayed = change_log.replay(data)
+        if replayed:
+            print(f"Replayed {replayed} customer changes from {change_log.path}.")
+        if data.dead_rows:
+            # Not published yet, so it keeps its version; the log shrinks to one record per changed customer
+            data = compact(data, change_log, data.version)
+    if data.shared and os.path.exists(change_log.path):
+        print(f"Warning: the shared customer store is read-only; changes in {change_log.path} are not applied.")
+    customer_data = data
+    if PRECOMPUTE_SCORES and refresh_scores:
+        score_table.refresh_in_background(churn_model, data, _data_reloads)
+
+
+_compact_lock = threading.Lock()
+
+
+def maybe_compact_customer_data():
+    """
+    Replaces the live store with a compacted copy under a new data version once superseded
+    rows exceed CRM_COMPACT_DEAD_RATIO of all rows. Upserts wait while it runs.
+    """
+    global _data_reloads
+
+    def publish(compacted):
+        global customer_data
+        customer_data = compacted
+
+    with _compact_lock:
+        data = customer_data
+        # Checked again under the lock: a concurrent request may have just compacted
+        if data.dead_rows <= CRM_COMPACT_DEAD_RATIO * data.row_count:
+            return
+        _data_reloads += 1
+        data = compact(data, change_log, _data_reloads, publish)
+    if PRECOMPUTE_SCORES:
+        # Row positions changed, so the table is rebuilt; lookups score directly until then
+        score_table.refresh_in_background(churn_model, data, data.version)
+
+
+def preload_for_workers():
+    """
+    Loads the model, the customer table, the drift references and (in precompute mode) the
+    score table in the gunicorn master, before the workers fork, so their pages are shared
+    copy-on-write and the reference sample is scored once rather than once per worker.
+
+    Everything runs synchronously here: threads do not survive a fork, so pollers and
+    writers are started per worker in `load_resources`.
+    """
+    global _preloaded
+    model_watcher.load(prefer_cache=FAST_START)
+    load_customer_data(refresh_scores=False)
+    if PRECOMPUTE_SCORES:
+        score_table.build(churn_model, customer_data, customer_data.version)
+    build_drift_reference()
+    # Move everything allocated so far out of the collector's reach; otherwise the first GC
+    # in each worker writes to (and so un-shares) every page holding these objects.
+    gc.collect()
+    gc.freeze()
+    _preloaded = True
+    print(f"Preloaded run_id={churn_model.metadata.run_id} and {customer_data.customer_count} customers for the workers.")
+
+
+def install_model(model):
+    """Swaps in a loaded, warmed-up model. Requests that already captured the old one finish on it."""
+    global churn_model
+    churn_model = model
+    data = customer_data
+    if PRECOMPUTE_SCORES and data is not None:
+        # The table is keyed by run_id; lookups miss (and score directly) until the rebuild lands
+        score_table.refresh_in_background(model, data, data.version)
+    if drift_monitor.ready:
+        # Score drift is measured against what this model scores on the reference data
+        set_score_reference(model, data)
+
+
+def _drift_reference_positions(data):
+    # Current rows only: a customer's superseded versions would count them twice
+    live = data.live_positions()
+    n = min(len(live), DRIFT_REFERENCE_ROWS)
+    return np.sort(np.random.default_rng(0).choice(live, size=n, replace=False))
+
+
+def set_score_reference(model, data):
+    scores = predict_columns(model, data.take(_drift_reference_positions(data)))
+    drift_monitor.set_references({'churn_probability': score_reference(scores)}, run_id=model.metadata.run_id)
+
+
+def build_drift_reference():
+    """Installs the feature reference distributions (from DRIFT_REFERENCE_PATH or the CRM data) and the score reference."""
+    data = customer_data
+    if DRIFT_REFERENCE_PATH and os.path.exists(DRIFT_REFERENCE_PATH):
+        references, info = DriftMonitor.load_references(DRIFT_REFERENCE_PATH)
+        references.pop('churn_probability', None)
+        drift_monitor.set_references(references, **{**info, "source": DRIFT_REFERENCE_PATH})
+    else:
+        numeric_columns = [name for name in NUMERIC_DTYPES if name != 'Churn']
+        references = build_reference(data.take(_drift_reference_positions(data)), numeric_columns, CATEGORICAL_COLUMNS)
+        drift_monitor.set_references(references, source=CUSTOMER_DATA_PATH,
+                                     rows=min(len(data), DRIFT_REFERENCE_ROWS))
+        if DRIFT_REFERENCE_PATH:
+            drift_monitor.save_references(DRIFT_REFERENCE_PATH)
+    set_score_reference(churn_model, data)
+
+
+model_watcher = ModelWatcher(MODEL_URI, on_swap=install_model, backend=CHURN_INFERENCE_BACKEND,
+                             poll_seconds=MODEL_POLL_SECONDS,
+                             cache=ModelCache(MODEL_CACHE_DIR) if FAST_START else None)
+
+
+def score_customers(model, data, positions):
+    """
+    Returns churn scores from `model` for the given row positions of the customer store `data`.
+
+    In precompute mode the scores come from the score table when it matches the loaded
+    model and data version; otherwise a rebuild is scheduled and the model is called directly.
+    """
+    if PRECOMPUTE_SCORES:
+        data_version = data.version
+        run_id = model.metadata.run_id
+        scores = score_table.lookup(positions, run_id, data_version)
+        if scores is not None:
+            missing = np.isnan(scores)
+            if missing.any():
+                # Rows upserted since the build: score just those and remember them
+                new_positions = np.asarray(positions, dtype=np.intp)[missing]
+                scores[missing] = predict_columns(model, data.take(new_positions))
+                score_table.fill(new_positions, scores[missing], run_id, data_version)
+            return scores
+        score_table.refresh_in_background(model, data, data_version)
+    return predict_columns(model, data.take(positions))
+
+
 # Resource Loading (remains the same)
 @app.on_event("startup")
 def load_resources():
-    global churn_model, customer_data
+    global ground_truth
     print("Loading resources...")
-    model_uri = "models:/churn-predictor/Production" 
-    try:
-        print(f"Loading model from MLflow Registry: {model_uri}")
-        churn_model = mlflow.pyfunc.load_model(model_uri)
-        print("Model loaded successfully.")
-    except Exception as e:
-        raise RuntimeError(f"Could not load model from MLflow Registry: {e}")
-    customer_data = pd.read_csv('data/crm_data.csv').set_index('CustomerID')
+    if _preloaded:
+        # Forked from a preloaded gunicorn master; each worker writes its own prediction log file
+        root, ext = os.path.splitext(prediction_log.path)
+        prediction_log.path = f"{root}.{os.getpid()}{ext}"
+    prediction_log.start()
+    if not _preloaded:
+        try:
+            print(f"Loading model from MLflow Registry: {MODEL_URI}")
+            model_watcher.load(prefer_cache=FAST_START)
+            print("Model loaded successfully.")
+        except Exception as e:
+            raise RuntimeError(f"Could not load model from MLflow Registry: {e}")
+        load_customer_data()
+        build_drift_reference()
+    # Opened per process: SQLite connections must not cross a fork
+    ground_truth = GroundTruthStore.from_env(threshold=ab_experiment.min_churn_probability)
+    if ground_truth is not None:
+        # Predictions reach the label index from the log writer thread, in its batches
+        prediction_log.sinks.append(ground_truth.record_predictions)
+        # Outcomes for the experiment summaries come from the labels joined there
+        experiment_analytics.outcomes = ground_truth
+    # Later promotions are picked up in the background and swapped in without a restart
+    model_watcher.start()
+    experiment_analytics.start()
     print("Resources loaded successfully.")
 
+@app.on_event("startup")
+async def open_llm_client():
+    # Created inside the running event loop; shared by every request
+    global llm_client, email_jobs
+    llm_client = AsyncLLMClient.from_env()
+    email_jobs = EmailJobQueue(
+        lambda customer_data, action: generate_email(customer_data, action, llm_client, cache=email_cache),
+        workers=int(os.getenv("EMAIL_JOB_WORKERS", "4")),
+        max_queue=int(os.getenv("EMAIL_JOB_QUEUE_SIZE", "1000")),
+        ttl_seconds=float(os.getenv("EMAIL_JOB_TTL_SECONDS", "3600")),
+    )
+    await email_jobs.start()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    model_watcher.stop()
+    experiment_analytics.stop()
+    await email_jobs.stop()
+    await llm_client.aclose()
+    email_cache.close()
+    prediction_log.close()  # Writes out whatever is still queued
+    if ground_truth is not None:
+        ground_truth.close()
+
 # --- UPDATED: Response Model with Experiment Info ---
 class PredictionResponse(BaseModel):
     customer_id: str
@@ -55,61 +300,364 @@ class PredictionResponse(BaseModel):
     experiment_group: str # 'A' (Control), 'B' (Treatment), or 'N/A'
     action_taken: str
     personalized_email: str | None = None # Email is now optional
+    email_job_id: str | None = None # Set in async email mode; poll GET /emails/{email_job_id}
+    email_status: str | None = None # Async email mode: 'pending', or 'queue_full' when no job could be queued
+    email_source: str | None = None # 'llm', 'cache', or 'fallback' (a local template)
+    email_fallback_reason: str | None = None # Why the fallback was used: 'deadline', 'circuit_open' or 'llm_error'
+
+class EmailJobResponse(BaseModel):
+    job_id: str
+    status: str # 'pending', 'done' or 'failed'
+    action: str
+    personalized_email: str | None = None
+    error: str | None = None
+    created_at: float
+    finished_at: float | None = None
+
+# --- Batch scoring models ---
+class BatchPredictionRequest(BaseModel):
+    customer_ids: list[str]
+
+class BatchPredictionResponse(BaseModel):
+    model_version: str
+    results: list[PredictionResponse]
+    unknown_ids: list[str] # IDs not found in the CRM data; they don't fail the batch
+
+# --- Customer upserts ---
+class CustomerRecord(BaseModel):
+    """A full CRM record; PUT creates the customer or replaces every field."""
+    model_config = ConfigDict(extra='forbid')
+    Age: int
+    Gender: str
+    Location: str
+    SubscriptionTier: str
+    Tenure: int
+    MonthlyRevenue: float
+    UsageFrequency: int
+    SupportTickets: int
+    LastInteraction: int
+    Churn: int = 0
+
+class CustomerUpdate(BaseModel):
+    """A partial CRM record; PATCH changes only the fields that are sent."""
+    model_config = ConfigDict(extra='forbid')
+    Age: int | None = None
+    Gender: str | None = None
+    Location: str | None = None
+    SubscriptionTier: str | None = None
+    Tenure: int | None = None
+    MonthlyRevenue: float | None = None
+    UsageFrequency: int | None = None
+    SupportTickets: int | None = None
+    LastInteraction: int | None = None
+    Churn: int | None = None
+
+class CustomerUpsertResponse(BaseModel):
+    customer_id: str
+    created: bool
+    data_version: int
+
+class GroundTruthLabel(BaseModel):
+    customer_id: str
+    churned: bool
+    observed_at: float | None = None # Unix time the outcome was known; predictions up to then get the label (default: now)
+
+class GroundTruthRequest(BaseModel):
+    labels: list[GroundTruthLabel]
+
+class BulkUpsertResponse(BaseModel):
+    created: int
+    updated: int
+    errors: list[dict] # {"line": 1-based line number, "error": message}; other lines are still applied
+
+# Customers at or above this churn probability enter the A/B experiment (set in the experiments config)
+CHURN_THRESHOLD = ab_experiment.min_churn_probability
+
+
+def log_prediction(model_version_str, customer_id, features, churn_prob, experiment_group, action, profile=None,
+                   assignments=None, email_source=None, email_fallback_reason=None):
+    """Queues one prediction record for the background log writer (never blocks)."""
+    log_entry = {
+        "timestamp": int(time.time()),
+        "model_version": model_version_str,
+        "customer_id": customer_id,
+        "features": features,
+        "prediction": {"churn_probability": round(float(churn_prob), 4)},
+        "experiment": {
+            "group": experiment_group,
+            "action_taken": action
+        },
+        "ground_truth_churn": None
+    }
+    if email_source is not None:
+        log_entry["email"] = {"source": email_source, "fallback_reason": email_fallback_reason}
+    if assignments:
+        # Group of every experiment the customer is enrolled in, the primary one included
+        log_entry["experiments"] = assignments
+    if profile is not None:
+        # Request-ID-tagged stage breakdown of a slow or sampled request
+        log_entry["profile"] = profile
+    prediction_log.log(log_entry)
 
 
 @app.get("/")
 def read_root():
     return {"status": "ok", "message": "Welcome to the A/B Testing AI API!"}
 
+@app.get("/scores/status")
+def get_score_table_status():
+    """Reports whether the precomputed score table is ready, and its build time and row count."""
+    return {"enabled": PRECOMPUTE_SCORES, **score_table.status()}
+
+@app.get("/cache/stats")
+def get_email_cache_stats():
+    """Hit/miss/eviction counters of the generated-email cache."""
+    return email_cache.stats()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition: per-stage latency histograms and error/cache counters."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/llm/status")
+def get_llm_status():
+    """The email deadline and the state of the LLM circuit breaker."""
+    return {"email_deadline_ms": EMAIL_DEADLINE_SECONDS * 1000.0, "circuit_breaker": llm_breaker.stats()}
+
+@app.get("/coalescing/stats")
+def get_coalescing_stats():
+    """Computed vs. coalesced /predict calls, and the results currently shared."""
+    return prediction_flights.stats()
+
+@app.get("/logs/stats")
+def get_prediction_log_stats():
+    """Queue depth and written/dropped counters of the prediction log writer."""
+    return prediction_log.stats()
+
+@app.get("/experiments")
+def list_experiments():
+    """Configured experiments with their splits, and the state of the log tailer."""
+    return {
+        "primary": ab_experiment.name,
+        "experiments": [experiment.describe() for experiment in experiments.experiments.values()],
+        "analytics": experiment_analytics.status(),
+    }
+
+@app.get("/experiments/{name}/summary")
+def get_experiment_summary(name: str):
+    """
+    Per-group prediction and outcome counters, and each treatment group's difference from
+    control with confidence intervals. Served from running counters, so it costs the same
+    however large the logs are; it trails the logs by about EXPERIMENT_ANALYTICS_SECONDS.
+    Outcomes (churn rates and their uplift) come from labels posted to
+    /monitoring/ground-truth, so they need the ground-truth store.
+    """
+    summary = experiment_analytics.summary(name)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Experiment not found.")
+    return summary
+
+@app.get("/monitoring/drift")
+def get_drift_report():
+    """
+    PSI / KS drift of every model feature and of the churn score over the sliding window,
+    worst first, and the quality of the predictions labeled within the same window.
+    """
+    report = drift_monitor.report()
+    if ground_truth is not None:
+        report["ground_truth"] = ground_truth.performance(since=time.time() - drift_monitor.window_seconds)
+    return report
+
+@app.post("/monitoring/ground-truth")
+def ingest_ground_truth(request: GroundTruthRequest):
+    """Joins observed churn outcomes back to the customers' earlier, still unlabeled predictions."""
+    if ground_truth is None:
+        raise HTTPException(status_code=503, detail="Ground-truth store disabled (set GROUND_TRUTH_DB to enable it).")
+    matched = ground_truth.add_labels([(label.customer_id, label.churned, label.observed_at) for label in request.labels])
+    return {"received": len(request.labels), "matched_predictions": matched}
+
+@app.get("/admin/model")
+def get_model_status():
+    """The served model's run_id, its load time, and recent swap events."""
+    return model_watcher.status()
+
+@app.post("/admin/model/refresh")
+def refresh_model():
+    """Checks the registry now; a newly promoted version is loaded, warmed up and swapped in."""
+    swapped = model_watcher.check()
+    return {"swapped": swapped, **model_watcher.status()}
+
+@app.post("/admin/reload-data")
+def reload_customer_data():
+    """Re-reads the CRM file. In precompute mode this also schedules a score table rebuild."""
+    load_customer_data()
+    return {"status": "ok", "rows": customer_data.customer_count, "data_version": customer_data.version}
+
+# --- Batch scoring ---
+# Registered before /predict/{customer_id} so "batch" is not captured as a customer ID.
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+def get_batch_prediction(request: BatchPredictionRequest):
+    """
+    Scores many customers with a single indexed selection and one model call.
+
+    Unknown IDs are reported in `unknown_ids` instead of failing the batch.
+    Emails are not generated here; Group-B rows get their recommended action only.
+    """
+    # Captured once, so the whole batch is scored and labeled by the same model
+    model = churn_model
+    data = customer_data
+    # Hash-index lookups for the whole batch; duplicates are scored once
+    known_ids, positions, unknown_ids = data.positions(dict.fromkeys(request.customer_ids))
+    if unknown_ids:
+        metrics.NOT_FOUND.labels('batch').inc(len(unknown_ids))
+
+    model_version_str = model.metadata.run_id
+    if len(known_ids) == 0:
+        return BatchPredictionResponse(model_version=model_version_str, results=[], unknown_ids=unknown_ids)
+
+    # One column gather and one vectorized predict call (or table lookup) for the whole batch
+    churn_probs = score_customers(model, data, positions)
+    drift_monitor.observe_many(data.take(positions), churn_probs)
+
+    # --- Sticky experiment groups for every row ---
+    assignments = [experiments.assign(customer_id, churn_prob) for customer_id, churn_prob in zip(known_ids, churn_probs)]
+    groups = np.array([assigned.get(ab_experiment.name, NOT_ENROLLED) for assigned in assignments], dtype=object)
+    treatment = np.array([ab_experiment.is_treatment(group) for group in groups], dtype=bool)
+    actions = np.where(groups == NOT_ENROLLED, 'No Action (Not At-Risk)', 'No Action (Control Group)').astype(object)
+
+    if treatment.any():
+        # Segment all treatment rows at once with the vectorized NBA rules
+        _, actions[treatment] = recommend_actions(data.take(positions[treatment]))
+
+    results = []
+    for customer_id, position, churn_prob, group, action, assigned in zip(known_ids, positions, churn_probs, groups,
+                                                                          actions, assignments):
+        log_prediction(model_version_str, customer_id, data.row(position).to_dict(), churn_prob, group, action,
+                       assignments=assigned)
+        results.append(PredictionResponse(
+            customer_id=customer_id,
+            model_version=model_version_str,
+            churn_probability=round(float(churn_prob), 4),
+            experiment_group=group,
+            action_taken=action,
+        ))
+
+    return BatchPredictionResponse(model_version=model_version_str, results=results, unknown_ids=unknown_ids)
+
+def score_one(customer_id, timer, endpoint='predict'):
+    """
+    Looks up and scores one customer and assigns their experiment groups.
+
+    Returns:
+        tuple: (model run_id, CustomerRow, churn probability, experiment assignments).
+    Raises:
+        HTTPException: 404 for an unknown customer ID.
+    """
+    # Captured once: a hot swap mid-request can't mix two models' scores and version labels
+    model = churn_model
+    data = customer_data
+    position = data.position(customer_id)
+    if position is None:
+        metrics.NOT_FOUND.labels(endpoint).inc()
+        raise HTTPException(status_code=404, detail="Customer ID not found.")
+
+    # Zero-copy view of the row, shared by the NBA engine, the prompt and the log entry
+    customer_profile = data.row(position)
+    timer.lap('lookup')
+
+    churn_prob = score_customers(model, data, [position])[0]
+    timer.lap('score')
+    # Groups are a hash of the customer ID, so a customer stays in the same group on every request
+    return model.metadata.run_id, customer_profile, churn_prob, experiments.assign(customer_id, churn_prob)
+
+def email_deadline(deadline_ms=None):
+    """The request's email deadline in seconds: X-Email-Deadline-Ms can only shorten EMAIL_DEADLINE_MS."""
+    return EMAIL_DEADLINE_SECONDS if deadline_ms is None else min(deadline_ms / 1000.0, EMAIL_DEADLINE_SECONDS)
+
+def email_budget(timer, deadline_ms=None):
+    """Seconds left for the email: the request's deadline minus the time it has already taken."""
+    return email_deadline(deadline_ms) - (time.perf_counter() - timer.started)
+
+def counts_timeouts(deadline_ms=None):
+    """Only timeouts at the full server budget say the LLM is slow; shortened ones stay off the breaker."""
+    return email_deadline(deadline_ms) >= EMAIL_DEADLINE_SECONDS
+
 @app.post("/predict/{customer_id}", response_model=PredictionResponse)
-def get_prediction(customer_id: str):
-    if customer_id not in customer_data.index:
+async def get_prediction(customer_id: str, async_email: bool = ASYNC_EMAIL_DEFAULT,
+                         x_email_deadline_ms: float | None = Header(default=None, ge=0)):
+    """
+    Scores a customer, assigns their experiment group and, for the treatment group, writes
+    the retention email.
+
+    Concurrent calls for the same customer, model version and row version share a single
+    computation (and its group and email), as do calls within PREDICT_COALESCE_REUSE_MS of
+    it completing; only that computation is logged. Calls with different effective email
+    deadlines don't share, and a fallback email is only shared by overlapping calls.
+    """
+    data = customer_data
+    position = data.position(customer_id)
+    if position is None:
+        metrics.NOT_FOUND.labels('predict').inc()
         raise HTTPException(status_code=404, detail="Customer ID not found.")
-    
-    customer_profile = customer_data.loc[customer_id]
-    customer_df = pd.DataFrame([customer_profile])
-    
-    churn_prob = churn_model.predict(customer_df)[0]
-    model_version_str = churn_model.metadata.run_id
+    # The row position changes on every upsert, so an updated customer is never answered from before the update
+    key = (customer_id, churn_model.metadata.run_id, data.version, position, async_email,
+           email_deadline(x_email_deadline_ms))
+    response, how = await prediction_flights.run(
+        key, lambda: predict_customer(customer_id, async_email, x_email_deadline_ms))
+    if how != COMPUTED:
+        metrics.COALESCED.labels(how).inc()
+    return response
+
+async def predict_customer(customer_id, async_email, deadline_ms=None):
+    """The work behind POST /predict/{customer_id}, run once per coalesced group of calls."""
+    timer = metrics.StageTimer()
+    model_version_str, customer_profile, churn_prob, assignments = score_one(customer_id, timer)
 
     # --- NEW: A/B Test Logic ---
-    experiment_group = 'N/A' # Default for customers not at-risk
+    experiment_group = assignments.get(ab_experiment.name, NOT_ENROLLED) # 'N/A' for customers not at-risk
     action = 'N/A'
     email = None
-    
-    # Define a churn threshold for who enters the experiment
-    CHURN_THRESHOLD = 0.5 
-
-    if churn_prob >= CHURN_THRESHOLD:
-        # This customer is at-risk and will be part of our experiment
-        if random.random() < 0.5:
-            # Group A (Control): 50% chance. Do nothing.
-            experiment_group = 'A'
+    email_job_id = None
+    email_status = None
+    email_source = None
+    fallback_reason = None
+
+    if experiment_group != NOT_ENROLLED:
+        # This customer is at-risk and part of our experiment
+        if not ab_experiment.is_treatment(experiment_group):
+            # Group A (Control): Do nothing.
             action = 'No Action (Control Group)'
         else:
-            # Group B (Treatment): 50% chance. Apply AI recommendation.
-            experiment_group = 'B'
-            action = recommend_action(customer_profile.to_dict())
-            email = generate_personalized_email(customer_profile.to_dict(), action)
+            # Group B (Treatment): Apply AI recommendation.
+            action = recommend_action(customer_profile)
+            timer.lap('nba')
+            if async_email:
+                # Hand the email to the background workers and return right away
+                job = email_jobs.submit(customer_profile.to_dict(), action)
+                email_job_id = job.job_id if job is not None else None
+                email_status = job.status if job is not None else QUEUE_FULL
+            else:
+                # Awaited, so a slow LLM call no longer holds a worker thread; bounded by the deadline
+                try:
+                    email, email_source, fallback_reason = await generate_email_within(
+                        customer_profile, action, llm_client, email_budget(timer, deadline_ms),
+                        cache=email_cache, breaker=llm_breaker, count_timeouts=counts_timeouts(deadline_ms))
+                except NoTemplateError as e:
+                    email = f"Error: {e}"
+            timer.lap('email')
     else:
         # Customer is not at risk, not part of the experiment
         action = 'No Action (Not At-Risk)'
     # --- END of A/B Test Logic ---
 
+    drift_monitor.observe(customer_profile, churn_prob)
     # Expanded logging to include experiment group
-    log_entry = {
-        "timestamp": int(time.time()),
-        "model_version": model_version_str,
-        "customer_id": customer_id,
-        "features": customer_profile.to_dict(),
-        "prediction": {"churn_probability": round(float(churn_prob), 4)},
-        "experiment": {
-            "group": experiment_group,
-            "action_taken": action
-        },
-        "ground_truth_churn": None
-    }
-    prediction_logger.info(log_entry)
+    log_prediction(model_version_str, customer_id, customer_profile.to_dict(), churn_prob, experiment_group, action,
+                   profile=timer.profile(), assignments=assignments, email_source=email_source,
+                   email_fallback_reason=fallback_reason)
+    timer.lap('log')
+    timer.observe(experiment_group, action, model_version_str)
 
     return PredictionResponse(
         customer_id=customer_id,
@@ -117,5 +665,184 @@ def get_prediction(customer_id: str):
         churn_probability=round(float(churn_prob), 4),
         experiment_group=experiment_group,
         action_taken=action,
-        personalized_email=email
-    )
\ No newline at end of file
+        personalized_email=email,
+        email_job_id=email_job_id,
+        email_status=email_status,
+        email_source=email_source,
+        email_fallback_reason=fallback_reason,
+    )
+
+def _sse(event, data):
+    """One Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/predict/{customer_id}/stream")
+async def stream_prediction(customer_id: str, x_email_deadline_ms: float | None = Header(default=None, ge=0)):
+    """
+    The prediction of POST /predict/{customer_id} as Server-Sent Events, so a UI can show
+    the email while it is being written:
+
+    - `prediction`: score, group and action, sent as soon as the customer is scored;
+    - `token`: the next piece of the email (treatment group only), as the LLM produces it;
+    - `error`: the email broke off after it had started;
+    - `done`: the complete response, with the same fields as POST /predict/{customer_id}.
+
+    If no token arrives within the deadline (X-Email-Deadline-Ms, as for POST), the email
+    is the local fallback, sent as a single token. A client that disconnects cancels the
+    stream, which closes the upstream LLM request and stops the generation; the prediction
+    is still logged.
+    """
+    timer = metrics.StageTimer()
+    model_version_str, customer_profile, churn_prob, assignments = score_one(customer_id, timer, 'predict_stream')
+    experiment_group = assignments.get(ab_experiment.name, NOT_ENROLLED)
+    if experiment_group == NOT_ENROLLED:
+        action = 'No Action (Not At-Risk)'
+    elif not ab_experiment.is_treatment(experiment_group):
+        action = 'No Action (Control Group)'
+    else:
+        action = recommend_action(customer_profile)
+        timer.lap('nba')
+    write_email = ab_experiment.is_treatment(experiment_group)
+    drift_monitor.observe(customer_profile, churn_prob)
+
+    prediction = {
+        "customer_id": customer_id,
+        "model_version": model_version_str,
+        "churn_probability": round(float(churn_prob), 4),
+        "experiment_group": experiment_group,
+        "action_taken": action,
+    }
+
+    async def events():
+        outcome = None
+        email_source = fallback_reason = None
+        try:
+            yield _sse("prediction", prediction)
+            email = None
+            if write_email:
+                pieces = []
+                try:
+                    async for piece, email_source, fallback_reason in stream_email_within(
+                            customer_profile, action, llm_client, email_budget(timer, x_email_deadline_ms),
+                            cache=email_cache, breaker=llm_breaker,
+                            count_timeouts=counts_timeouts(x_email_deadline_ms)):
+                        pieces.append(piece)
+                        yield _sse("token", {"text": piece})
+                    email = "".join(pieces).strip()
+                    outcome = 'fallback' if email_source == SOURCE_FALLBACK else 'completed'
+                except NoTemplateError as e:
+                    email = f"Error: {e}"
+                    outcome = 'error'
+                except Exception as e:
+                    # Broke off mid-email: too late to switch to the fallback
+                    email = f"An error occurred with the Hugging Face API: {e}"
+                    outcome = 'error'
+                if outcome == 'error':
+                    yield _sse("error", {"error": email})
+                timer.lap('email')
+            yield _sse("done", {**prediction, "personalized_email": email, "email_source": email_source,
+                                "email_fallback_reason": fallback_reason})
+        finally:
+            if write_email:
+                metrics.EMAIL_STREAMS.labels(outcome or 'disconnected').inc()
+            log_prediction(model_version_str, customer_id, customer_profile.to_dict(), churn_prob, experiment_group,
+                           action, profile=timer.profile(), assignments=assignments, email_source=email_source,
+                           email_fallback_reason=fallback_reason)
+            timer.lap('log')
+            timer.observe(experiment_group, action, model_version_str)
+
+    # no-cache and no proxy buffering, so every event reaches the client as it is sent
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/emails/{job_id}", response_model=EmailJobResponse)
+def get_email_job(job_id: str):
+    """Polls a background email job: pending, done (with the email) or failed."""
+    job = email_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Email job not found or expired.")
+    return EmailJobResponse(**job.to_dict())
+
+# --- Customer upserts ---
+def _apply_customer_changes(changes):
+    """Applies changes to the live store; a shared (memory-mapped) store can't be written to."""
+    try:
+        result = apply_changes(customer_data, changes, change_log)
+    except ReadOnlyStoreError as e:
+        raise HTTPException(status_code=409, detail=f"{e} Run a single worker with SHARED_CUSTOMER_STORE=false to accept upserts.")
+    if customer_data.dead_rows > CRM_COMPACT_DEAD_RATIO * customer_data.row_count:
+        maybe_compact_customer_data()
+    return customer_data, result
+
+# Registered before /customers/{customer_id} so "bulk" is not captured as a customer ID.
+@app.post("/customers/bulk", response_model=BulkUpsertResponse)
+async def bulk_upsert_customers(request: Request):
+    """
+    Applies an NDJSON body, one {"CustomerID": ..., <fields>} object per line.
+
+    Known customers are updated with the fields given; unknown ones are created and need
+    the full record. Invalid lines are reported in `errors` and don't block the others.
+    """
+    body = (await request.body()).decode('utf-8')
+    # Validating, logging (fsync) and applying a large body would stall the event loop
+    return await run_in_threadpool(_bulk_upsert, body)
+
+def _bulk_upsert(body):
+    data = customer_data
+    changes, line_numbers, errors = [], [], []
+    seen = set()
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+            if not isinstance(fields, dict) or not isinstance(fields.get(ID_COLUMN), str):
+                raise ValueError(f"Expected a JSON object with a string {ID_COLUMN}.")
+        except ValueError as e:
+            errors.append({"line": line_number, "error": str(e)})
+            continue
+        customer_id = fields.pop(ID_COLUMN)
+        replace = customer_id not in data and customer_id not in seen
+        if replace:
+            fields.setdefault('Churn', 0)
+        seen.add(customer_id)
+        changes.append((customer_id, fields, replace))
+        line_numbers.append(line_number)
+
+    _, (applied, rejected) = _apply_customer_changes(changes)
+    errors.extend({"line": line_numbers[i], "error": message} for i, message in rejected)
+    errors.sort(key=lambda error: error["line"])
+    created = sum(1 for _, _, was_created in applied if was_created)
+    return BulkUpsertResponse(created=created, updated=len(applied) - created, errors=errors)
+
+@app.put("/customers/{customer_id}", response_model=CustomerUpsertResponse)
+def put_customer(customer_id: str, record: CustomerRecord, response: Response):
+    """Creates a customer, or replaces every field of an existing one. Visible to the next /predict."""
+    data, (applied, errors) = _apply_customer_changes([(customer_id, record.model_dump(), True)])
+    if errors:
+        raise HTTPException(status_code=422, detail=errors[0][1])
+    created = applied[0][2]
+    if created:
+        response.status_code = 201
+    return CustomerUpsertResponse(customer_id=customer_id, created=created, data_version=data.version)
+
+@app.patch("/customers/{customer_id}", response_model=CustomerUpsertResponse)
+def patch_customer(customer_id: str, update: CustomerUpdate):
+    """Updates the given fields of an existing customer."""
+    if customer_id not in customer_data:
+        metrics.NOT_FOUND.labels('patch').inc()
+        raise HTTPException(status_code=404, detail="Customer ID not found.")
+    data, (applied, errors) = _apply_customer_changes([(customer_id, update.model_dump(exclude_unset=True), False)])
+    if errors:
+        raise HTTPException(status_code=422, detail=errors[0][1])
+    return CustomerUpsertResponse(customer_id=customer_id, created=False, data_version=data.version)
+
+@app.get("/customers/{customer_id}")
+def get_customer(customer_id: str):
+    """The customer's current CRM record."""
+    data = customer_data
+    position = data.position(customer_id)
+    if position is None:
+        metrics.NOT_FOUND.labels('customer').inc()
+        raise HTTPException(status_code=404, detail="Customer ID not found.")
+    return {ID_COLUMN: customer_id, **data.row(position).to_dict()}
@@ -0,0 +1,11 @@
+# tests/conftest.py
+
+# Lets the tests import the app's modules (engine.*) from the repository root, and the
+# data scripts by module name, the way they import each other (generate_data).
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'data'))
@@ -0,0 +1,83 @@
+# tests/test_generate_action_data.py
+
+# The vectorized success rules against the original row-by-row `calculate_success_prob`
+# (ported below): equal probabilities on the same customers and actions, and success
+# rates per action within sampling error of a baseline run on the same CRM file.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from generate_action_data import ACTIONS, generate, success_probabilities
+from generate_data import generate as generate_crm
+from generate_data import read_chunks
+
+BASELINE_SUCCESS = {
+    "20% Discount Offer": 0.30,
+    "Proactive Support Call": 0.25,
+    "Send Educational Content": 0.20,
+    "No Action": 0.02,
+}
+
+
+def calculate_success_prob(row):
+    """The original script's per-row success probability."""
+    action = row['ActionTaken']
+    prob = BASELINE_SUCCESS[action]
+    if action == "20% Discount Offer" and row['MonthlyRevenue'] > 75:
+        prob += 0.30
+    if action == "Proactive Support Call" and row['SupportTickets'] > 4:
+        prob += 0.40
+    if action == "Send Educational Content" and row['Tenure'] < 12 and row['UsageFrequency'] < 20:
+        prob += 0.35
+    if action == "20% Discount Offer" and row['Tenure'] < 6:
+        prob -= 0.15
+    if row['Churn'] == 0:
+        return 0
+    return min(max(prob, 0), 1)
+
+
+def baseline_outcomes(crm, seed):
+    """The original data/generate_action_data.py on a CRM DataFrame."""
+    np.random.seed(seed)
+    df = crm.copy()
+    df['ActionTaken'] = np.random.choice(ACTIONS, size=len(df))
+    success = df.apply(calculate_success_prob, axis=1)
+    df['ChurnPrevented'] = (np.random.rand(len(df)) < success).astype(int)
+    return df
+
+
+@pytest.fixture(scope='module')
+def crm_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('crm') / 'crm.csv')
+    generate_crm(path, rows=60_000, chunk_size=20_000, seed=5)
+    return path
+
+
+def test_success_rules_match_baseline(crm_path):
+    crm = next(read_chunks(crm_path, 20_000))
+    action = np.random.default_rng(0).integers(0, len(ACTIONS), len(crm))
+    expected = crm.assign(ActionTaken=np.array(ACTIONS, dtype=object)[action]).apply(calculate_success_prob, axis=1)
+    np.testing.assert_allclose(success_probabilities(crm, action), expected.to_numpy(dtype=float), rtol=0, atol=1e-12)
+
+
+def test_success_rates_match_baseline(crm_path, tmp_path):
+    output = str(tmp_path / 'actions.csv')
+    summary = generate(crm_path, output, chunk_size=20_000, seed=5)
+    out = pd.concat(read_chunks(output))
+    crm = pd.concat(read_chunks(crm_path))
+    baseline = baseline_outcomes(crm, 5)
+
+    assert summary['rows'] == len(out) == len(crm)
+    assert (out['CustomerID'].to_numpy() == crm['CustomerID'].to_numpy()).all()
+    assert (out['ChurnPrevented'].to_numpy()[crm['Churn'].to_numpy() == 0] == 0).all()
+    churners = crm['Churn'].to_numpy() == 1
+    rates = out[churners].groupby('ActionTaken')['ChurnPrevented'].agg(['mean', 'size'])
+    baseline_rates = baseline[churners].groupby('ActionTaken')['ChurnPrevented'].agg(['mean', 'size'])
+    for action in ACTIONS:
+        (p, n), (p0, n0) = rates.loc[action], baseline_rates.loc[action]
+        # Two independent samples of the same rate: within 4 standard errors of each other
+        pooled = (p * n + p0 * n0) / (n + n0)
+        assert abs(p - p0) <= 4 * np.sqrt(pooled * (1 - pooled) * (1 / n + 1 / n0)), action
+    # Actions are assigned uniformly, as np.random.choice does
+    assert (out['ActionTaken'].value_counts(normalize=True) - 0.25).abs().max() < 0.01
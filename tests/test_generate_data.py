@@ -0,0 +1,130 @@
+# tests/test_generate_data.py
+
+# The vectorized, chunked generator against the original row-by-row script (ported
+# below with seeded RNGs): the churn rules must agree exactly on the same customers,
+# and independently generated tables must agree on the churn rate, the threshold and
+# the value ranges within sampling tolerance.
+
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from generate_data import (CHURN_QUANTILE, LOCATIONS, REVENUE_HIGH, REVENUE_LOW, SUBSCRIPTION_TIERS, chunk_seeds,
+                           chunk_sizes, churn_scores, churn_threshold, generate, generate_chunk, generate_features,
+                           read_chunks)
+
+ROWS = 40_000
+
+
+def baseline_rule_score(df):
+    """The churn rules of the original script, before the noise."""
+    churn_probability = pd.Series(np.zeros(len(df)))
+    churn_probability += np.where((df['Tenure'] > 24) & (df['UsageFrequency'] < 20), 0.3, 0)
+    churn_probability += np.where(df['SupportTickets'] > 5, 0.2, 0)
+    churn_probability += np.where((df['Tenure'] < 6) & (df['SupportTickets'] > 3), 0.4, 0)
+    churn_probability += np.where(df['LastInteraction'] > 60, 0.25, 0)
+    return churn_probability
+
+
+def baseline_table(n, seed):
+    """The original data/generate_data.py (without CustomerIDs). Returns (DataFrame, churn threshold)."""
+    rng = random.Random(seed)
+    np_rng = np.random.RandomState(seed)
+    df = pd.DataFrame({
+        'Age': [rng.randint(22, 65) for _ in range(n)],
+        'Gender': [rng.choice(['Male', 'Female']) for _ in range(n)],
+        'Location': [rng.choice(LOCATIONS) for _ in range(n)],
+        'SubscriptionTier': [rng.choice(SUBSCRIPTION_TIERS) for _ in range(n)],
+        'Tenure': [rng.randint(1, 60) for _ in range(n)],
+    })
+
+    def get_revenue(tier):
+        if tier == 'Basic':
+            return round(rng.uniform(10, 30), 2)
+        elif tier == 'Standard':
+            return round(rng.uniform(40, 70), 2)
+        else:
+            return round(rng.uniform(80, 150), 2)
+
+    df['MonthlyRevenue'] = df['SubscriptionTier'].apply(get_revenue)
+    df['UsageFrequency'] = (df['Tenure'] * 1.5 + np_rng.normal(0, 10, n)).astype(int).clip(lower=1)
+    df['SupportTickets'] = (np_rng.poisson(lam=3, size=n) - (df['Tenure'] / 12)).astype(int).clip(lower=0)
+    df['LastInteraction'] = [rng.randint(1, 90) for _ in range(n)]
+    churn_probability = baseline_rule_score(df) + np_rng.uniform(0, 0.1, n)
+    threshold = churn_probability.quantile(0.85)
+    df['Churn'] = (churn_probability > threshold).astype(int)
+    return df, threshold
+
+
+def rule_hits(df):
+    """Which customers each of the four churn rules applies to."""
+    tenure, usage, tickets = df['Tenure'], df['UsageFrequency'], df['SupportTickets']
+    return [(tenure > 24) & (usage < 20), tickets > 5, (tenure < 6) & (tickets > 3), df['LastInteraction'] > 60]
+
+
+@pytest.fixture(scope='module')
+def tables(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('crm') / 'crm.csv')
+    summary = generate(path, rows=ROWS, chunk_size=10_000, seed=7)
+    return baseline_table(ROWS, 7), (pd.concat(read_chunks(path)), summary)
+
+
+def test_rules_match_baseline_on_the_same_customers():
+    features = generate_features(np.random.default_rng(1), 20_000)
+    scores = churn_scores(features, np.random.default_rng(2))
+    noise = np.random.default_rng(2).uniform(0, 0.1, 20_000)
+    np.testing.assert_array_equal(scores, baseline_rule_score(pd.DataFrame(features)).to_numpy() + noise)
+
+
+def test_streamed_threshold_is_the_whole_table_quantile():
+    sizes = chunk_sizes(25_000, 4_000)
+    seeds = chunk_seeds(3, len(sizes))
+    scores = np.concatenate([generate_chunk(seed, n)[1] for seed, n in zip(seeds, sizes)])
+    threshold = churn_threshold(seeds, sizes)
+    assert threshold == pd.Series(scores).quantile(CHURN_QUANTILE)
+    # Labels cut at that threshold, as the baseline does
+    features, chunk_scores = generate_chunk(seeds[0], sizes[0], threshold)
+    np.testing.assert_array_equal(features['Churn'], chunk_scores > threshold)
+
+
+def test_churn_rate_and_threshold_match_baseline(tables):
+    (baseline, baseline_threshold), (df, summary) = tables
+    assert summary['churned'] == df['Churn'].sum()
+    assert abs(df['Churn'].mean() - baseline['Churn'].mean()) < 0.01
+    assert abs(summary['churn_threshold'] - baseline_threshold) < 0.02
+    # Each rule fires about as often, and labels about the same share of the customers it hits
+    for hits, baseline_hits in zip(rule_hits(df), rule_hits(baseline)):
+        assert abs(hits.mean() - baseline_hits.mean()) < 0.01
+        assert abs(df.loc[hits, 'Churn'].mean() - baseline.loc[baseline_hits, 'Churn'].mean()) < 0.05
+
+
+def test_ranges_match_baseline(tables):
+    (baseline, _), (df, _) = tables
+    for column in ('Age', 'Tenure', 'LastInteraction'):
+        assert df[column].max() == baseline[column].max(), column
+    for column in ('Age', 'Tenure', 'LastInteraction', 'UsageFrequency', 'SupportTickets'):
+        assert df[column].min() == baseline[column].min(), column
+        assert df[column].mean() == pytest.approx(baseline[column].mean(), rel=0.02), column
+    # UsageFrequency is 1.5 x Tenure plus N(0, 10) noise
+    noise = df['UsageFrequency'] - 1.5 * df['Tenure']
+    baseline_noise = baseline['UsageFrequency'] - 1.5 * baseline['Tenure']
+    assert noise.std() == pytest.approx(baseline_noise.std(), rel=0.05)
+    for tier, low, high in zip(SUBSCRIPTION_TIERS, REVENUE_LOW, REVENUE_HIGH):
+        revenue = df.loc[df['SubscriptionTier'] == tier, 'MonthlyRevenue']
+        baseline_revenue = baseline.loc[baseline['SubscriptionTier'] == tier, 'MonthlyRevenue']
+        assert low <= revenue.min() and revenue.max() <= high + 1e-4, tier
+        assert revenue.mean() == pytest.approx(baseline_revenue.mean(), abs=0.02 * (high - low)), tier
+    for column in ('Gender', 'Location', 'SubscriptionTier'):
+        shares = df[column].value_counts(normalize=True)
+        baseline_shares = baseline[column].value_counts(normalize=True)
+        assert (shares - baseline_shares).abs().max() < 0.02, column
+
+
+def test_output_does_not_depend_on_worker_count(tmp_path):
+    one, two = str(tmp_path / 'one.csv'), str(tmp_path / 'two.csv')
+    generate(one, rows=9_000, chunk_size=2_000, seed=11)
+    generate(two, rows=9_000, chunk_size=2_000, seed=11, workers=2)
+    with open(one, 'rb') as a, open(two, 'rb') as b:
+        assert a.read() == b.read()
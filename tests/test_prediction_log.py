@@ -0,0 +1,61 @@
+# tests/test_prediction_log.py
+
+import pytest
+
+from engine.prediction_log import PredictionLogWriter
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def _record(customer_id, **optional):
+    return {
+        "timestamp": 1700000000,
+        "model_version": "run-1",
+        "customer_id": customer_id,
+        "features": {"Age": 41, "MonthlyRevenue": 27.53, "Gender": "Female", "Location": "Houston"},
+        "prediction": {"churn_probability": 0.8123},
+        "experiment": {"group": "B", "action_taken": "Offer Discount"},
+        "ground_truth_churn": None,
+        **optional,
+    }
+
+
+def test_parquet_keeps_optional_columns_missing_from_the_first_record(tmp_path):
+    writer = PredictionLogWriter(path=str(tmp_path / "log.jsonl"), parquet_dir=str(tmp_path / "parquet"))
+    writer.start()
+    writer.log(_record("a"))
+    writer.log(_record("b", email={"source": "fallback", "fallback_reason": "deadline"},
+                       experiments={"retention_email": "B", "discount_depth": "control"}))
+    writer.log(_record("c", profile={"request_id": "f00d", "slow": True, "total_ms": 512.5,
+                                     "stages_ms": {"lookup": 0.2, "email": 510.0}}))
+    writer.close()  # Flushes the buffered rows into one file
+
+    assert writer.write_errors == 0
+    [path] = (tmp_path / "parquet").iterdir()
+    table = pq.read_table(path)
+    assert table.schema.names == [
+        "timestamp", "model_version", "customer_id", "features", "prediction", "experiment",
+        "ground_truth_churn", "email", "experiments", "profile",
+    ]
+    rows = table.to_pylist()
+    assert [row["customer_id"] for row in rows] == ["a", "b", "c"]
+    assert rows[0]["email"] is None and rows[0]["experiments"] is None and rows[0]["profile"] is None
+    assert rows[1]["email"] == {"source": "fallback", "fallback_reason": "deadline"}
+    assert dict(rows[1]["experiments"]) == {"retention_email": "B", "discount_depth": "control"}
+    assert rows[2]["profile"]["total_ms"] == 512.5
+    assert dict(rows[2]["profile"]["stages_ms"]) == {"lookup": 0.2, "email": 510.0}
+    # Features absent from a record are null, not dropped from the schema
+    assert rows[0]["features"]["Age"] == 41 and rows[0]["features"]["Tenure"] is None
+
+
+def test_parquet_files_share_one_schema(tmp_path):
+    writer = PredictionLogWriter(path=str(tmp_path / "log.jsonl"), parquet_dir=str(tmp_path / "parquet"),
+                                 batch_size=1, parquet_rows=1)
+    writer.start()
+    writer.log(_record("a"))
+    writer.log(_record("b", email={"source": "llm", "fallback_reason": None}))
+    writer.close()
+
+    assert writer.parquet_files == 2
+    first, second = sorted((tmp_path / "parquet").iterdir())
+    assert pq.read_schema(first) == pq.read_schema(second)